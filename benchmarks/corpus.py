@@ -0,0 +1,113 @@
+"""
+Synthetic PDF corpus for the offline benchmarks.
+
+Writes small, valid PDF files without any PDF library: text pages that pass
+the preflight text fast path (>= TEXT_MIN_CHARS_PER_PAGE characters) and,
+optionally, empty "scanned" pages that force the upload route. File names
+follow the real corpus (Thong_bao_..., Quyet_dinh_...), and the content is
+derived from the seed, so the same arguments always produce the same bytes
+and therefore the same extraction cache keys.
+
+Usage:
+    python benchmarks/corpus.py --out /tmp/corpus --docs 300
+"""
+
+import random
+import argparse
+from pathlib import Path
+from typing import List
+
+PREFIXES = ('Thong_bao', 'Quyet_dinh', 'Quy_dinh', 'Huong_dan', 'Ke_hoach')
+
+# ASCII (không dấu) để dùng font chuẩn Helvetica mà không cần nhúng font
+SENTENCES = (
+    "Hoc phi hoc ky {term} nam hoc 2025-2026 doi voi chuong trinh dai tra la {fee} dong/tin chi.",
+    "Sinh vien khoa {cohort} hoan thanh nghia vu hoc phi truoc ngay {day}/{month}/2025.",
+    "Chuong trinh chat luong cao ap dung muc {fee} dong/tin chi cho cac hoc phan ly thuyet.",
+    "Sinh vien thuoc dien mien giam nop don tai Phong Cong tac Sinh vien truoc ngay {day}/{month}.",
+    "Truong hop nop cham qua {days} ngay, sinh vien bi tam dung dang ky hoc phan hoc ky tiep theo.",
+    "Can cu Nghi dinh {decree}/2021/ND-CP quy dinh co che thu, quan ly hoc phi doi voi co so giao duc.",
+    "Muc thu hoc phi hoc lai, hoc cai thien bang {ratio}% muc hoc phi cua hoc phan tuong ung.",
+    "Phong Ke hoach - Tai chinh chiu trach nhiem huong dan va doi soat cac khoan da nop.",
+)
+
+LINES_PER_PAGE = 24
+
+
+def _page_lines(rng: random.Random) -> List[str]:
+    return [
+        rng.choice(SENTENCES).format(
+            term=rng.randint(1, 3), fee=rng.choice((450000, 520000, 610000, 1200000)),
+            cohort=rng.randint(2021, 2025), day=rng.randint(1, 28), month=rng.randint(1, 12),
+            days=rng.choice((15, 30, 45)), decree=rng.choice((81, 97)), ratio=rng.choice((100, 150)),
+        )
+        for _ in range(LINES_PER_PAGE)
+    ]
+
+
+def _escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def write_pdf(path: Path, pages: List[List[str]]) -> None:
+    """Write a minimal PDF; a page with no lines has no text layer (like a scan)."""
+    page_ids = [4 + 2 * index for index in range(len(pages))]
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        2: f"<< /Type /Pages /Kids [{' '.join(f'{pid} 0 R' for pid in page_ids)}] /Count {len(pages)} >>".encode(),
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    }
+    for pid, lines in zip(page_ids, pages):
+        stream = "BT /F1 9 Tf 40 800 Td 14 TL " + " ".join(f"({_escape(line)}) Tj T*" for line in lines) + " ET"
+        data = stream.encode('latin-1')
+        objects[pid] = (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                        f"/Resources << /Font << /F1 3 0 R >> >> /Contents {pid + 1} 0 R >>").encode()
+        objects[pid + 1] = b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for oid in sorted(objects):
+        offsets[oid] = len(out)
+        out += f"{oid} 0 obj\n".encode() + objects[oid] + b"\nendobj\n"
+    xref = len(out)
+    size = max(objects) + 1
+    out += f"xref\n0 {size}\n0000000000 65535 f \n".encode()
+    for oid in range(1, size):
+        out += f"{offsets[oid]:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    path.write_bytes(bytes(out))
+
+
+def build_corpus(out_dir: Path, docs: int, min_pages: int = 1, max_pages: int = 6,
+                 scanned_ratio: float = 0.1, seed: int = 0) -> List[Path]:
+    """Create `docs` PDFs in out_dir (existing files with the same name are overwritten)."""
+    rng = random.Random(seed)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for index in range(docs):
+        page_count = rng.randint(min_pages, max_pages)
+        scanned = rng.random() < scanned_ratio
+        pages = [[] if scanned else _page_lines(rng) for _ in range(page_count)]
+        path = out_dir / f"{rng.choice(PREFIXES)}_{index:04d}_{rng.randint(100, 999)}.pdf"
+        write_pdf(path, pages)
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic PDF corpus.")
+    parser.add_argument('--out', required=True, help="Output folder")
+    parser.add_argument('--docs', type=int, default=200, help="Number of PDFs (default: 200)")
+    parser.add_argument('--max-pages', type=int, default=6, help="Pages per PDF, 1..N (default: 6)")
+    parser.add_argument('--scanned-ratio', type=float, default=0.1, help="Share of PDFs without a text layer")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    paths = build_corpus(Path(args.out), args.docs, max_pages=args.max_pages,
+                         scanned_ratio=args.scanned_ratio, seed=args.seed)
+    size = sum(path.stat().st_size for path in paths)
+    print(f"📁 {len(paths)} PDFs ({size / 1024:.0f} KB) in {args.out}")
+
+
+if __name__ == "__main__":
+    main()
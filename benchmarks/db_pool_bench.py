@@ -0,0 +1,134 @@
+"""
+Query latency of PgVectorStorage with and without the connection pool.
+
+Runs keyword_search / get_statistics (no embedding call, so no API key is
+needed) from 1..N threads against the POSTGRES_* database, once opening a
+connection per query (DB_POOL=0 behaviour) and once through ConnectionPool,
+and reports throughput and p50/p95/p99 latency for each.
+
+Needs a running database, e.g. `docker compose up -d postgres`.
+
+Usage:
+    python benchmarks/db_pool_bench.py
+    python benchmarks/db_pool_bench.py --queries 500 --concurrency 1 --concurrency 16 --concurrency 64
+    python benchmarks/db_pool_bench.py --query statistics --pool-size 20 --json data/logs/db_pool.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Không gọi API embedding; Client chỉ cần một key bất kỳ để khởi tạo
+os.environ.setdefault('GEMINI_API_KEY', 'unused-by-benchmark')
+
+from src.db_pool import ConnectionPool, DirectConnections
+from src.metrics import metrics
+from src.pgvector_storage import PgVectorStorage
+
+QUERIES: Dict[str, Callable[[PgVectorStorage], object]] = {
+    'keyword': lambda storage: storage.keyword_search('học phí', limit=10),
+    'statistics': lambda storage: storage.get_statistics(),
+}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Compare query latency with and without the connection pool.")
+    parser.add_argument('--query', choices=sorted(QUERIES), default='keyword', help="Query to run (default: keyword)")
+    parser.add_argument('--queries', type=int, default=300, help="Queries per run (default: 300)")
+    parser.add_argument('--concurrency', type=int, action='append', help="Threads (repeatable, default: 1, 8, 32)")
+    parser.add_argument('--pool-size', type=int, default=10, help="Pool max size (default: 10)")
+    parser.add_argument('--json', help="Also write the results to this JSON file")
+    return parser.parse_args()
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(q * (len(ordered) - 1)))]
+
+
+def measure(storage: PgVectorStorage, query: Callable, queries: int, threads: int) -> Dict[str, float]:
+    """Run `queries` calls spread over `threads` threads; latencies in milliseconds."""
+    latencies: List[float] = []
+    lock = threading.Lock()
+    per_thread = max(1, queries // threads)
+
+    def worker():
+        own = []
+        for _ in range(per_thread):
+            started = time.perf_counter()
+            query(storage)
+            own.append((time.perf_counter() - started) * 1000)
+        with lock:
+            latencies.extend(own)
+
+    metrics.reset()
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    wall = time.perf_counter() - started
+    errors = sum(op['errors'] for name, op in metrics.summary()['operations'].items() if name.startswith('db.'))
+    return {
+        'queries': len(latencies),
+        'errors': errors,
+        'qps': round(len(latencies) / wall, 1),
+        'p50_ms': round(_percentile(latencies, 0.5), 2),
+        'p95_ms': round(_percentile(latencies, 0.95), 2),
+        'p99_ms': round(_percentile(latencies, 0.99), 2),
+        'mean_ms': round(statistics.mean(latencies), 2),
+    }
+
+
+def main():
+    args = parse_args()
+    levels = args.concurrency or [1, 8, 32]
+    query = QUERIES[args.query]
+    storage = PgVectorStorage()
+    modes = {
+        'direct': DirectConnections(storage.conn_params),
+        'pool': ConnectionPool(storage.conn_params, max_size=args.pool_size),
+    }
+
+    print(f"⏱️  {args.query} x {args.queries} on {storage.conn_params['host']}:{storage.conn_params['port']} "
+          f"(pool max {args.pool_size})\n")
+    print(f"{'mode':<8} {'threads':>7} {'qps':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'errors':>7}")
+    results = []
+    for threads in levels:
+        for mode, pool in modes.items():
+            storage.pool = pool
+            # Làm nóng (cache của máy chủ, kết nối của pool) trước khi đo
+            for _ in range(min(threads, args.pool_size)):
+                query(storage)
+            result = {'mode': mode, 'threads': threads, **measure(storage, query, args.queries, threads)}
+            results.append(result)
+            print(f"{mode:<8} {threads:>7} {result['qps']:>9} {result['p50_ms']:>7.2f}ms {result['p95_ms']:>7.2f}ms "
+                  f"{result['p99_ms']:>7.2f}ms {result['errors']:>7}")
+        direct, pooled = results[-2], results[-1]
+        if pooled['p50_ms']:
+            print(f"{'':<8} {'':>7} 🚀 pool: {pooled['qps'] / direct['qps']:.1f}x qps, "
+                  f"p50 {direct['p50_ms'] / pooled['p50_ms']:.1f}x lower\n")
+    modes['pool'].close()
+
+    if args.json:
+        Path(args.json).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'query': args.query, 'pool_size': args.pool_size, 'results': results}, f, indent=2)
+        print(f"📄 Results: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+Deterministic, offline stand-in for google.genai.Client used by the benchmarks.
+
+Implements the calls the extraction library and PgVectorStorage make:
+files.upload/get/delete, caches.create/delete, models.generate_content,
+models.generate_content_stream and models.embed_content. Responses are
+derived from a hash of the request, so the same corpus and seed always give
+the same documents, chunks, token counts and vectors. Latency, jitter,
+tail latency, API errors and malformed JSON are configurable through
+FakeConfig; every delay is a real time.sleep so concurrency behaves like it
+does against the API.
+"""
+
+import re
+import json
+import time
+import uuid
+import random
+import hashlib
+import threading
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional
+
+EMBEDDING_DIM = 768
+CACHED_PROMPT_TOKENS = 2000
+PDF_TOKENS_PER_PAGE = 258
+
+
+@dataclass
+class FakeConfig:
+    """Latency (seconds) and failure model of the fake API."""
+    upload_latency: float = 0.05
+    upload_per_mb: float = 0.2
+    generate_latency: float = 0.2
+    generate_per_page: float = 0.05
+    embed_latency: float = 0.03
+    embed_per_text: float = 0.002
+    cache_latency: float = 0.05
+    jitter: float = 0.2              # ±20% uniform noise on every delay
+    tail_rate: float = 0.01          # share of calls that are tail_factor times slower
+    tail_factor: float = 5.0
+    error_rate: float = 0.0          # share of calls that raise FakeAPIError
+    invalid_json_rate: float = 0.0   # share of generations truncated mid-JSON
+    chunks_per_page: int = 4
+    time_scale: float = 1.0          # multiply every delay (0 = no sleeping)
+    seed: int = 0
+
+    @classmethod
+    def from_dict(cls, values: Dict[str, Any]) -> 'FakeConfig':
+        known = set(cls.__dataclass_fields__)
+        return cls(**{key: value for key, value in values.items() if key in known})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class FakeAPIError(Exception):
+    """Injected transient API failure (like a 503 from the real service)."""
+
+
+class _Calls:
+    """Per-operation call counters shared by the fake sub-APIs."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+        self._attempts: Dict[str, int] = {}
+
+    def next(self, op: str, key: str) -> int:
+        """Count a call and return how many times this exact request was made before."""
+        with self._lock:
+            self.counts[op] = self.counts.get(op, 0) + 1
+            attempt = self._attempts.get(op + key, 0)
+            self._attempts[op + key] = attempt + 1
+            return attempt
+
+
+class _Base:
+    def __init__(self, config: FakeConfig, calls: _Calls):
+        self.config = config
+        self.calls = calls
+
+    def _rng(self, op: str, key: str) -> random.Random:
+        attempt = self.calls.next(op, key)
+        digest = hashlib.sha256(f"{self.config.seed}:{op}:{key}:{attempt}".encode()).digest()
+        return random.Random(int.from_bytes(digest[:8], 'big'))
+
+    def _delay(self, rng: random.Random, seconds: float) -> None:
+        config = self.config
+        seconds *= 1 + config.jitter * (rng.random() * 2 - 1)
+        if rng.random() < config.tail_rate:
+            seconds *= config.tail_factor
+        if seconds > 0 and config.time_scale > 0:
+            time.sleep(seconds * config.time_scale)
+
+    def _maybe_fail(self, rng: random.Random, op: str) -> None:
+        if rng.random() < self.config.error_rate:
+            raise FakeAPIError(f"503 UNAVAILABLE (injected) in {op}")
+
+
+def _count_pages(data: bytes) -> int:
+    return max(1, len(re.findall(rb'/Type\s*/Page[^s]', data)))
+
+
+class FakeFiles(_Base):
+    def __init__(self, config: FakeConfig, calls: _Calls):
+        super().__init__(config, calls)
+        self._lock = threading.Lock()
+        self._files: Dict[str, SimpleNamespace] = {}
+
+    def upload(self, file, config=None):
+        with open(file, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        rng = self._rng('files.upload', digest)
+        self._delay(rng, self.config.upload_latency + self.config.upload_per_mb * len(data) / 1024 / 1024)
+        self._maybe_fail(rng, 'files.upload')
+        uploaded = SimpleNamespace(
+            name=f"files/{uuid.uuid4().hex[:12]}",
+            uri=f"https://fake.invalid/files/{digest[:12]}",
+            mime_type='application/pdf',
+            size_bytes=len(data),
+            page_count=_count_pages(data),
+            digest=digest,
+            expiration_time=datetime.now(timezone.utc) + timedelta(hours=48),
+        )
+        with self._lock:
+            self._files[uploaded.name] = uploaded
+        return uploaded
+
+    def get(self, name: str):
+        self.calls.next('files.get', name)
+        with self._lock:
+            if name not in self._files:
+                raise FakeAPIError(f"404 NOT_FOUND {name}")
+            return self._files[name]
+
+    def delete(self, name: str):
+        self.calls.next('files.delete', name)
+        with self._lock:
+            self._files.pop(name, None)
+
+
+class FakeCaches(_Base):
+    def create(self, model: str, config=None):
+        rng = self._rng('caches.create', model)
+        self._delay(rng, self.config.cache_latency)
+        return SimpleNamespace(name=f"cachedContents/{uuid.uuid4().hex[:12]}", model=model)
+
+    def delete(self, name: str):
+        self.calls.next('caches.delete', name)
+
+
+_FILE_NAME = re.compile(r'([\w\-.]+\.pdf)', re.IGNORECASE)
+
+
+class FakeModels(_Base):
+    def _document(self, contents) -> Dict[str, Any]:
+        """Describe the request: file name, page count, prompt size and a content key."""
+        prompt_parts, pages, file_name, key_parts = [], 1, None, []
+        for part in contents if isinstance(contents, list) else [contents]:
+            if isinstance(part, str):
+                prompt_parts.append(part)
+                key_parts.append(part)
+                if '=== TRANG' in part:
+                    pages = max(1, part.count('=== TRANG'))
+            else:
+                pages = getattr(part, 'page_count', 1)
+                key_parts.append(getattr(part, 'digest', str(part)))
+        prompt = '\n'.join(prompt_parts)
+        match = _FILE_NAME.search(prompt)
+        if match:
+            file_name = match.group(1)
+        key = hashlib.sha256('\x1f'.join(key_parts).encode('utf-8')).hexdigest()
+        return {'prompt': prompt, 'pages': pages, 'file_name': file_name, 'key': key,
+                'uploaded': any(not isinstance(p, str) for p in (contents if isinstance(contents, list) else [contents]))}
+
+    def _payload(self, request: Dict[str, Any], schema, rng: random.Random) -> str:
+        doc_rng = random.Random(request['key'])
+        chunks = []
+        for page in range(1, request['pages'] + 1):
+            for n in range(self.config.chunks_per_page):
+                value = doc_rng.choice([None, 450000, 520000, 90, 30])
+                chunks.append({
+                    'CHUNK_ID': str(uuid.UUID(int=doc_rng.getrandbits(128))),
+                    'PAGE_NUMBER': page,
+                    'SECTION_TITLE': f"Điều {page}",
+                    'CHUNK_TOPIC': doc_rng.choice(['Mức học phí', 'Thời hạn nộp', 'Điều kiện miễn giảm', 'Căn cứ']),
+                    'CONTENT_TYPE': doc_rng.choice([None, 'Đại trà', 'Chất lượng cao']),
+                    'SPECIFIC_TARGET': None,
+                    'APPLICABLE_COHORT': doc_rng.choice(['Khóa 2024', 'Khóa 2025', 'Tất cả khóa']),
+                    'VALUE': value,
+                    'UNIT': 'Đ/tín chỉ' if value and value > 1000 else None,
+                    'KEYWORDS': ['học phí', f'trang {page}', f'mục {n + 1}'],
+                    'chunk_text': (f"Trang {page}, mục {n + 1}: sinh viên khóa 2025 nộp học phí "
+                                   f"{value or 'theo quy định'} trước ngày 15/{(page % 12) + 1}. " * 3).strip(),
+                })
+        payload: Dict[str, Any] = {'chunk_metadata': chunks}
+        if getattr(schema, '__name__', 'DocumentData') != 'ChunkData':
+            payload['document_metadata'] = {
+                'DOC_ID': str(uuid.UUID(int=doc_rng.getrandbits(128))),
+                'FILE_NAME': request['file_name'],
+                'DOC_TITLE': f"Thông báo về học phí ({request['file_name'] or request['key'][:8]})",
+                'DOC_TYPE': 'Thông báo',
+                'ISSUE_NUMBER': f"{doc_rng.randint(1, 999)}/TB-ĐHBK",
+                'ISSUING_AUTHORITY': 'Hiệu trưởng',
+                'ISSUING_DEPT': 'Phòng Đào tạo',
+                'ISSUE_DATE': '2025-08-01',
+                'EFFECTIVE_DATE': 'Kể từ ngày ký',
+                'EXPIRATION_DATE': None,
+                'MAJOR_TOPIC': 'Tài chính',
+            }
+        text = json.dumps(payload, ensure_ascii=False)
+        if rng.random() < self.config.invalid_json_rate:
+            # Cắt ngang như một phản hồi bị giới hạn số token đầu ra
+            text = text[:max(1, int(len(text) * rng.uniform(0.3, 0.9)))]
+        return text
+
+    def _usage(self, request: Dict[str, Any], text: str, config) -> SimpleNamespace:
+        cached = CACHED_PROMPT_TOKENS if getattr(config, 'cached_content', None) else 0
+        prompt_tokens = len(request['prompt']) // 3 + cached
+        if request['uploaded']:
+            prompt_tokens += request['pages'] * PDF_TOKENS_PER_PAGE
+        return SimpleNamespace(
+            prompt_token_count=prompt_tokens,
+            cached_content_token_count=cached or None,
+            candidates_token_count=len(text) // 3,
+            thoughts_token_count=None,
+            total_token_count=prompt_tokens + len(text) // 3,
+        )
+
+    def generate_content(self, model: str, contents, config=None):
+        request = self._document(contents)
+        rng = self._rng('models.generate_content', request['key'])
+        self._delay(rng, self.config.generate_latency + self.config.generate_per_page * request['pages'])
+        self._maybe_fail(rng, 'models.generate_content')
+        text = self._payload(request, getattr(config, 'response_schema', None), rng)
+        return SimpleNamespace(text=text, usage_metadata=self._usage(request, text, config))
+
+    def generate_content_stream(self, model: str, contents, config=None) -> Iterator[SimpleNamespace]:
+        request = self._document(contents)
+        rng = self._rng('models.generate_content_stream', request['key'])
+        # Thời gian tới phần đầu tiên, phần còn lại trải đều theo số trang
+        self._delay(rng, self.config.generate_latency)
+        self._maybe_fail(rng, 'models.generate_content_stream')
+        text = self._payload(request, getattr(config, 'response_schema', None), rng)
+        pieces = [text[i:i + 400] for i in range(0, len(text), 400)] or ['']
+        per_piece = self.config.generate_per_page * request['pages'] / len(pieces)
+        for index, piece in enumerate(pieces):
+            last = index == len(pieces) - 1
+            yield SimpleNamespace(text=piece, usage_metadata=self._usage(request, text, config) if last else None)
+            if not last:
+                self._delay(rng, per_piece)
+
+    def embed_content(self, model: str, contents, config=None):
+        texts: List[str] = [contents] if isinstance(contents, str) else list(contents)
+        key = hashlib.sha256('\x1f'.join(texts).encode('utf-8')).hexdigest()
+        rng = self._rng('models.embed_content', key)
+        self._delay(rng, self.config.embed_latency + self.config.embed_per_text * len(texts))
+        self._maybe_fail(rng, 'models.embed_content')
+        return SimpleNamespace(embeddings=[SimpleNamespace(values=fake_vector(text)) for text in texts])
+
+
+def fake_vector(text: str, dim: int = EMBEDDING_DIM) -> List[float]:
+    """Deterministic unit-ish vector for a text."""
+    rng = random.Random(hashlib.sha256(text.encode('utf-8')).digest())
+    return [rng.uniform(-1, 1) for _ in range(dim)]
+
+
+class FakeClient:
+    """Drop-in replacement for genai.Client (sync API only)."""
+
+    def __init__(self, config: Optional[FakeConfig] = None):
+        self.config = config or FakeConfig()
+        self.calls = _Calls()
+        self.files = FakeFiles(self.config, self.calls)
+        self.caches = FakeCaches(self.config, self.calls)
+        self.models = FakeModels(self.config, self.calls)
+
+    def call_counts(self) -> Dict[str, int]:
+        return dict(sorted(self.calls.counts.items()))
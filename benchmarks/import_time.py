@@ -0,0 +1,137 @@
+"""
+Cold-start (import-time) benchmark for the extraction library and CLI scripts.
+
+Each target is imported in a fresh interpreter several times; scripts are
+loaded with runpy under a non-__main__ name so only their top level runs.
+The report shows the import time, the whole-process wall time and whether
+google.genai was imported eagerly.
+
+Usage:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --runs 10 --json data/logs/import_time.json
+    python benchmarks/import_time.py --importtime main    # top modules by cumulative import time
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# name -> python snippet that loads the target
+TARGETS = {
+    'main': "import main",
+    'gemini_extractor': "import src.extractors.gemini_extractor",
+    'scripts/batch_process_simple.py': "import runpy; runpy.run_path('scripts/batch_process_simple.py', run_name='__bench__')",
+    'scripts/process_interactive.py': "import runpy; runpy.run_path('scripts/process_interactive.py', run_name='__bench__')",
+    'scripts/batch_job.py': "import runpy; runpy.run_path('scripts/batch_job.py', run_name='__bench__')",
+    'scripts/manage_cache.py': "import runpy; runpy.run_path('scripts/manage_cache.py', run_name='__bench__')",
+}
+
+PROBE = """
+import sys, time, json
+sys.path.insert(0, '.')
+started = time.perf_counter()
+{load}
+print(json.dumps({{'seconds': time.perf_counter() - started, 'genai': 'google.genai' in sys.modules}}))
+"""
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Measure cold-start import time of the CLI entry points.")
+    parser.add_argument('--runs', type=int, default=5, help="Fresh interpreters per target (default: 5)")
+    parser.add_argument('--target', action='append', choices=sorted(TARGETS), help="Only benchmark these targets")
+    parser.add_argument('--json', help="Also write the results to this JSON file")
+    parser.add_argument('--importtime', choices=sorted(TARGETS), help="Show the slowest modules (-X importtime) for one target")
+    parser.add_argument('--top', type=int, default=15, help="Rows to show with --importtime (default: 15)")
+    return parser.parse_args()
+
+
+def _env() -> dict:
+    # Không cần key thật: import phải chạy được mà không có GEMINI_API_KEY
+    env = dict(os.environ)
+    env.setdefault('PYTHONDONTWRITEBYTECODE', '1')
+    return env
+
+
+def measure(name: str, runs: int) -> dict:
+    """Import one target in `runs` fresh interpreters."""
+    imports, walls, errors = [], [], []
+    genai_loaded = False
+    for _ in range(runs):
+        started = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, '-c', PROBE.format(load=TARGETS[name])],
+            cwd=ROOT, env=_env(), capture_output=True, text=True,
+        )
+        walls.append(time.perf_counter() - started)
+        if proc.returncode != 0:
+            errors.append(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}")
+            continue
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        imports.append(result['seconds'])
+        genai_loaded = genai_loaded or result['genai']
+
+    return {
+        'target': name,
+        'runs': runs,
+        'import_ms_min': round(min(imports) * 1000, 1) if imports else None,
+        'import_ms_median': round(statistics.median(imports) * 1000, 1) if imports else None,
+        'process_ms_median': round(statistics.median(walls) * 1000, 1),
+        'genai_imported': genai_loaded,
+        'error': errors[0] if errors else None,
+    }
+
+
+def show_importtime(name: str, top: int) -> None:
+    """Print the modules with the largest cumulative import time for one target."""
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE.format(load=TARGETS[name])],
+        cwd=ROOT, env=_env(), capture_output=True, text=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|', 2)
+        rows.append((int(cumulative_us), int(self_us), module.strip()))
+
+    print(f"\n🔬 -X importtime: {name} (top {top} by cumulative time)")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for cumulative_us, self_us, module in sorted(rows, reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {module}")
+
+
+def main():
+    args = parse_args()
+    if args.importtime:
+        show_importtime(args.importtime, args.top)
+        return
+
+    names = args.target or list(TARGETS)
+    print(f"⏱️  Cold-start import time ({args.runs} runs each, {sys.executable})\n")
+    print(f"{'target':<34} {'import min':>11} {'median':>9} {'process':>9}  genai")
+    results = []
+    for name in names:
+        result = measure(name, args.runs)
+        results.append(result)
+        if result['error'] and result['import_ms_min'] is None:
+            print(f"{name:<34} ❌ {result['error']}")
+            continue
+        print(f"{name:<34} {result['import_ms_min']:>9.1f}ms {result['import_ms_median']:>7.1f}ms "
+              f"{result['process_ms_median']:>7.1f}ms  {'eager' if result['genai_imported'] else 'lazy'}")
+
+    if args.json:
+        Path(args.json).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'python': sys.version, 'results': results}, f, indent=2)
+        print(f"\n💾 Results: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
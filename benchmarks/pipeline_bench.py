@@ -0,0 +1,329 @@
+"""
+Offline end-to-end benchmark of the extraction library against a fake Gemini.
+
+A synthetic corpus (benchmarks/corpus.py) is pushed through the real code
+paths - preflight, upload registry, context cache, routing, validation,
+salvage, caches and outputs - with google.genai.Client replaced by the
+deterministic FakeClient from benchmarks/fake_gemini.py. No API key, network
+or quota is needed, and two runs with the same arguments do the same work,
+so throughput and latency can be compared across commits.
+
+Each scenario runs in a fresh interpreter with its own working directory, so
+extraction cache, upload registry, run manifest and outputs start cold:
+
+    extract       process_document() over the corpus from a thread pool
+    cache_hit     the same, second pass (every document from the extraction cache)
+    batch         scripts/batch_process_simple.py main()
+    batch_stream  the same with --stream
+    pipeline      src.pipeline extraction stages (upload -> generate)
+    store         PgVectorStorage.save_document() (needs --db; writes to POSTGRES_* DB)
+
+Regression check: --save-baseline writes the results, --baseline compares a
+later run against them and exits with status 1 when throughput drops or p99
+latency grows by more than --tolerance.
+
+Usage:
+    python benchmarks/pipeline_bench.py
+    python benchmarks/pipeline_bench.py --docs 500 --workers 16 --scenario extract --scenario batch
+    python benchmarks/pipeline_bench.py --time-scale 0                 # library overhead only
+    python benchmarks/pipeline_bench.py --error-rate 0.05 --invalid-json-rate 0.1
+    python benchmarks/pipeline_bench.py --save-baseline data/logs/bench_baseline.json
+    python benchmarks/pipeline_bench.py --baseline data/logs/bench_baseline.json --tolerance 0.15
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+BENCH_DIR = Path(__file__).resolve().parent
+
+SCENARIOS = ('extract', 'cache_hit', 'batch', 'batch_stream', 'pipeline', 'store')
+DEFAULT_SCENARIOS = ('extract', 'cache_hit', 'batch', 'pipeline')
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline extraction benchmark with a fake Gemini backend.")
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS,
+                        help=f"Scenarios to run (default: {', '.join(DEFAULT_SCENARIOS)})")
+    parser.add_argument('--docs', type=int, default=200, help="PDFs in the synthetic corpus (default: 200)")
+    parser.add_argument('--max-pages', type=int, default=6, help="Pages per PDF, 1..N (default: 6)")
+    parser.add_argument('--scanned-ratio', type=float, default=0.1, help="Share of PDFs without a text layer")
+    parser.add_argument('--corpus', help="Use this folder of PDFs instead of generating one")
+    parser.add_argument('--workers', type=int, default=8, help="Concurrent documents (default: 8)")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for the corpus and the fake API")
+    parser.add_argument('--time-scale', type=float, default=1.0,
+                        help="Multiply every simulated API delay (0 = no sleeping)")
+    parser.add_argument('--generate-latency', type=float, default=0.2, help="Seconds per generate call")
+    parser.add_argument('--generate-per-page', type=float, default=0.05, help="Extra seconds per page")
+    parser.add_argument('--embed-latency', type=float, default=0.03, help="Seconds per embed call")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of API calls that fail")
+    parser.add_argument('--invalid-json-rate', type=float, default=0.0, help="Share of truncated JSON responses")
+    parser.add_argument('--tail-rate', type=float, default=0.01, help="Share of calls that are 5x slower")
+    parser.add_argument('--db', action='store_true', help="Allow the 'store' scenario (uses POSTGRES_* settings)")
+    parser.add_argument('--keep', action='store_true', help="Keep the working directory")
+    parser.add_argument('--json', help="Also write the results to this JSON file")
+    parser.add_argument('--save-baseline', help="Write the results as a baseline to this file")
+    parser.add_argument('--baseline', help="Compare against this baseline and exit 1 on regression")
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help="Allowed relative throughput drop / p99 growth (default: 0.15)")
+    parser.add_argument('--child', choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument('--child-config', help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _result(scenario: str, docs: int, ok: int, wall: float, latencies: List[float]) -> Dict[str, Any]:
+    return {
+        'scenario': scenario,
+        'docs': docs,
+        'ok': ok,
+        'failed': docs - ok,
+        'wall_seconds': round(wall, 3),
+        'docs_per_min': round(docs / wall * 60, 1) if wall > 0 else None,
+        'p50_seconds': round(_percentile(latencies, 0.5), 3),
+        'p90_seconds': round(_percentile(latencies, 0.9), 3),
+        'p99_seconds': round(_percentile(latencies, 0.99), 3),
+        'max_seconds': round(max(latencies), 3) if latencies else 0.0,
+    }
+
+
+# --- child process: one scenario ----------------------------------------------------------
+
+def _extract_pass(pdfs: List[Path], workers: int):
+    from concurrent.futures import ThreadPoolExecutor
+    from src.extractors.gemini_extractor import process_document
+
+    def one(path: Path):
+        started = time.perf_counter()
+        data = process_document(str(path))
+        return data is not None, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        outcomes = list(pool.map(one, pdfs))
+    return outcomes, time.perf_counter() - started
+
+
+def run_child(scenario: str, config: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one scenario in this (fresh) process with the fake client installed."""
+    sys.path.insert(0, str(ROOT))
+    sys.path.insert(0, str(BENCH_DIR))
+    from fake_gemini import FakeClient, FakeConfig
+
+    import src.extractors.gemini_extractor as extractor
+    from src.metrics import metrics
+
+    client = FakeClient(FakeConfig.from_dict(config['fake']))
+    extractor._client = client
+    pdfs = sorted(Path(config['corpus']).glob('*.pdf'))
+    workers = config['workers']
+
+    if scenario in ('extract', 'cache_hit'):
+        outcomes, wall = _extract_pass(pdfs, workers)
+        if scenario == 'cache_hit':
+            metrics.reset()
+            outcomes, wall = _extract_pass(pdfs, workers)
+        result = _result(scenario, len(pdfs), sum(ok for ok, _ in outcomes), wall,
+                         [seconds for _, seconds in outcomes])
+
+    elif scenario in ('batch', 'batch_stream'):
+        import runpy
+        script = runpy.run_path(str(ROOT / 'scripts' / 'batch_process_simple.py'), run_name='__bench__')
+        sys.argv = ['batch_process_simple.py', '--input', config['corpus'], '--workers', str(workers)]
+        if scenario == 'batch_stream':
+            sys.argv.append('--stream')
+        script['main']()
+        results_file = sorted(Path('data/logs').glob('batch_*_results.json'))[-1]
+        report = json.loads(results_file.read_text(encoding='utf-8'))
+        rows = report['results']
+        result = _result(scenario, len(rows), sum(1 for r in rows if r['status'] == 'success'),
+                         report['wall_seconds'], [r['seconds'] for r in rows])
+
+    elif scenario == 'pipeline':
+        from src.pipeline import build_extraction_pipeline
+        pipeline = build_extraction_pipeline(storage=None, upload_workers=max(1, workers // 4),
+                                             generate_workers=workers, report_interval=3600)
+        report = pipeline.run((str(pdf) for pdf in pdfs), key=lambda path: Path(path).name)
+        result = _result(scenario, report['submitted'], report['completed'], report['wall_seconds'],
+                         [sum(item.timings.values()) for item in pipeline.results])
+        result['stages'] = {name: {key: stage[key] for key in ('avg_seconds', 'utilization', 'max_queue_depth')}
+                            for name, stage in report['stages'].items()}
+
+    elif scenario == 'store':
+        from concurrent.futures import ThreadPoolExecutor
+        from src.extractors.gemini_extractor import process_document
+        from src.pgvector_storage import PgVectorStorage
+
+        storage = PgVectorStorage()
+        storage.client = client
+        documents = [data.model_dump(mode='json') for data in (process_document(str(pdf)) for pdf in pdfs) if data]
+        metrics.reset()
+
+        def one(document):
+            started = time.perf_counter()
+            ok = storage.save_document(document)
+            return ok, time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(one, documents))
+        result = _result(scenario, len(documents), sum(ok for ok, _ in outcomes), time.perf_counter() - started,
+                         [seconds for _, seconds in outcomes])
+
+    extractor.cleanup_run()
+    result['api_calls'] = client.call_counts()
+    result['operations'] = {
+        name: {key: op[key] for key in ('calls', 'errors', 'avg_seconds', 'p50_seconds', 'p99_seconds')}
+        for name, op in metrics.summary()['operations'].items()
+    }
+    return result
+
+
+# --- parent process -----------------------------------------------------------------------
+
+def _child_env(workdir: Path) -> Dict[str, str]:
+    # Mọi cache/đầu ra nằm trong thư mục của kịch bản; không cần key thật
+    env = dict(os.environ)
+    env.update({
+        'GEMINI_API_KEY': 'fake-benchmark-key',
+        'EXTRACTION_CACHE_DIR': str(workdir / 'cache' / 'extractions'),
+        'UPLOAD_REGISTRY_PATH': str(workdir / 'cache' / 'uploads.json'),
+        'RUN_MANIFEST_PATH': str(workdir / 'cache' / 'run_manifest.sqlite'),
+        'DATASET_DIR': str(workdir / 'dataset'),
+        'PYTHONDONTWRITEBYTECODE': '1',
+    })
+    for name in ('METRICS_PORT', 'METRICS_TEXTFILE'):
+        env.pop(name, None)
+    return env
+
+
+def run_scenario(scenario: str, workdir: Path, config: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one scenario in a fresh interpreter and return its result."""
+    workdir.mkdir(parents=True, exist_ok=True)
+    proc = subprocess.run(
+        [sys.executable, str(Path(__file__).resolve()), '--child', scenario, '--child-config', json.dumps(config)],
+        cwd=workdir, env=_child_env(workdir), capture_output=True, text=True,
+    )
+    if proc.returncode != 0 or not proc.stdout.strip():
+        tail = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}"
+        return {'scenario': scenario, 'error': tail}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Regressions of `results` against a saved baseline (empty list = none)."""
+    previous = {r['scenario']: r for r in baseline.get('results', []) if 'error' not in r}
+    regressions = []
+    for result in results:
+        before = previous.get(result['scenario'])
+        if before is None:
+            continue
+        if 'error' in result:
+            regressions.append(f"{result['scenario']}: failed to run ({result['error']})")
+            continue
+        if before['docs_per_min'] and result['docs_per_min'] < before['docs_per_min'] * (1 - tolerance):
+            regressions.append(f"{result['scenario']}: throughput {result['docs_per_min']}/min "
+                               f"< baseline {before['docs_per_min']}/min")
+        if before['p99_seconds'] and result['p99_seconds'] > before['p99_seconds'] * (1 + tolerance):
+            regressions.append(f"{result['scenario']}: p99 {result['p99_seconds']}s "
+                               f"> baseline {before['p99_seconds']}s")
+        if result['failed'] > before['failed']:
+            regressions.append(f"{result['scenario']}: {result['failed']} failed (baseline {before['failed']})")
+    return regressions
+
+
+def main():
+    args = parse_args()
+    if args.child:
+        result = run_child(args.child, json.loads(args.child_config))
+        print(json.dumps(result, ensure_ascii=False))
+        return
+
+    scenarios = args.scenario or list(DEFAULT_SCENARIOS)
+    if 'store' in scenarios and not args.db:
+        print("⚠️  'store' writes to the POSTGRES_* database: add --db to run it")
+        scenarios = [name for name in scenarios if name != 'store']
+
+    sys.path.insert(0, str(BENCH_DIR))
+    from corpus import build_corpus
+
+    workdir = Path(tempfile.mkdtemp(prefix='pipeline_bench_'))
+    try:
+        if args.corpus:
+            corpus_dir = Path(args.corpus).resolve()
+        else:
+            corpus_dir = workdir / 'corpus'
+            build_corpus(corpus_dir, args.docs, max_pages=args.max_pages,
+                         scanned_ratio=args.scanned_ratio, seed=args.seed)
+        docs = len(list(corpus_dir.glob('*.pdf')))
+
+        config = {
+            'corpus': str(corpus_dir),
+            'workers': args.workers,
+            'fake': {
+                'generate_latency': args.generate_latency,
+                'generate_per_page': args.generate_per_page,
+                'embed_latency': args.embed_latency,
+                'error_rate': args.error_rate,
+                'invalid_json_rate': args.invalid_json_rate,
+                'tail_rate': args.tail_rate,
+                'time_scale': args.time_scale,
+                'seed': args.seed,
+            },
+        }
+        print(f"⏱️  Offline pipeline benchmark: {docs} PDFs, {args.workers} workers, "
+              f"time scale {args.time_scale} ({workdir})\n")
+        print(f"{'scenario':<14} {'docs/min':>9} {'wall':>8} {'p50':>7} {'p90':>7} {'p99':>7} {'failed':>7}")
+
+        results = []
+        for scenario in scenarios:
+            result = run_scenario(scenario, workdir / scenario, config)
+            results.append(result)
+            if 'error' in result:
+                print(f"{scenario:<14} ❌ {result['error']}")
+                continue
+            print(f"{scenario:<14} {result['docs_per_min']:>9} {result['wall_seconds']:>7.2f}s "
+                  f"{result['p50_seconds']:>6.2f}s {result['p90_seconds']:>6.2f}s {result['p99_seconds']:>6.2f}s "
+                  f"{result['failed']:>7}")
+    finally:
+        if args.keep:
+            print(f"\n📁 Working directory kept: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {'args': {key: value for key, value in vars(args).items() if not key.startswith('child')},
+              'config': config, 'results': results}
+    for path in filter(None, (args.json, args.save_baseline)):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n📄 Results: {path}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) against {args.baseline} (tolerance {args.tolerance:.0%}):")
+            for line in regressions:
+                print(f"   - {line}")
+            sys.exit(1)
+        print(f"\n✅ No regression against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,20 @@
 -- Kích hoạt extension pgvector
 CREATE EXTENSION IF NOT EXISTS vector;
+-- unaccent: bỏ dấu tiếng Việt khi tìm kiếm full-text
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+-- Cấu hình full-text 'vietnamese': PostgreSQL không có từ điển tiếng Việt, nên mỗi âm tiết
+-- là một token (như 'simple'), được bỏ dấu và chuyển chữ thường ("Học phí" -> 'hoc', 'phi'),
+-- để câu hỏi có dấu hay không dấu đều khớp
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'vietnamese') THEN
+        CREATE TEXT SEARCH CONFIGURATION vietnamese (COPY = simple);
+        ALTER TEXT SEARCH CONFIGURATION vietnamese
+            ALTER MAPPING FOR word, hword, hword_part WITH unaccent, simple;
+    END IF;
+END
+$$;
 
 -- Tạo bảng documents để lưu metadata tài liệu
 CREATE TABLE IF NOT EXISTS documents (
@@ -37,6 +52,13 @@ CREATE TABLE IF NOT EXISTS chunks (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- tsvector lưu sẵn cho full-text search: tiêu đề mục/chủ đề (trọng số A) + nội dung (B).
+-- ADD COLUMN IF NOT EXISTS để áp dụng được cho database đã có dữ liệu
+ALTER TABLE chunks ADD COLUMN IF NOT EXISTS chunk_tsv tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('vietnamese', coalesce(section_title, '') || ' ' || coalesce(chunk_topic, '')), 'A') ||
+    setweight(to_tsvector('vietnamese', chunk_text), 'B')
+) STORED;
+
 -- Index cho tìm kiếm vector (HNSW hoặc IVFFlat)
 CREATE INDEX IF NOT EXISTS chunks_embedding_idx ON chunks 
 USING hnsw (embedding vector_cosine_ops);
@@ -49,11 +71,42 @@ CREATE INDEX IF NOT EXISTS idx_documents_doc_type ON documents(doc_type);
 CREATE INDEX IF NOT EXISTS idx_documents_major_topic ON documents(major_topic);
 CREATE INDEX IF NOT EXISTS idx_documents_issue_date ON documents(issue_date);
 
--- Full-text search index cho chunk_text (using english instead of vietnamese)
-CREATE INDEX IF NOT EXISTS idx_chunks_text_search ON chunks 
-USING gin(to_tsvector('english', chunk_text));
+-- Full-text search index trên cột chunk_tsv (thay index cũ theo to_tsvector('english', ...)
+-- mà các truy vấn 'vietnamese' không dùng được)
+DROP INDEX IF EXISTS idx_chunks_text_search;
+CREATE INDEX IF NOT EXISTS idx_chunks_tsv ON chunks USING gin(chunk_tsv);
+
+-- Hàng đợi công việc trích xuất: nhiều worker (nhiều máy) cùng xử lý một kho PDF.
+-- Worker nhận việc bằng SELECT ... FOR UPDATE SKIP LOCKED, gia hạn lease bằng heartbeat;
+-- việc có lease hết hạn (worker chết) được đưa lại vào hàng đợi.
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id BIGSERIAL PRIMARY KEY,
+    file_path TEXT NOT NULL,
+    file_name VARCHAR(500) NOT NULL,
+    sha256 CHAR(64) NOT NULL UNIQUE,  -- mỗi nội dung PDF chỉ có một job
+    pdf_data BYTEA,  -- nội dung PDF (tùy chọn) cho worker không truy cập được file_path
+    status VARCHAR(20) NOT NULL DEFAULT 'queued'
+        CHECK (status IN ('queued', 'leased', 'done', 'failed')),
+    priority INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    worker_id VARCHAR(200),
+    leased_until TIMESTAMP,
+    heartbeat_at TIMESTAMP,
+    doc_id VARCHAR(255) REFERENCES documents(doc_id) ON DELETE SET NULL,
+    chunks INTEGER,
+    last_error TEXT,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Index một phần: chỉ các job đang chờ / đang được giữ
+CREATE INDEX IF NOT EXISTS idx_jobs_queued ON jobs(priority DESC, job_id) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS idx_jobs_leased_until ON jobs(leased_until) WHERE status = 'leased';
 
--- Trigger để tự động update updated_at
+-- Trigger để tự động update updated_at (OR REPLACE: chạy lại file trên database đã có vẫn được)
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
 BEGIN
@@ -62,14 +115,19 @@ BEGIN
 END;
 $$ language 'plpgsql';
 
-CREATE TRIGGER update_documents_updated_at BEFORE UPDATE ON documents
+CREATE OR REPLACE TRIGGER update_documents_updated_at BEFORE UPDATE ON documents
+FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+CREATE OR REPLACE TRIGGER update_chunks_updated_at BEFORE UPDATE ON chunks
 FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
-CREATE TRIGGER update_chunks_updated_at BEFORE UPDATE ON chunks
+CREATE OR REPLACE TRIGGER update_jobs_updated_at BEFORE UPDATE ON jobs
 FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
 -- View để query dễ dàng hơn
-CREATE OR REPLACE VIEW chunks_with_doc_info AS
+-- (DROP trước: c.* có thêm cột mới như chunk_tsv thì CREATE OR REPLACE VIEW báo lỗi)
+DROP VIEW IF EXISTS chunks_with_doc_info;
+CREATE VIEW chunks_with_doc_info AS
 SELECT 
     c.*,
     d.doc_title,
@@ -82,4 +140,6 @@ JOIN documents d ON c.doc_id = d.doc_id;
 
 COMMENT ON TABLE documents IS 'Lưu metadata của các tài liệu PDF';
 COMMENT ON TABLE chunks IS 'Lưu metadata và vector embeddings của từng chunk văn bản';
+COMMENT ON TABLE jobs IS 'Hàng đợi trích xuất PDF dùng chung cho nhiều worker (lease + heartbeat)';
 COMMENT ON COLUMN chunks.embedding IS 'Vector embedding 768 chiều từ text-embedding-004';
+COMMENT ON COLUMN chunks.chunk_tsv IS 'tsvector (cấu hình vietnamese, bỏ dấu) của section_title/chunk_topic (A) và chunk_text (B)';
@@ -0,0 +1,216 @@
+"""
+Offline batch-job processor (Gemini Batch API).
+
+Writes one request line per PDF to <run_dir>/requests.jsonl, submits the file
+as a single batch job, polls it and ingests the results into the usual
+outputs (the consolidated dataset and/or data/processed JSON/CSV, see
+OUTPUT_FORMAT) and the extraction cache.
+
+Usage:
+    python scripts/batch_job.py run --input data/raw_pdfs/THONGBAO
+    python scripts/batch_job.py prepare --input data/raw_pdfs/THONGBAO --run-dir data/batch/thongbao
+    python scripts/batch_job.py submit --run-dir data/batch/thongbao
+    python scripts/batch_job.py ingest --run-dir data/batch/thongbao
+    python scripts/batch_job.py run --input data/raw_pdfs/THONGBAO --fake   # local fake endpoint
+
+Results are cached under the hash of the batch model itself (not the routing
+table), so process_document reuses them only for documents routed to that
+model. With --fake, outputs go to <run_dir>/outputs and nothing is cached.
+"""
+
+import sys
+import json
+import logging
+import argparse
+from pathlib import Path
+from datetime import datetime
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Load .env before importing the extractor (its settings are read at import time)
+from dotenv import load_dotenv
+load_dotenv()
+
+import src.extractors.gemini_extractor as extractor
+from src.extractors.gemini_extractor import get_extraction_config_hash, is_processed, save_outputs
+from src.extractors.prompts import get_full_analysis_prompt
+from src.extractors.schemas import DocumentData
+from src.extractors.cache import file_sha256, make_cache_key
+from src.extractors.file_registry import UploadRegistry
+from src.extractors.batch_job import (
+    LocalBatchBackend, build_request_line, iter_results, submit_batch, wait_for_batch, write_requests
+)
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Extract PDFs through a Gemini batch job.")
+    parser.add_argument('command', choices=['prepare', 'submit', 'ingest', 'run'])
+    parser.add_argument('--input', default="data/raw_pdfs/THONGBAO", help="Input folder with PDFs")
+    parser.add_argument('--run-dir', default=None, help="Folder for requests.jsonl and manifest.json")
+    parser.add_argument('--skip-existing', action='store_true', help="Skip PDFs whose JSON output exists")
+    parser.add_argument('--poll-seconds', type=float, default=60, help="Polling interval")
+    parser.add_argument('--timeout', type=float, default=None, help="Give up waiting after N seconds")
+    parser.add_argument('--fake', action='store_true', help="Use the local fake batch endpoint")
+    return parser.parse_args()
+
+
+def fake_responder(request: dict) -> str:
+    """Deterministic response used with --fake."""
+    prompt = request['contents'][0]['parts'][0]['text']
+    return json.dumps({
+        'document_metadata': {'DOC_TITLE': 'FAKE', 'DOC_TYPE': 'Thông báo'},
+        'chunk_metadata': [{'PAGE_NUMBER': 1, 'KEYWORDS': ['fake'], 'chunk_text': prompt[:80]}],
+    }, ensure_ascii=False)
+
+
+def load_manifest(run_dir: Path) -> dict:
+    with open(run_dir / 'manifest.json', 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(run_dir: Path, manifest: dict) -> None:
+    with open(run_dir / 'manifest.json', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+
+def prepare(client, registry: UploadRegistry, input_dir: Path, run_dir: Path, skip_existing: bool,
+            fake: bool = False) -> dict:
+    """Upload PDFs and write requests.jsonl + manifest.json."""
+    run_dir.mkdir(parents=True, exist_ok=True)
+    schema = DocumentData.model_json_schema()
+    entries = {}
+    lines = []
+    
+    for pdf_path in sorted(input_dir.glob("*.pdf")):
+        if skip_existing and is_processed(pdf_path.name):
+            print(f"⏭️  SKIP: {pdf_path.name} (exists)")
+            continue
+        uploaded = registry.get_or_upload(client, str(pdf_path))
+        key = pdf_path.stem
+        lines.append(build_request_line(
+            key, get_full_analysis_prompt(pdf_path.name), uploaded.uri,
+            schema, extractor.EXTRACTION_TEMPERATURE
+        ))
+        entries[key] = {
+            'pdf': str(pdf_path),
+            'file_name': pdf_path.name,
+            'sha256': file_sha256(str(pdf_path)),
+            'uploaded': uploaded.name,
+            # Chỉ file do lần chạy này tải lên mới được xóa sau khi ingest
+            'owned': registry.owns(uploaded.name),
+        }
+        print(f"📤 Uploaded: {pdf_path.name} → {uploaded.name}")
+    
+    count = write_requests(str(run_dir / 'requests.jsonl'), lines)
+    manifest = {
+        'created_at': datetime.now().isoformat(),
+        'model': extractor.EXTRACTION_MODEL,
+        'config_hash': get_extraction_config_hash(extractor.EXTRACTION_MODEL),
+        'fake': fake,
+        'job': None,
+        'entries': entries,
+    }
+    save_manifest(run_dir, manifest)
+    print(f"📝 {count} requests → {run_dir / 'requests.jsonl'}")
+    return manifest
+
+
+def submit(client, run_dir: Path) -> dict:
+    """Submit requests.jsonl as one batch job."""
+    manifest = load_manifest(run_dir)
+    job = submit_batch(client, str(run_dir / 'requests.jsonl'), manifest['model'], run_dir.name)
+    manifest['job'] = job.name
+    save_manifest(run_dir, manifest)
+    print(f"🚀 Submitted batch job: {job.name}")
+    return manifest
+
+
+def save_fake_output(data: DocumentData, run_dir: Path, file_name: str) -> None:
+    """Fake results stay inside the run folder, away from the real outputs."""
+    out_dir = run_dir / 'outputs'
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with open(out_dir / f"{Path(file_name).stem}_output.json", 'w', encoding='utf-8') as f:
+        f.write(data.model_dump_json(indent=2, ensure_ascii=False))
+
+
+def ingest(client, registry: UploadRegistry, run_dir: Path, poll_seconds: float, timeout) -> None:
+    """Wait for the job and write JSON/CSV outputs for each result line."""
+    manifest = load_manifest(run_dir)
+    fake = manifest.get('fake', False)
+    job = wait_for_batch(client, manifest['job'], poll_seconds=poll_seconds, timeout=timeout)
+    if job.state.name != 'JOB_STATE_SUCCEEDED':
+        print(f"❌ Batch job ended with {job.state.name}")
+        return
+    
+    success = 0
+    failed = 0
+    results = {}
+    for key, text, error in iter_results(client, job):
+        entry = manifest['entries'].get(key)
+        if entry is None:
+            continue
+        try:
+            if error:
+                raise ValueError(error)
+            data = DocumentData.model_validate_json(text)
+            data.document_metadata.FILE_NAME = entry['file_name']
+            if fake:
+                save_fake_output(data, run_dir, entry['file_name'])
+            else:
+                save_outputs(data, entry['file_name'])
+            # Key by the model that produced the result, never by the routing table
+            if not fake and manifest['config_hash'] == get_extraction_config_hash(manifest['model']):
+                extractor.extraction_cache.put(
+                    make_cache_key(entry['sha256'], manifest['config_hash']),
+                    data.model_dump(mode='json'),
+                    file_name=entry['file_name'], model=manifest['model']
+                )
+            results[key] = {'status': 'success', 'chunks': len(data.chunk_metadata)}
+            success += 1
+        except Exception as e:
+            results[key] = {'status': 'failed', 'error': str(e)}
+            failed += 1
+            print(f"❌ FAILED: {entry['file_name']} - {e}")
+    
+    # Uploaded PDFs are no longer needed; files reused from another run are left to expire
+    registry.release(client, [entry['uploaded'] for entry in manifest['entries'].values() if entry.get('owned')])
+    
+    missing = [k for k in manifest['entries'] if k not in results]
+    manifest['results'] = results
+    save_manifest(run_dir, manifest)
+    
+    print("\n" + "="*80)
+    print("📊 BATCH JOB SUMMARY")
+    print("="*80)
+    print(f"Total:      {len(manifest['entries'])}")
+    print(f"✅ Success:  {success}")
+    print(f"❌ Failed:   {failed}")
+    print(f"❔ Missing:  {len(missing)}")
+    print("="*80)
+
+
+def main():
+    """Entry point."""
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    run_dir = Path(args.run_dir or f"data/batch/batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    if args.fake:
+        client = LocalBatchBackend(fake_responder)
+        registry = UploadRegistry(str(run_dir / 'uploads.json'))
+    else:
+        client = extractor.get_client()
+        registry = extractor.upload_registry
+    poll_seconds = 0 if args.fake else args.poll_seconds
+    
+    if args.command in ('prepare', 'run'):
+        prepare(client, registry, Path(args.input), run_dir, args.skip_existing, fake=args.fake)
+    if args.command in ('submit', 'run'):
+        submit(client, run_dir)
+    if args.command in ('ingest', 'run'):
+        ingest(client, registry, run_dir, poll_seconds, args.timeout)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import os
+import sys
 import json
 from pathlib import Path
 from datetime import datetime
@@ -7,13 +8,24 @@ from google import genai
 from google.genai import types
 from dotenv import load_dotenv
 
-# Tải biến môi trường
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Tải biến môi trường (trước khi import thư viện: cấu hình được đọc lúc import)
 load_dotenv()
 
+from src.embedding_cache import EMBEDDING_MODEL, EMBEDDING_TASK_TYPE, EmbeddingCache
+from src.extractors.gemini_extractor import _extract_routed, model_router, record_usage, upload_registry
+from src.extractors.preflight import preflight_pdf
+from src.extractors.routing import extract_features
+
 # Khởi tạo client
 api_key = os.getenv("GEMINI_API_KEY")
 client = genai.Client(api_key=api_key)
 
+# Cache embedding trên đĩa, dùng chung với PgVectorStorage
+embedding_cache = EmbeddingCache()
+
 # --- Schema Pydantic ---
 class ThongBaoData(BaseModel):
     """Cấu trúc dữ liệu cho một Thông Báo cần lưu vào DB."""
@@ -35,12 +47,17 @@ def process_single_file(file_path: str) -> dict:
     print(f"📄 Đang xử lý: {file_name}")
     print(f"{'='*70}")
     
-    uploaded_file = None
     try:
-        # Upload file
-        print(f"🔄 Đang tải file lên...")
-        uploaded_file = client.files.upload(file=file_path)
-        print(f"✅ Đã tải lên: {uploaded_file.name}")
+        # PDF có lớp text tốt: gửi text thay cho file, không cần upload
+        preflight = preflight_pdf(file_path) if file_path.lower().endswith('.pdf') else None
+        if preflight and preflight.has_text_layer:
+            print(f"⚡ Dùng lớp text ({preflight.text_pages}/{preflight.page_count} trang), bỏ qua upload")
+            document_part = "Nội dung văn bản của tài liệu:\n\n" + preflight.page_tagged_text()
+        else:
+            # Upload file (hoặc dùng lại file đã tải lên trước đó)
+            print(f"🔄 Đang tải file lên...")
+            document_part = upload_registry.get_or_upload(client, file_path)
+            print(f"✅ Đã tải lên: {document_part.name}")
         
         # Trích xuất dữ liệu
         prompt = (
@@ -55,19 +72,25 @@ def process_single_file(file_path: str) -> dict:
             "LƯU Ý: Phải chính xác 100%, không thêm thắt hoặc bịa đặt thông tin."
         )
         
-        print(f"🤖 Đang phân tích với Gemini AI...")
-        response = client.models.generate_content(
-            model='gemini-2.5-flash',
-            contents=[prompt, uploaded_file],
-            config=types.GenerateContentConfig(
-                response_mime_type="application/json",
-                response_schema=ThongBaoData,
-                temperature=0.1,  # Độ sáng tạo thấp = chính xác cao
-            ),
-        )
-        
-        # Parse JSON
-        extracted_data = ThongBaoData.model_validate_json(response.text)
+        usage = {}
+
+        def extract(model: str) -> ThongBaoData:
+            print(f"🤖 Đang phân tích với Gemini AI ({model})...")
+            response = client.models.generate_content(
+                model=model,
+                contents=[prompt, document_part],
+                config=types.GenerateContentConfig(
+                    response_mime_type="application/json",
+                    response_schema=ThongBaoData,
+                    temperature=0.1,  # Độ sáng tạo thấp = chính xác cao
+                ),
+            )
+            record_usage(usage, response.usage_metadata)
+            # JSON không hợp lệ (ValidationError) thì _extract_routed nâng lên model mạnh hơn
+            return ThongBaoData.model_validate_json(response.text)
+
+        tier = model_router.route(extract_features(file_name, preflight))
+        extracted_data = _extract_routed(file_path, file_name, None, usage, preflight, tier, extract=extract)
         data_dict = extracted_data.model_dump()
         
         # Thêm file_name
@@ -75,16 +98,24 @@ def process_single_file(file_path: str) -> dict:
         
         # Tạo embedding
         print(f"🗺️ Đang tạo vector embedding...")
-        embed_response = client.models.embed_content(
-            model='text-embedding-004',
-            contents=data_dict['noi_dung_thuan_text'],
-            config=types.EmbedContentConfig(task_type="RETRIEVAL_DOCUMENT")
-        )
-        data_dict['vector_data'] = embed_response.embeddings[0].values
+        text = data_dict['noi_dung_thuan_text']
+        # Cùng model / task_type với PgVectorStorage để dùng chung entry cache
+        vector = embedding_cache.get(text, EMBEDDING_MODEL, EMBEDDING_TASK_TYPE)
+        if vector is None:
+            embed_response = client.models.embed_content(
+                model=EMBEDDING_MODEL,
+                contents=text,
+                config=types.EmbedContentConfig(task_type=EMBEDDING_TASK_TYPE)
+            )
+            vector = embed_response.embeddings[0].values
+            embedding_cache.put(text, vector, EMBEDDING_MODEL, EMBEDDING_TASK_TYPE)
+        else:
+            print(f"♻️ Dùng lại embedding đã cache")
+        data_dict['vector_data'] = vector
         
         # Metadata
         data_dict['processed_at'] = datetime.now().isoformat()
-        data_dict['model_used'] = 'gemini-2.5-flash'
+        data_dict['model_used'] = usage['model']
         
         print(f"✅ Hoàn tất xử lý: {file_name}")
         return data_dict
@@ -92,14 +123,6 @@ def process_single_file(file_path: str) -> dict:
     except Exception as e:
         print(f"❌ Lỗi khi xử lý {file_name}: {e}")
         return None
-        
-    finally:
-        if uploaded_file:
-            try:
-                client.files.delete(name=uploaded_file.name)
-                print(f"🗑️ Đã xóa file tạm")
-            except:
-                pass
 
 
 # --- CÁCH 1: Lưu từng file riêng biệt ---
@@ -299,6 +322,10 @@ def batch_process_documents(input_dir: str = ".", file_pattern: str = "*.pdf"):
         result = process_single_file(str(file_path))
         results.append(result)
     
+    # Bỏ các upload đã hết hạn; file còn hạn được giữ lại cho lần chạy sau
+    expired = upload_registry.gc(client)
+    print(f"🗑️ Đã bỏ {expired} upload hết hạn khỏi registry")
+    
     # Thống kê
     successful = len([r for r in results if r is not None])
     failed = len([r for r in results if r is None])
@@ -308,6 +335,12 @@ def batch_process_documents(input_dir: str = ".", file_pattern: str = "*.pdf"):
     print(f"{'='*70}")
     print(f"✅ Thành công: {successful}/{len(results)}")
     print(f"❌ Thất bại: {failed}/{len(results)}")
+    for name, tier in model_router.summary().items():
+        print(f"🧭 {name} ({tier['model']}): {tier['calls']} lần gọi, {tier['failures']} lỗi, "
+              f"TB {tier['avg_seconds']}s, ~${tier['cost_usd']:.4f}")
+    cache_stats = embedding_cache.stats()
+    print(f"🧠 Cache embedding: {cache_stats['hits']} hit / {cache_stats['misses']} miss "
+          f"({cache_stats['hit_rate']:.0%}), {cache_stats['entries']} entry")
     
     if successful == 0:
         print("\n⚠️ Không có dữ liệu để lưu!")
@@ -1,18 +1,39 @@
 """
 Simple batch processor using main.py logic.
 Processes all PDF files in a directory.
+
+Files are processed by a bounded thread pool (``--workers``) that shares the
+single Gemini client created in ``main``; each worker handles one PDF at a time.
 """
 
 import os
 import sys
+import json
+import time
+import argparse
 from pathlib import Path
 import logging
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, List, Optional
 
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from main import process_document
+# Load .env before importing the extractor (its settings are read at import time)
+from dotenv import load_dotenv
+load_dotenv()
+
+from src.extractors.cache import file_sha256
+from src.extractors.gemini_extractor import (
+    cleanup_run, is_processed, model_router, process_document, process_document_stream, save_cached_extraction,
+    stage_config_hashes
+)
+from src.metrics import export_run, metrics, start_exporters
+from src.run_manifest import RunManifest
+
+
+DEFAULT_WORKERS = int(os.getenv('BATCH_WORKERS', '4'))
 
 
 def setup_logging(log_dir: Path) -> logging.Logger:
@@ -24,7 +45,7 @@ def setup_logging(log_dir: Path) -> logging.Logger:
     
     logging.basicConfig(
         level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
+        format='%(asctime)s - %(threadName)s - %(levelname)s - %(message)s',
         handlers=[
             logging.FileHandler(log_file, encoding='utf-8'),
             logging.StreamHandler()
@@ -34,11 +55,102 @@ def setup_logging(log_dir: Path) -> logging.Logger:
     return logging.getLogger(__name__)
 
 
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Batch process PDFs with Gemini.")
+    parser.add_argument('--input', default="data/raw_pdfs/THONGBAO", help="Input folder with PDFs")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f"Number of concurrent extraction workers (default: {DEFAULT_WORKERS})")
+    parser.add_argument('--stream', action='store_true',
+                        help="Use streaming extraction (chunks are written as the model generates them)")
+    parser.add_argument('--release-uploads', action='store_true',
+                        help="Delete the PDFs this run uploaded instead of keeping them for reuse until they expire")
+    parser.add_argument('--force', action='store_true',
+                        help="Reprocess every file, ignoring the run manifest and existing outputs")
+    parser.add_argument('--retry-failed', action='store_true',
+                        help="Reset attempt counts so files that exhausted their retries are tried again")
+    return parser.parse_args()
+
+
+def process_one(pdf_path: Path, json_dir: Path, csv_dir: Path, logger: logging.Logger,
+                stream: bool = False, manifest: Optional[RunManifest] = None,
+                sha256: Optional[str] = None, stage_hashes: Optional[Dict[str, str]] = None,
+                stages: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Process a single PDF, record the outcome in the run manifest and return its per-file result.
+    `stages` comes from RunManifest.plan(); when 'extract' is not in it, only the outputs are rewritten.
+    """
+    stages = stages or ['extract']
+    if manifest is not None:
+        manifest.start(str(pdf_path), sha256, stage=stages[0])
+    result = _process_one(pdf_path, json_dir, csv_dir, logger, stream, save_only='extract' not in stages)
+    
+    if manifest is not None:
+        report = result['report']
+        if result['status'] == 'success':
+            manifest.finish(str(pdf_path), stage_hashes, chunks=result['chunks'], outcome=report.get('outcome'),
+                            durations=report.get('timings'), seconds=result['seconds'])
+        else:
+            manifest.fail(str(pdf_path), report.get('error_class') or result.get('error_class') or 'NoResult',
+                          report.get('error') or result['error'], stage=report.get('stage'),
+                          durations=report.get('timings'), seconds=result['seconds'])
+    return result
+
+
+def _process_one(pdf_path: Path, json_dir: Path, csv_dir: Path, logger: logging.Logger,
+                 stream: bool = False, save_only: bool = False) -> Dict[str, Any]:
+    """Process a single PDF and return its per-file result."""
+    started = time.perf_counter()
+    
+    result = {'file': pdf_path.name, 'status': 'failed', 'chunks': 0, 'seconds': 0.0, 'error': None}
+    report = {}
+    result['report'] = report
+    
+    try:
+        # Only the output config changed: rewrite the outputs from the extraction cache
+        data = save_cached_extraction(str(pdf_path), report=report) if save_only else None
+        if save_only and data is None:
+            logger.info(f"💾 {pdf_path.name}: no cached extraction, extracting again")
+        
+        if data is None and stream:
+            # Streaming mode writes outputs directly into data/processed
+            count = process_document_stream(str(pdf_path), report=report)
+            if count is None:
+                result['error'] = 'No result'
+            else:
+                result['status'] = 'success'
+                result['chunks'] = count
+            result['seconds'] = round(time.perf_counter() - started, 2)
+            return result
+        
+        # Process with main.py logic
+        if data is None:
+            data = process_document(str(pdf_path), report=report)
+        
+        if data:
+            # Outputs are already saved by process_document()
+            result['status'] = 'success'
+            result['chunks'] = len(data.chunk_metadata)
+        else:
+            result['error'] = 'No result'
+    
+    except Exception as e:
+        result['error'] = str(e)
+        result['error_class'] = e.__class__.__name__
+        logger.error(f"❌ ERROR: {pdf_path.name} - {e}")
+    
+    result['seconds'] = round(time.perf_counter() - started, 2)
+    return result
+
+
 def main():
     """Batch process PDFs in data/raw_pdfs/THONGBAO/"""
     
+    args = parse_args()
+    workers = max(1, args.workers)
+    
     # Paths
-    input_dir = Path("data/raw_pdfs/THONGBAO")
+    input_dir = Path(args.input)
     json_dir = Path("data/processed/json")
     csv_dir = Path("data/processed/csv")
     log_dir = Path("data/logs")
@@ -49,6 +161,7 @@ def main():
     
     # Setup logging
     logger = setup_logging(log_dir)
+    start_exporters()
     
     # Find PDFs
     pdf_files = sorted(input_dir.glob("*.pdf"))
@@ -56,63 +169,83 @@ def main():
     logger.info("="*80)
     logger.info(f"🚀 BATCH PROCESSING - {len(pdf_files)} files")
     logger.info("="*80)
-    logger.info(f"Input:  {input_dir}")
-    logger.info(f"Output: json={json_dir}, csv={csv_dir}")
+    logger.info(f"Input:   {input_dir}")
+    logger.info(f"Output:  json={json_dir}, csv={csv_dir}")
+    logger.info(f"Workers: {workers}")
     logger.info("="*80)
     
     # Stats
     success = 0
     failed = 0
     skipped = 0
+    results = []
+    
+    # Resume from the run manifest: skip finished files, retry failed/interrupted ones
+    # and re-run files whose extraction or output config changed
+    manifest = RunManifest()
+    manifest.recover()
+    if args.retry_failed:
+        manifest.reset_failed()
+    stage_hashes = stage_config_hashes()
     
-    # Process each file
+    pending = []
     for idx, pdf_path in enumerate(pdf_files, 1):
-        file_name = pdf_path.stem
-        json_output = json_dir / f"{file_name}_output.json"
-        
-        # Skip if exists
-        if json_output.exists():
-            logger.info(f"[{idx}/{len(pdf_files)}] ⏭️  SKIP: {pdf_path.name} (exists)")
+        sha256 = file_sha256(str(pdf_path))
+        stages, reason = manifest.plan(str(pdf_path), sha256, stage_hashes, force=args.force)
+        # Outputs from before the manifest existed: keep the old "exists -> skip" behaviour
+        if reason == 'new' and not args.force and is_processed(pdf_path.name):
+            stages, reason = [], 'exists'
+        if not stages:
+            logger.info(f"[{idx}/{len(pdf_files)}] ⏭️  SKIP: {pdf_path.name} ({reason})")
             skipped += 1
+            results.append({'file': pdf_path.name, 'status': 'skipped', 'chunks': 0, 'seconds': 0.0,
+                            'error': None, 'reason': reason})
             continue
+        if reason != 'new':
+            logger.info(f"[{idx}/{len(pdf_files)}] 🔁 {pdf_path.name}: {reason} -> {', '.join(stages)}")
+        pending.append((pdf_path, sha256, stages))
+    
+    # Process pending files concurrently
+    run_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='extract') as pool:
+        futures = {}
+        for pdf_path, sha256, stages in pending:
+            logger.info(f"🔄 Queued: {pdf_path.name}")
+            futures[pool.submit(process_one, pdf_path, json_dir, csv_dir, logger, args.stream,
+                                manifest, sha256, stage_hashes, stages)] = pdf_path
         
-        logger.info(f"\n[{idx}/{len(pdf_files)}] 🔄 Processing: {pdf_path.name}")
-        
-        try:
-            # Process with main.py logic
-            result = process_document(str(pdf_path))
+        for done, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            results.append(result)
             
-            if result:
-                # Files are already saved by process_document()
-                # Just move them to correct location
-                import shutil
-                
-                # Move JSON
-                src_json = Path(f"{file_name}_output.json")
-                if src_json.exists():
-                    shutil.move(str(src_json), str(json_output))
-                
-                # Move CSVs
-                src_doc_csv = Path(f"{file_name}_document.csv")
-                src_chunks_csv = Path(f"{file_name}_chunks.csv")
-                
-                if src_doc_csv.exists():
-                    shutil.move(str(src_doc_csv), str(csv_dir / src_doc_csv.name))
-                
-                if src_chunks_csv.exists():
-                    shutil.move(str(src_chunks_csv), str(csv_dir / src_chunks_csv.name))
-                
+            if result['status'] == 'success':
                 success += 1
-                logger.info(f"✅ SUCCESS: {pdf_path.name}")
+                logger.info(f"[{done}/{len(pending)}] ✅ SUCCESS: {result['file']} "
+                            f"({result['chunks']} chunks, {result['seconds']}s)")
             else:
                 failed += 1
-                logger.error(f"❌ FAILED: {pdf_path.name} - No result")
-        
-        except Exception as e:
-            failed += 1
-            logger.error(f"❌ ERROR: {pdf_path.name} - {e}")
+                logger.error(f"[{done}/{len(pending)}] ❌ FAILED: {result['file']} - {result['error']}")
+    wall_time = time.perf_counter() - run_started
+    
+    # Delete the prompt context cache and garbage-collect uploaded files
+    cleanup_run(release_uploads=args.release_uploads)
+    
+    # Per-file results, plus per-operation latency/token/cost metrics for the whole run
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    results_file = log_dir / f"batch_{timestamp}_results.json"
+    with open(results_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            'workers': workers,
+            'wall_seconds': round(wall_time, 2),
+            'tiers': model_router.summary(),
+            'metrics': export_run(),
+            'results': results
+        }, f, ensure_ascii=False, indent=2)
     
     # Summary
+    busy_time = sum(r['seconds'] for r in results)
+    salvaged = sum(1 for r in results if r.get('report', {}).get('outcome') in ('salvaged', 'continued'))
+    escalated = sum(1 for r in results if r.get('report', {}).get('escalations'))
     logger.info("\n" + "="*80)
     logger.info("📊 SUMMARY")
     logger.info("="*80)
@@ -120,6 +253,25 @@ def main():
     logger.info(f"✅ Success: {success}")
     logger.info(f"⏭️  Skipped: {skipped}")
     logger.info(f"❌ Failed:  {failed}")
+    if salvaged:
+        logger.info(f"🩹 Salvaged from malformed/truncated output: {salvaged} (see per-file results)")
+    logger.info(f"⏱️  Wall time: {wall_time:.1f}s (sum of per-file time: {busy_time:.1f}s, workers: {workers})")
+    if pending and wall_time > 0:
+        logger.info(f"🚀 Throughput: {len(pending) / wall_time * 60:.1f} files/min")
+    input_tokens = sum(r.get('report', {}).get('input_tokens', 0) for r in results)
+    cached_tokens = sum(r.get('report', {}).get('cached_input_tokens', 0) for r in results)
+    output_tokens = sum(r.get('report', {}).get('output_tokens', 0) for r in results)
+    if input_tokens:
+        logger.info(f"🔢 Input tokens: {input_tokens} (cached: {cached_tokens}, "
+                    f"{cached_tokens / input_tokens * 100:.0f}%), output tokens: {output_tokens}")
+    if escalated:
+        logger.info(f"⬆️  Escalated to a stronger model: {escalated}")
+    for name, tier in model_router.summary().items():
+        logger.info(f"🧭 Tier {name} ({tier['model']}): {tier['calls']} calls, {tier['failures']} failed, "
+                    f"avg {tier['avg_seconds']}s, ~${tier['cost_usd']:.4f}")
+    metrics.log_summary()
+    logger.info(f"🗂️  Run manifest: {manifest.path} {manifest.summary()}")
+    logger.info(f"📄 Per-file results: {results_file}")
     logger.info("="*80)
 
 
@@ -0,0 +1,220 @@
+"""
+Distributed extraction worker backed by the PostgreSQL `jobs` queue.
+
+Enqueue a corpus once, then start as many workers as you like, on this
+machine or others pointed at the same database (POSTGRES_HOST/PORT/...).
+Each worker leases one PDF at a time with FOR UPDATE SKIP LOCKED, extends
+its lease with a heartbeat thread while the model runs, and writes the
+document and its embedded chunks straight into `documents`/`chunks`. Jobs
+held by a dead worker are requeued once their lease expires.
+
+The `jobs` table is created by init.sql on a fresh database; for an existing
+docker-compose volume apply it once with
+    docker compose exec -T postgres psql -U chatbot_user -d chatbot_db < init.sql
+
+Usage:
+    python scripts/job_worker.py enqueue --input data/raw_pdfs/THONGBAO
+    python scripts/job_worker.py enqueue --input /mnt/corpus --store-data   # workers without the files
+    python scripts/job_worker.py work                  # run until stopped
+    python scripts/job_worker.py work --exit-when-empty --max-jobs 50
+    python scripts/job_worker.py status
+    python scripts/job_worker.py retry-failed
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import logging
+import tempfile
+import threading
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Load .env before importing the extractor (its settings are read at import time)
+from dotenv import load_dotenv
+load_dotenv()
+
+from src.job_queue import DEFAULT_LEASE_SECONDS, JobQueue, default_worker_id
+from src.metrics import export_run, metrics, start_exporters
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Distributed extraction worker on the PostgreSQL jobs queue.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    enqueue = sub.add_parser('enqueue', help="Add PDFs to the queue")
+    enqueue.add_argument('--input', default="data/raw_pdfs/THONGBAO", help="Input folder with PDFs")
+    enqueue.add_argument('--store-data', action='store_true',
+                         help="Store the PDF bytes in the table for workers that cannot read --input")
+    enqueue.add_argument('--priority', type=int, default=0, help="Higher priority jobs are leased first")
+
+    work = sub.add_parser('work', help="Lease and process jobs")
+    work.add_argument('--worker-id', default=default_worker_id(), help="Worker name (default: host:pid)")
+    work.add_argument('--lease-seconds', type=int, default=DEFAULT_LEASE_SECONDS,
+                      help="Lease length; a job is requeued if no heartbeat arrives in time")
+    work.add_argument('--heartbeat-seconds', type=float, default=None,
+                      help="Heartbeat interval (default: a third of --lease-seconds)")
+    work.add_argument('--poll-seconds', type=float, default=5.0, help="Sleep between polls of an empty queue")
+    work.add_argument('--max-jobs', type=int, default=None, help="Stop after this many jobs")
+    work.add_argument('--exit-when-empty', action='store_true', help="Stop when the queue is empty")
+
+    sub.add_parser('status', help="Show job counts and active leases")
+    sub.add_parser('retry-failed', help="Requeue failed jobs with a fresh attempt count")
+    return parser.parse_args()
+
+
+class Heartbeat:
+    """Background thread that keeps a job's lease alive while it is processed."""
+
+    def __init__(self, queue: JobQueue, job, worker_id: str, interval: float):
+        self.queue = queue
+        self.job = job
+        self.worker_id = worker_id
+        self.interval = interval
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"heartbeat-{job.job_id}", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if not self.queue.heartbeat(self.job, self.worker_id):
+                    self.lost = True
+                    logger.warning(f"⚠️ Lost lease on job {self.job.job_id} ({self.job.file_name})")
+                    return
+            except Exception as e:
+                # A transient database error: keep trying until the lease runs out
+                logger.warning(f"⚠️ Heartbeat failed for job {self.job.job_id}: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def process_job(queue: JobQueue, storage, job, worker_id: str, heartbeat_seconds: float) -> bool:
+    """Extract, embed and store one leased job. Returns True when its results were written."""
+    from src.extractors.gemini_extractor import process_document
+
+    tmp_dir = None
+    try:
+        file_path = job.file_path
+        if job.has_data:
+            tmp_dir = tempfile.mkdtemp(prefix='job_')
+            file_path = os.path.join(tmp_dir, job.file_name)
+            with open(file_path, 'wb') as f:
+                f.write(queue.read_data(job))
+        elif not os.path.exists(file_path):
+            raise FileNotFoundError(f"{file_path} is not readable on this worker (enqueue with --store-data)")
+
+        with Heartbeat(queue, job, worker_id, heartbeat_seconds) as heartbeat:
+            report = {}
+            data = process_document(file_path, report=report)
+            if data is None:
+                raise RuntimeError(f"extraction failed ({report.get('error_class') or report.get('outcome', 'failed')})")
+            chunks = [chunk.model_dump(mode='json') for chunk in data.chunk_metadata]
+            embeddings = storage.create_embeddings([chunk['chunk_text'] for chunk in chunks])
+            if heartbeat.lost:
+                return False
+
+        return queue.complete(job, worker_id, data.document_metadata.model_dump(mode='json'), chunks, embeddings)
+    except Exception as e:
+        logger.error(f"❌ Job {job.job_id} ({job.file_name}) failed: {e}")
+        try:
+            queue.fail(job, worker_id, f"{e.__class__.__name__}: {e}")
+        except Exception as fail_error:
+            # e.g. the database is down: the lease expires and requeue_expired() hands the job back
+            logger.error(f"❌ Could not record the failure of job {job.job_id}, "
+                         f"leaving it to lease expiry: {fail_error}")
+        return False
+    finally:
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def work(queue: JobQueue, storage, args) -> None:
+    """Lease and process jobs until stopped, the queue is empty or --max-jobs is reached."""
+    from src.extractors.gemini_extractor import cleanup_run
+
+    heartbeat_seconds = args.heartbeat_seconds or max(1.0, args.lease_seconds / 3)
+    start_exporters()
+    done = failed = 0
+    logger.info(f"👷 Worker {args.worker_id} started (lease {args.lease_seconds}s, heartbeat {heartbeat_seconds:.0f}s)")
+    try:
+        while args.max_jobs is None or done + failed < args.max_jobs:
+            queue.requeue_expired()
+            job = queue.lease(args.worker_id)
+            if job is None:
+                if args.exit_when_empty:
+                    logger.info("📭 Queue is empty")
+                    break
+                time.sleep(args.poll_seconds)
+                continue
+
+            logger.info(f"📄 Job {job.job_id}: {job.file_name} (attempt {job.attempts})")
+            started = time.perf_counter()
+            if process_job(queue, storage, job, args.worker_id, heartbeat_seconds):
+                done += 1
+            else:
+                failed += 1
+            logger.info(f"⏱️  Job {job.job_id} took {time.perf_counter() - started:.1f}s")
+            # Refresh METRICS_TEXTFILE (if set) after every job
+            export_run()
+    except KeyboardInterrupt:
+        logger.info("🛑 Stopped (the current job will be requeued when its lease expires)")
+    finally:
+        cleanup_run()
+        export_run()
+        metrics.log_summary()
+        if storage.embedding_cache is not None:
+            storage.embedding_cache.log_stats()
+        logger.info(f"👷 Worker {args.worker_id}: {done} done, {failed} failed")
+
+
+def show_status(queue: JobQueue) -> None:
+    counts = queue.summary()
+    print("📊 Jobs: " + ", ".join(f"{status}={counts.get(status, 0)}"
+                                  for status in ('queued', 'leased', 'done', 'failed')))
+    for lease in queue.workers():
+        print(f"  👷 {lease['worker_id']}: job {lease['job_id']} {lease['file_name']} "
+              f"(attempt {lease['attempts']}, heartbeat {lease['heartbeat_at']}, until {lease['leased_until']})")
+
+
+def main():
+    """Dispatch the sub-command."""
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    from src.pgvector_storage import PgVectorStorage
+    storage = PgVectorStorage()
+    queue = JobQueue(storage, lease_seconds=getattr(args, 'lease_seconds', DEFAULT_LEASE_SECONDS))
+
+    if args.command == 'enqueue':
+        input_dir = Path(args.input)
+        if not input_dir.exists():
+            logger.error(f"❌ Folder not found: {input_dir}")
+            return
+        pdf_files = sorted(input_dir.glob("*.pdf"))
+        logger.info(f"📁 {len(pdf_files)} PDF files in {input_dir}")
+        queue.enqueue((str(pdf) for pdf in pdf_files), store_data=args.store_data, priority=args.priority)
+        show_status(queue)
+    elif args.command == 'work':
+        work(queue, storage, args)
+    elif args.command == 'status':
+        show_status(queue)
+    elif args.command == 'retry-failed':
+        print(f"♻️ Requeued {queue.retry_failed()} failed jobs")
+
+
+if __name__ == "__main__":
+    main()
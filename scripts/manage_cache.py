@@ -0,0 +1,65 @@
+"""
+Inspect and prune the local extraction cache.
+
+Usage:
+    python scripts/manage_cache.py list
+    python scripts/manage_cache.py prune --max-mb 200
+    python scripts/manage_cache.py prune --older-than-days 30
+    python scripts/manage_cache.py clear
+"""
+
+import sys
+import argparse
+from pathlib import Path
+from datetime import datetime
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.extractors.cache import ExtractionCache, DEFAULT_CACHE_DIR
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Manage the extraction cache.")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help="Cache directory")
+    sub = parser.add_subparsers(dest='command', required=True)
+    
+    sub.add_parser('list', help="List cache entries (most recently used first)")
+    
+    prune = sub.add_parser('prune', help="Remove old entries / shrink the cache")
+    prune.add_argument('--max-mb', type=float, default=None, help="Shrink cache to this size (LRU)")
+    prune.add_argument('--older-than-days', type=float, default=None, help="Remove entries unused for N days")
+    
+    sub.add_parser('clear', help="Remove every entry")
+    return parser.parse_args()
+
+
+def main():
+    """Entry point."""
+    args = parse_args()
+    cache = ExtractionCache(cache_dir=args.cache_dir)
+    
+    if args.command == 'list':
+        entries = cache.list_entries()
+        print(f"📦 {len(entries)} entries, {cache.total_size() / 1024 / 1024:.2f} MB in {args.cache_dir}")
+        for entry in entries:
+            last_used = datetime.fromtimestamp(entry['last_used']).strftime("%Y-%m-%d %H:%M")
+            print(f"  {entry['key']}  {entry['size'] / 1024:8.1f} KB  {entry['chunks']:4d} chunks  "
+                  f"{last_used}  {entry['model']}  {entry['file_name']}")
+    
+    elif args.command == 'prune':
+        if args.max_mb is None and args.older_than_days is None:
+            print("⚠️ Nothing to do: pass --max-mb and/or --older-than-days")
+            return
+        max_bytes = int(args.max_mb * 1024 * 1024) if args.max_mb is not None else None
+        removed = cache.prune(older_than_days=args.older_than_days, max_bytes=max_bytes)
+        print(f"🗑️ Removed {removed} entries, {cache.total_size() / 1024 / 1024:.2f} MB left")
+    
+    elif args.command == 'clear':
+        removed = cache.clear()
+        print(f"🗑️ Removed {removed} entries")
+
+
+if __name__ == "__main__":
+    main()
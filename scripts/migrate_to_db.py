@@ -0,0 +1,366 @@
+"""
+Bulk-load the processed extraction outputs into PostgreSQL/pgvector.
+
+Streams every document of the consolidated dataset and every `*_output.json`
+under data/processed/json (see --source), embeds the chunks in
+large batches (through the embedding cache, so a reload of unchanged text
+makes no API calls), and loads each batch of documents in one transaction:
+
+    binary COPY -> temp stage tables -> INSERT ... SELECT ... ON CONFLICT merge
+
+A reloaded document replaces its chunks (chunks that are no longer in the
+output are deleted). As in PgVectorStorage.save_document, a chunk whose
+embedding could not be created is not written (a stored copy is left as it
+is). With --no-embed, chunks are loaded without embeddings and keep the one
+already stored when their text did not change.
+
+By default both sources are read: the consolidated dataset (DATASET_DIR,
+OUTPUT_FORMAT=dataset) and the `*_output.json` files under --input
+(OUTPUT_FORMAT=files); a file found in both is loaded once, from the
+dataset.
+
+For a full reload, --truncate empties `chunks`/`documents` first and
+--defer-index drops the HNSW index and builds it once at the end, which is
+much faster than maintaining it row by row.
+
+Usage:
+    python scripts/migrate_to_db.py
+    python scripts/migrate_to_db.py --truncate --defer-index --maintenance-work-mem 2GB
+    python scripts/migrate_to_db.py --source dataset --batch-docs 1000 --embed-workers 8
+    python scripts/migrate_to_db.py --source json --input data/processed/json --no-embed --dry-run
+"""
+
+import sys
+import json
+import time
+import argparse
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Load .env before importing the library (its settings are read at import time)
+from dotenv import load_dotenv
+load_dotenv()
+
+from pydantic import ValidationError
+
+from src.extractors.schemas import DocumentData
+from src.metrics import export_run, metrics, start_exporters
+from src.pg_copy import BinaryCopyWriter
+
+logger = logging.getLogger(__name__)
+
+Document = Tuple[Dict[str, Any], List[Dict[str, Any]]]
+
+DOCUMENT_FIELDS = (
+    ('doc_id', 'DOC_ID', 'text'),
+    ('file_name', 'FILE_NAME', 'text'),
+    ('doc_title', 'DOC_TITLE', 'text'),
+    ('doc_type', 'DOC_TYPE', 'text'),
+    ('issue_number', 'ISSUE_NUMBER', 'text'),
+    ('issuing_authority', 'ISSUING_AUTHORITY', 'text'),
+    ('issuing_dept', 'ISSUING_DEPT', 'text'),
+    ('issue_date', 'ISSUE_DATE', 'date'),
+    ('effective_date', 'EFFECTIVE_DATE', 'text'),
+    ('expiration_date', 'EXPIRATION_DATE', 'date'),
+    ('major_topic', 'MAJOR_TOPIC', 'text'),
+)
+DOCUMENT_COLUMNS = [column for column, _, _ in DOCUMENT_FIELDS]
+
+# Same order as PgVectorStorage._chunk_row
+CHUNK_COLUMNS = ['chunk_id', 'doc_id', 'page_number', 'section_title', 'chunk_topic', 'content_type',
+                 'specific_target', 'applicable_cohort', 'value', 'unit', 'keywords', 'chunk_text', 'embedding']
+CHUNK_KINDS = ['text', 'text', 'int4', 'text', 'text', 'text', 'text', 'text', 'text', 'text', 'text[]', 'text', 'vector']
+
+STAGE_SQL = f"""
+    CREATE TEMP TABLE IF NOT EXISTS stage_documents (
+        seq int4, {', '.join(f"{column} {'date' if kind == 'date' else 'text'}" for column, _, kind in DOCUMENT_FIELDS)}
+    );
+    CREATE TEMP TABLE IF NOT EXISTS stage_chunks (
+        seq int4, chunk_id text, doc_id text, page_number int4, section_title text, chunk_topic text,
+        content_type text, specific_target text, applicable_cohort text, value text, unit text,
+        keywords text[], chunk_text text, embedding vector, skip bool
+    );
+"""
+
+# DISTINCT ON: một khóa xuất hiện nhiều lần trong lô thì bản cuối cùng thắng
+# (ON CONFLICT không cho phép cập nhật cùng một dòng hai lần trong một câu lệnh)
+MERGE_SQL = f"""
+    INSERT INTO documents ({', '.join(DOCUMENT_COLUMNS)})
+    SELECT DISTINCT ON (doc_id) {', '.join(DOCUMENT_COLUMNS)}
+    FROM stage_documents ORDER BY doc_id, seq DESC
+    ON CONFLICT (doc_id) DO UPDATE SET
+        {', '.join(f'{column} = EXCLUDED.{column}' for column in DOCUMENT_COLUMNS[1:])},
+        updated_at = CURRENT_TIMESTAMP;
+
+    DELETE FROM chunks c USING stage_documents d
+    WHERE c.doc_id = d.doc_id
+      AND NOT EXISTS (SELECT 1 FROM stage_chunks s WHERE s.chunk_id = c.chunk_id);
+
+    -- skip: không tạo được embedding, giữ nguyên bản đang lưu (nếu có)
+    INSERT INTO chunks ({', '.join(CHUNK_COLUMNS)})
+    SELECT {', '.join(CHUNK_COLUMNS)} FROM (
+        SELECT DISTINCT ON (chunk_id) * FROM stage_chunks ORDER BY chunk_id, seq DESC
+    ) latest
+    WHERE NOT skip
+    ON CONFLICT (chunk_id) DO UPDATE SET
+        {', '.join(f'{column} = EXCLUDED.{column}' for column in CHUNK_COLUMNS[1:-1])},
+        embedding = COALESCE(EXCLUDED.embedding,
+                             CASE WHEN chunks.chunk_text = EXCLUDED.chunk_text THEN chunks.embedding END),
+        updated_at = CURRENT_TIMESTAMP;
+"""
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Bulk-load processed JSON outputs into PostgreSQL with binary COPY.")
+    parser.add_argument('--source', choices=['all', 'dataset', 'json'], default='all',
+                        help="Read the consolidated dataset, the *_output.json files, or both (default: all)")
+    parser.add_argument('--input', default="data/processed/json", help="Folder with *_output.json files (recursive)")
+    parser.add_argument('--batch-docs', type=int, default=500, help="Documents per transaction (default: 500)")
+    parser.add_argument('--embed-workers', type=int, default=4, help="Batches embedded concurrently (default: 4)")
+    parser.add_argument('--no-embed', action='store_true',
+                        help="Load without embeddings (unchanged chunks keep their stored embedding)")
+    parser.add_argument('--truncate', action='store_true', help="Empty chunks and documents before loading")
+    parser.add_argument('--defer-index', action='store_true',
+                        help="Drop the HNSW index(es) on chunks and rebuild them after the load")
+    parser.add_argument('--maintenance-work-mem', default='1GB', help="maintenance_work_mem for the index build")
+    parser.add_argument('--parallel-workers', type=int, default=4,
+                        help="max_parallel_maintenance_workers for the index build")
+    parser.add_argument('--dry-run', action='store_true', help="Read, embed and encode only; do not write")
+    return parser.parse_args()
+
+
+# --- reading -------------------------------------------------------------------------------
+
+def iter_json_outputs(input_dir: Path, errors: List[str]) -> Iterator[Document]:
+    """Validated documents from the *_output.json files, one file at a time."""
+    for path in sorted(input_dir.rglob("*_output.json")):
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = DocumentData.model_validate(json.load(f))
+        except (OSError, ValueError, ValidationError) as e:
+            logger.warning(f"⚠️ Skipping {path.name}: {e.__class__.__name__}: {str(e).splitlines()[0]}")
+            errors.append(str(path))
+            continue
+        yield (data.document_metadata.model_dump(mode='json'),
+               [chunk.model_dump(mode='json') for chunk in data.chunk_metadata])
+
+
+def iter_dataset(errors: List[str]) -> Iterator[Document]:
+    """Documents of the consolidated dataset."""
+    from src.dataset_storage import DocumentDataset
+
+    for entry in DocumentDataset().iter_documents():
+        try:
+            data = DocumentData.model_validate(entry)
+        except ValidationError as e:
+            doc_id = entry.get('document_metadata', {}).get('DOC_ID')
+            logger.warning(f"⚠️ Skipping dataset document {doc_id}: {str(e).splitlines()[0]}")
+            errors.append(str(doc_id))
+            continue
+        yield (data.document_metadata.model_dump(mode='json'),
+               [chunk.model_dump(mode='json') for chunk in data.chunk_metadata])
+
+
+def unique_documents(sources: List[Iterator[Document]]) -> Iterator[Document]:
+    """
+    Chain the sources; a file already read from an earlier source is skipped.
+
+    Documents are matched by FILE_NAME (DOC_ID is a new uuid for every
+    extraction, so the dataset and JSON copies of one file never share it).
+    """
+    seen = set()
+    for source in sources:
+        for doc_meta, chunks in source:
+            key = doc_meta.get('FILE_NAME') or doc_meta.get('DOC_ID')
+            if key in seen:
+                continue
+            seen.add(key)
+            yield doc_meta, chunks
+
+
+def batched(documents: Iterator[Document], size: int) -> Iterator[List[Document]]:
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# --- encoding ------------------------------------------------------------------------------
+
+def encode_batch(storage, batch: List[Document], embed: bool) -> Dict[str, Any]:
+    """Embed the chunks of a batch and encode both stage tables as binary COPY streams."""
+    chunks = [(doc_meta, chunk) for doc_meta, doc_chunks in batch for chunk in doc_chunks]
+    embeddings: List[Optional[List[float]]] = [None] * len(chunks)
+    if embed and chunks:
+        embeddings = storage.create_embeddings([chunk['chunk_text'] for _, chunk in chunks])
+
+    documents = BinaryCopyWriter(['int4'] + [kind for _, _, kind in DOCUMENT_FIELDS])
+    for seq, (doc_meta, _) in enumerate(batch):
+        documents.write_row([seq] + [doc_meta.get(key) for _, key, _ in DOCUMENT_FIELDS])
+
+    rows = BinaryCopyWriter(['int4'] + CHUNK_KINDS + ['bool'])
+    missing = 0
+    for seq, ((doc_meta, chunk), embedding) in enumerate(zip(chunks, embeddings)):
+        # Still staged so the stale-chunk DELETE keeps it, but not written (like save_document)
+        skip = embed and embedding is None
+        if skip:
+            missing += 1
+            logger.warning(f"Skipping chunk {chunk.get('CHUNK_ID')}: no embedding")
+        rows.write_row([seq] + list(storage._chunk_row(doc_meta.get('DOC_ID'), chunk, embedding)) + [skip])
+    return {'documents': documents, 'chunks': rows, 'missing_embeddings': missing}
+
+
+# --- loading -------------------------------------------------------------------------------
+
+def load_batch(conn, encoded: Dict[str, Any]) -> None:
+    """COPY one encoded batch into the stage tables and merge it, in one transaction."""
+    with conn, conn.cursor() as cur:
+        with metrics.timed('db.copy_stage'):
+            cur.execute("TRUNCATE stage_documents, stage_chunks")
+            cur.copy_expert("COPY stage_documents FROM STDIN WITH (FORMAT binary)", encoded['documents'].getvalue())
+            cur.copy_expert("COPY stage_chunks FROM STDIN WITH (FORMAT binary)", encoded['chunks'].getvalue())
+            cur.execute("ANALYZE stage_documents; ANALYZE stage_chunks")
+        with metrics.timed('db.merge_stage'):
+            cur.execute(MERGE_SQL)
+
+
+def drop_vector_indexes(conn) -> List[Tuple[str, str]]:
+    """Drop the HNSW/IVFFlat indexes on chunks; returns their (name, definition)."""
+    with conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT indexname, indexdef FROM pg_indexes
+            WHERE tablename = 'chunks' AND (indexdef ILIKE '%USING hnsw%' OR indexdef ILIKE '%USING ivfflat%')
+        """)
+        indexes = cur.fetchall()
+        for name, definition in indexes:
+            logger.info(f"🗑️  Dropping {name} (rebuilt after the load): {definition}")
+            cur.execute(f'DROP INDEX IF EXISTS "{name}"')
+    return indexes
+
+
+def build_indexes(conn, indexes: List[Tuple[str, str]], maintenance_work_mem: str, parallel_workers: int) -> None:
+    for name, definition in indexes:
+        logger.info(f"🏗️  Building {name} ...")
+        started = time.perf_counter()
+        with conn, conn.cursor() as cur, metrics.timed('db.build_index', index=name):
+            cur.execute("SET LOCAL maintenance_work_mem = %s", (maintenance_work_mem,))
+            cur.execute("SET LOCAL max_parallel_maintenance_workers = %s", (parallel_workers,))
+            cur.execute(definition.replace('CREATE INDEX ', 'CREATE INDEX IF NOT EXISTS ', 1))
+        logger.info(f"✅ {name} built in {time.perf_counter() - started:.1f}s")
+
+
+def main():
+    """Load every processed document into PostgreSQL."""
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    start_exporters()
+
+    from src.pgvector_storage import PgVectorStorage
+    storage = PgVectorStorage()
+
+    errors: List[str] = []
+    sources = []
+    if args.source in ('all', 'dataset'):
+        sources.append(iter_dataset(errors))
+        logger.info("📦 Source: consolidated dataset")
+    input_dir = Path(args.input)
+    if args.source in ('all', 'json'):
+        if input_dir.exists():
+            sources.append(iter_json_outputs(input_dir, errors))
+            logger.info(f"📁 Source: {input_dir}/**/*_output.json")
+        elif args.source == 'json':
+            logger.error(f"❌ Folder not found: {input_dir}")
+            sys.exit(1)
+    documents = unique_documents(sources)
+
+    # Một kết nối riêng (không qua pool) cho cả lần nạp: bảng tạm gắn với session
+    conn = None if args.dry_run else storage.get_connection()
+    indexes: List[Tuple[str, str]] = []
+    loaded_docs = loaded_chunks = missing = 0
+    copied_bytes = 0
+    started = time.perf_counter()
+    try:
+        if conn is not None:
+            with conn, conn.cursor() as cur:
+                cur.execute(STAGE_SQL)
+                if args.truncate:
+                    # TRUNCATE documents CASCADE would also empty `jobs`; DELETE sets jobs.doc_id to NULL
+                    logger.info("🧹 Emptying chunks and documents")
+                    cur.execute("TRUNCATE chunks")
+                    cur.execute("DELETE FROM documents")
+            if args.defer_index:
+                indexes = drop_vector_indexes(conn)
+
+        # Nhúng các lô kế tiếp song song trong khi lô hiện tại được COPY
+        with ThreadPoolExecutor(max_workers=max(1, args.embed_workers), thread_name_prefix='embed') as pool:
+            pending = deque()
+
+            def load_next():
+                nonlocal loaded_docs, loaded_chunks, missing, copied_bytes
+                size, encoded = pending.popleft()
+                encoded = encoded.result()
+                if conn is not None:
+                    load_batch(conn, encoded)
+                loaded_docs += size
+                loaded_chunks += encoded['chunks'].rows - encoded['missing_embeddings']
+                missing += encoded['missing_embeddings']
+                copied_bytes += encoded['documents'].nbytes() + encoded['chunks'].nbytes()
+                elapsed = time.perf_counter() - started
+                logger.info(f"📥 {loaded_docs} documents, {loaded_chunks} chunks "
+                            f"({loaded_docs / elapsed:.1f} docs/s, {loaded_chunks / elapsed:.0f} chunks/s)")
+
+            for batch in batched(documents, max(1, args.batch_docs)):
+                pending.append((len(batch), pool.submit(encode_batch, storage, batch, not args.no_embed)))
+                if len(pending) > max(1, args.embed_workers):
+                    load_next()
+            while pending:
+                load_next()
+
+        if conn is not None:
+            with conn, conn.cursor() as cur:
+                cur.execute("ANALYZE documents; ANALYZE chunks")
+    except Exception as e:
+        logger.error(f"❌ Load stopped after {loaded_docs} documents: {e.__class__.__name__}: {e}")
+        raise
+    finally:
+        # Luôn dựng lại index đã xóa, kể cả khi lần nạp lỗi giữa chừng
+        if conn is not None:
+            try:
+                if indexes:
+                    build_indexes(conn, indexes, args.maintenance_work_mem, args.parallel_workers)
+            finally:
+                conn.close()
+        if storage.embedding_cache is not None:
+            storage.embedding_cache.log_stats()
+
+    elapsed = time.perf_counter() - started
+    summary = export_run()
+    logger.info("\n" + "=" * 80)
+    logger.info("📊 LOAD SUMMARY" + (" (dry run)" if args.dry_run else ""))
+    logger.info("=" * 80)
+    logger.info(f"✅ Documents: {loaded_docs}   Chunks: {loaded_chunks}   "
+                f"Stage data: {copied_bytes / 1024 / 1024:.1f} MB")
+    if missing:
+        logger.info(f"⚠️  Chunks skipped (no embedding): {missing}")
+    if errors:
+        logger.info(f"❌ Unreadable/invalid documents: {len(errors)} (e.g. {errors[0]})")
+    logger.info(f"⏱️  Total: {elapsed:.1f}s ({loaded_chunks / elapsed:.0f} chunks/s)" if elapsed else "")
+    for name, op in summary['operations'].items():
+        if name.startswith(('db.copy_stage', 'db.merge_stage', 'db.build_index', 'gemini.embed_content')):
+            logger.info(f"   {name}: {op['calls']} calls, {op['seconds']}s (p50 {op['p50_seconds']}s)")
+    logger.info("=" * 80)
+
+
+if __name__ == "__main__":
+    main()
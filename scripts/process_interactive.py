@@ -2,16 +2,22 @@
 Interactive batch processor - Process one file at a time with user confirmation.
 """
 
-import os
 import sys
 from pathlib import Path
+import time
 import logging
 from datetime import datetime
 
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from main import process_document
+# Load .env before importing the extractor (its settings are read at import time)
+from dotenv import load_dotenv
+load_dotenv()
+
+from src.extractors.cache import file_sha256
+from src.extractors.gemini_extractor import process_document, cleanup_run, is_processed, stage_config_hashes
+from src.run_manifest import RunManifest
 
 
 def setup_logging(log_dir: Path) -> logging.Logger:
@@ -66,14 +72,23 @@ def main():
     skipped = 0
     stopped = 0
     
+    # Resume from the run manifest (shared with batch_process_simple.py)
+    manifest = RunManifest()
+    manifest.recover()
+    stage_hashes = stage_config_hashes()
+    
     # Process each file
     for idx, pdf_path in enumerate(pdf_files, 1):
         file_name = pdf_path.stem
         json_output = json_dir / f"{file_name}_output.json"
+        sha256 = file_sha256(str(pdf_path))
+        stages, reason = manifest.plan(str(pdf_path), sha256, stage_hashes)
+        if reason == 'new' and is_processed(pdf_path.name):
+            stages, reason = [], 'already processed'
         
-        # Skip if exists
-        if json_output.exists():
-            print(f"[{idx}/{len(pdf_files)}] ⏭️  SKIP: {pdf_path.name} (already processed)")
+        # Skip if finished (or out of retries)
+        if not stages:
+            print(f"[{idx}/{len(pdf_files)}] ⏭️  SKIP: {pdf_path.name} ({reason})")
             skipped += 1
             
             # Ask if continue
@@ -88,12 +103,16 @@ def main():
                 continue
         
         print(f"\n{'='*80}")
-        print(f"[{idx}/{len(pdf_files)}] 🔄 Processing: {pdf_path.name}")
+        print(f"[{idx}/{len(pdf_files)}] 🔄 Processing: {pdf_path.name}" + (f" ({reason})" if reason != 'new' else ""))
         print(f"{'='*80}")
         
+        result = None
+        report = {}
+        started = time.perf_counter()
+        manifest.start(str(pdf_path), sha256, stage='extract')
         try:
             # Process with main.py logic
-            result = process_document(str(pdf_path))
+            result = process_document(str(pdf_path), report=report)
             
             if result:
                 # Files are already saved by process_document()
@@ -119,13 +138,11 @@ def main():
                     dest = csv_dir / src_chunks_csv.name
                     shutil.move(str(src_chunks_csv), str(dest))
                     print(f"✅ Saved: {dest}")
-                    
-                    # Count chunks
-                    import csv
-                    with open(dest, 'r', encoding='utf-8-sig') as f:
-                        reader = csv.DictReader(f)
-                        chunks = list(reader)
-                        print(f"📊 Chunks extracted: {len(chunks)}")
+                
+                print(f"📊 Chunks extracted: {len(result.chunk_metadata)}")
+                manifest.finish(str(pdf_path), stage_hashes, chunks=len(result.chunk_metadata),
+                                outcome=report.get('outcome'), durations=report.get('timings'),
+                                seconds=round(time.perf_counter() - started, 2))
                 
                 success += 1
                 logger.info(f"✅ SUCCESS: {pdf_path.name}")
@@ -136,11 +153,16 @@ def main():
                 print(f"{'─'*80}")
             else:
                 failed += 1
+                manifest.fail(str(pdf_path), report.get('error_class', 'NoResult'), report.get('error'),
+                              stage=report.get('stage'), durations=report.get('timings'),
+                              seconds=round(time.perf_counter() - started, 2))
                 logger.error(f"❌ FAILED: {pdf_path.name} - No result")
                 print(f"❌ FAILED: No result returned")
         
         except Exception as e:
             failed += 1
+            manifest.fail(str(pdf_path), e.__class__.__name__, str(e), stage=report.get('stage'),
+                          durations=report.get('timings'), seconds=round(time.perf_counter() - started, 2))
             logger.error(f"❌ ERROR: {pdf_path.name} - {e}")
             print(f"❌ ERROR: {e}")
         
@@ -158,25 +180,19 @@ def main():
             stopped = len(pdf_files) - idx
             print("\n⚠️  Stopped by user")
             break
-        elif choice == 'v' and json_output.exists():
-            import json
-            with open(json_output, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                print(f"\n📄 Document: {data['document_metadata'].get('DOC_TITLE', 'N/A')}")
-                print(f"📊 Chunks: {len(data.get('chunk_metadata', []))}")
+        elif choice == 'v' and result:
+            print(f"\n📄 Document: {result.document_metadata.DOC_TITLE or 'N/A'}")
+            print(f"📊 Chunks: {len(result.chunk_metadata)}")
             input("\nPress Enter to continue...")
-        elif choice == 'c':
-            csv_path = csv_dir / f"{file_name}_chunks.csv"
-            if csv_path.exists():
-                import csv
-                with open(csv_path, 'r', encoding='utf-8-sig') as f:
-                    reader = csv.DictReader(f)
-                    for i, row in enumerate(reader, 1):
-                        if i <= 3:  # Show first 3 chunks
-                            print(f"\nChunk {i}:")
-                            print(f"  Topic: {row.get('CHUNK_TOPIC', 'N/A')}")
-                            print(f"  Text: {row.get('chunk_text', 'N/A')[:100]}...")
-                input("\nPress Enter to continue...")
+        elif choice == 'c' and result:
+            for i, chunk in enumerate(result.chunk_metadata[:3], 1):  # Show first 3 chunks
+                print(f"\nChunk {i}:")
+                print(f"  Topic: {chunk.CHUNK_TOPIC or 'N/A'}")
+                print(f"  Text: {(chunk.chunk_text or 'N/A')[:100]}...")
+            input("\nPress Enter to continue...")
+    
+    # Garbage-collect uploaded files
+    cleanup_run()
     
     # Summary
     print("\n" + "="*80)
@@ -193,6 +209,7 @@ def main():
     print(f"   JSON: {json_dir}")
     print(f"   CSV:  {csv_dir}")
     print(f"   Logs: {log_dir}")
+    print(f"   Run manifest: {manifest.path} {manifest.summary()}")
     print()
 
 
@@ -0,0 +1,119 @@
+"""
+End-to-end pipeline: PDF -> extraction -> embeddings -> PostgreSQL/pgvector.
+
+Stages are connected by bounded queues and each has its own worker count, so
+a slow stage applies backpressure instead of stalling the others. Per-stage
+throughput and queue depth are logged while running and written to
+data/logs/pipeline_<timestamp>.json at the end.
+
+Usage:
+    python scripts/run_pipeline.py --input data/raw_pdfs/THONGBAO
+    python scripts/run_pipeline.py --generate-workers 8 --embed-workers 4 --queue-size 16
+    python scripts/run_pipeline.py --no-store        # extraction only (no database)
+"""
+
+import os
+import sys
+import json
+import argparse
+import logging
+from pathlib import Path
+from datetime import datetime
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Load .env before importing the extractor (its settings are read at import time)
+from dotenv import load_dotenv
+load_dotenv()
+
+from src.extractors.gemini_extractor import cleanup_run, is_processed
+from src.metrics import export_run, metrics, start_exporters
+from src.pipeline import build_extraction_pipeline
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Run the staged extraction → embedding → pgvector pipeline.")
+    parser.add_argument('--input', default="data/raw_pdfs/THONGBAO", help="Input folder with PDFs")
+    parser.add_argument('--upload-workers', type=int, default=int(os.getenv('PIPELINE_UPLOAD_WORKERS', '2')))
+    parser.add_argument('--generate-workers', type=int, default=int(os.getenv('PIPELINE_GENERATE_WORKERS', '4')))
+    parser.add_argument('--embed-workers', type=int, default=int(os.getenv('PIPELINE_EMBED_WORKERS', '2')))
+    parser.add_argument('--store-workers', type=int, default=int(os.getenv('PIPELINE_STORE_WORKERS', '1')))
+    parser.add_argument('--queue-size', type=int, default=int(os.getenv('PIPELINE_QUEUE_SIZE', '8')),
+                        help="Max items waiting in front of each stage")
+    parser.add_argument('--report-seconds', type=float, default=10.0, help="Progress log interval")
+    parser.add_argument('--no-store', action='store_true', help="Stop after extraction (skip embed/store)")
+    parser.add_argument('--skip-existing', action='store_true', help="Skip PDFs that already have outputs")
+    parser.add_argument('--release-uploads', action='store_true',
+                        help="Delete the files this run uploaded instead of keeping them for reuse")
+    return parser.parse_args()
+
+
+def main():
+    """Run the pipeline over a folder of PDFs."""
+    args = parse_args()
+    log_dir = Path("data/logs")
+    log_dir.mkdir(parents=True, exist_ok=True)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(threadName)s - %(levelname)s - %(message)s')
+    logger = logging.getLogger(__name__)
+    start_exporters()
+    
+    input_dir = Path(args.input)
+    if not input_dir.exists():
+        logger.error(f"❌ Folder not found: {input_dir}")
+        return
+    
+    pdf_files = sorted(input_dir.glob("*.pdf"))
+    if args.skip_existing:
+        pdf_files = [pdf for pdf in pdf_files if not is_processed(pdf.name)]
+    logger.info(f"📁 {len(pdf_files)} PDF files in {input_dir}")
+    
+    storage = None
+    if not args.no_store:
+        from src.pgvector_storage import PgVectorStorage
+        storage = PgVectorStorage()
+    
+    pipeline = build_extraction_pipeline(
+        storage,
+        upload_workers=args.upload_workers,
+        generate_workers=args.generate_workers,
+        embed_workers=args.embed_workers,
+        store_workers=args.store_workers,
+        queue_size=args.queue_size,
+        report_interval=args.report_seconds,
+    )
+    report = pipeline.run((str(pdf) for pdf in pdf_files), key=lambda path: Path(path).name)
+    
+    # Delete the prompt context cache and garbage-collect uploaded files
+    cleanup_run(release_uploads=args.release_uploads)
+    
+    report['results'] = [
+        {'file': item.key, 'chunks': item.payload.get('chunk_count', 0),
+         'seconds': round(sum(item.timings.values()), 2), 'timings': item.timings,
+         'report': item.payload.get('report', {})}
+        for item in pipeline.results
+    ]
+    report['metrics'] = export_run()
+    results_file = log_dir / f"pipeline_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(results_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    
+    logger.info("\n" + "="*80)
+    logger.info("📊 PIPELINE SUMMARY")
+    logger.info("="*80)
+    logger.info(f"✅ Completed: {report['completed']}/{report['submitted']}   ❌ Failed: {report['failed']}")
+    logger.info(f"⏱️  Wall time: {report['wall_seconds']}s")
+    for name, stage in report['stages'].items():
+        logger.info(f"  {name:<9} workers={stage['workers']:<2} done={stage['processed']:<4} failed={stage['failed']:<3} "
+                    f"avg={stage['avg_seconds']}s  {stage['items_per_min']}/min  util={stage['utilization']}  "
+                    f"queue max={stage['max_queue_depth']} avg={stage['avg_queue_depth']}")
+    metrics.log_summary()
+    if storage is not None and storage.embedding_cache is not None:
+        storage.embedding_cache.log_stats()
+    logger.info(f"📄 Results: {results_file}")
+    logger.info("="*80)
+
+
+if __name__ == "__main__":
+    main()
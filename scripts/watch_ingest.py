@@ -0,0 +1,155 @@
+"""
+Long-running incremental ingest: watch the raw PDF folders and push new or
+changed files through extraction, embeddings and PostgreSQL/pgvector.
+
+Files are picked up through inotify (``pip install watchdog``) or, without
+it, by polling. A file is only processed after it has stopped changing
+(``--settle-seconds``), and the run manifest decides whether it is actually
+new or changed, so restarts and touched-but-identical files cost one hash.
+The log reports, for each file, the delay from its last write to being
+searchable.
+
+Usage:
+    python scripts/watch_ingest.py
+    python scripts/watch_ingest.py --input data/raw_pdfs/THONGBAO --input data/raw_pdfs/QUY_DINH
+    python scripts/watch_ingest.py --poll --poll-seconds 5 --workers 2
+    python scripts/watch_ingest.py --no-store      # extraction outputs only
+"""
+
+import os
+import sys
+import time
+import queue
+import argparse
+import logging
+import threading
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Load .env before importing the extractor (its settings are read at import time)
+from dotenv import load_dotenv
+load_dotenv()
+
+from src.extractors.cache import file_sha256
+from src.extractors.gemini_extractor import cleanup_run, process_document, stage_config_hashes
+from src.metrics import export_run, start_exporters
+from src.run_manifest import RunManifest
+from src.watcher import DEFAULT_POLL_SECONDS, DEFAULT_SETTLE_SECONDS, FolderWatcher
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Watch PDF folders and ingest new or changed files.")
+    parser.add_argument('--input', action='append',
+                        help="Folder to watch (repeatable, default: data/raw_pdfs/THONGBAO)")
+    parser.add_argument('--workers', type=int, default=int(os.getenv('WATCH_WORKERS', '2')),
+                        help="Files processed concurrently")
+    parser.add_argument('--settle-seconds', type=float, default=DEFAULT_SETTLE_SECONDS,
+                        help="A file must be unchanged this long before it is processed")
+    parser.add_argument('--poll', action='store_true', help="Poll the folders instead of using inotify")
+    parser.add_argument('--poll-seconds', type=float, default=DEFAULT_POLL_SECONDS,
+                        help="Scan interval in polling mode")
+    parser.add_argument('--no-store', action='store_true', help="Do not write to PostgreSQL")
+    return parser.parse_args()
+
+
+def ingest(pdf_path: Path, manifest: RunManifest, storage, stage_hashes) -> None:
+    """Extract (and store) one file if the run manifest says it is new or changed."""
+    try:
+        written_at = pdf_path.stat().st_mtime
+    except OSError:
+        return
+    sha256 = file_sha256(str(pdf_path))
+    stages, reason = manifest.plan(str(pdf_path), sha256, stage_hashes)
+    if not stages:
+        logger.info(f"⏭️  SKIP: {pdf_path.name} ({reason})")
+        return
+    logger.info(f"🔄 {pdf_path.name}: {reason} -> {', '.join(stages)}")
+
+    manifest.start(str(pdf_path), sha256, stage='extract')
+    started = time.perf_counter()
+    report = {}
+    try:
+        data = process_document(str(pdf_path), report=report)
+        if data is None:
+            raise RuntimeError(f"extraction failed ({report.get('outcome', 'failed')})")
+        if storage is not None:
+            report['stage'] = 'store'
+            store_started = time.perf_counter()
+            if not storage.save_document(data.model_dump(mode='json')):
+                raise RuntimeError("could not save to PostgreSQL")
+            report.setdefault('timings', {})['store'] = round(time.perf_counter() - store_started, 3)
+    except Exception as e:
+        seconds = round(time.perf_counter() - started, 2)
+        manifest.fail(str(pdf_path), report.get('error_class') or e.__class__.__name__, report.get('error') or str(e),
+                      stage=report.get('stage'), durations=report.get('timings'), seconds=seconds)
+        logger.error(f"❌ FAILED: {pdf_path.name} - {e}")
+        return
+
+    seconds = round(time.perf_counter() - started, 2)
+    manifest.finish(str(pdf_path), stage_hashes, chunks=len(data.chunk_metadata), outcome=report.get('outcome'),
+                    durations=report.get('timings'), seconds=seconds)
+    logger.info(f"✅ {pdf_path.name}: {len(data.chunk_metadata)} chunks in {seconds}s "
+                f"({time.time() - written_at:.1f}s after the file was written)")
+
+
+def main():
+    """Watch folders until interrupted."""
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(threadName)s - %(levelname)s - %(message)s')
+    folders = args.input or ["data/raw_pdfs/THONGBAO"]
+    start_exporters()
+
+    storage = None
+    stage_hashes = stage_config_hashes()
+    if not args.no_store:
+        from src.pgvector_storage import PgVectorStorage
+        storage = PgVectorStorage()
+        # Files extracted by a run without storage still need the 'store' stage
+        stage_hashes['store'] = 'pgvector'
+
+    manifest = RunManifest()
+    manifest.recover()
+
+    # Hàng đợi có giới hạn: watcher chờ khi các worker chưa kịp xử lý
+    work = queue.Queue(maxsize=max(1, args.workers) * 4)
+    stop = threading.Event()
+
+    def worker():
+        while True:
+            path = work.get()
+            if path is None:
+                return
+            ingest(path, manifest, storage, stage_hashes)
+            # Refresh METRICS_TEXTFILE (if set) after every file
+            export_run()
+
+    threads = [threading.Thread(target=worker, name=f"ingest-{n}", daemon=True)
+               for n in range(max(1, args.workers))]
+    for thread in threads:
+        thread.start()
+
+    watcher = FolderWatcher(folders, settle_seconds=args.settle_seconds, poll_seconds=args.poll_seconds,
+                            use_inotify=not args.poll)
+    if not args.poll and not watcher.use_inotify:
+        logger.warning("⚠️ watchdog is not installed, falling back to polling (pip install watchdog)")
+    try:
+        watcher.run(work.put, stop)
+    except KeyboardInterrupt:
+        logger.info("🛑 Stopping, waiting for files in progress...")
+    finally:
+        stop.set()
+        for _ in threads:
+            work.put(None)
+        for thread in threads:
+            thread.join()
+        cleanup_run()
+        logger.info(f"🗂️  Run manifest: {manifest.path} {manifest.summary()}")
+
+
+if __name__ == "__main__":
+    main()
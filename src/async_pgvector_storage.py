@@ -0,0 +1,455 @@
+"""
+Async counterpart of PgVectorStorage for the API layer (asyncpg + the async
+google-genai client), so a single event loop serves many concurrent searches
+instead of blocking one worker thread per query on the embedding call and on
+PostgreSQL.
+
+    storage = await AsyncPgVectorStorage.create()
+    results = await storage.semantic_search("học phí khóa 2025", limit=5)
+    await storage.close()
+
+save_document, semantic_search, keyword_search and get_statistics return the
+same shapes as PgVectorStorage. Embeddings use the same batching, retry and
+split-on-failure rules, the same on-disk EmbeddingCache and the same query
+cache (coalescing concurrent identical queries). Connections come from an
+asyncpg pool sized by DB_POOL_MIN/DB_POOL_MAX; concurrent embed_content
+requests are limited by ASYNC_EMBED_CONCURRENCY.
+"""
+
+import os
+import asyncio
+import logging
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+import asyncpg
+from google import genai
+
+from src.db_pool import DEFAULT_MAX_SIZE, DEFAULT_MIN_SIZE
+from src.embedding_cache import (EMBEDDING_MODEL, EMBEDDING_TASK_TYPE, EmbeddingCache, QueryEmbeddingCache,
+                                 normalize_text)
+from src.metrics import metrics
+from src.pgvector_storage import (EMBED_MAX_RETRIES, HNSW_EF_SEARCH_DEFAULT, HYBRID_CANDIDATES,
+                                  HYBRID_RRF_K, USE_EMBEDDING_CACHE, plan_batches)
+
+logger = logging.getLogger(__name__)
+
+EMBED_CONCURRENCY = int(os.getenv('ASYNC_EMBED_CONCURRENCY', '16'))
+COMMAND_TIMEOUT = float(os.getenv('POSTGRES_COMMAND_TIMEOUT', '30'))
+
+
+def _vector_text(vector) -> str:
+    return '[' + ','.join(repr(float(value)) for value in vector) + ']'
+
+
+def _parse_vector(text: str) -> List[float]:
+    return [float(value) for value in text.strip('[]').split(',') if value]
+
+
+def _date(value) -> Optional[date]:
+    # asyncpg cần datetime.date cho cột DATE (psycopg2 chấp nhận chuỗi)
+    if value is None or isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+async def _init_connection(conn) -> None:
+    """Codec cho kiểu vector của pgvector: list[float] <-> '[...]'."""
+    await conn.set_type_codec('vector', schema='public', encoder=_vector_text, decoder=_parse_vector,
+                              format='text')
+
+
+class AsyncPgVectorStorage:
+    """Lưu trữ và tìm kiếm PostgreSQL + pgvector không đồng bộ (asyncio)"""
+
+    def __init__(self):
+        self.conn_params = {
+            'host': os.getenv('POSTGRES_HOST', '127.0.0.1'),
+            'port': int(os.getenv('POSTGRES_PORT', '5432')),
+            'database': os.getenv('POSTGRES_DB', 'chatbot_db'),
+            'user': os.getenv('POSTGRES_USER', 'chatbot_user'),
+            'password': os.getenv('POSTGRES_PASSWORD', 'chatbot_pass'),
+        }
+        target = os.getenv('POSTGRES_TARGET_SESSION_ATTRS')
+        if target:
+            self.conn_params['target_session_attrs'] = target
+        self.client = genai.Client(api_key=os.getenv('GEMINI_API_KEY'))
+        self.embedding_cache = EmbeddingCache() if USE_EMBEDDING_CACHE else None
+        self.query_cache = QueryEmbeddingCache()
+        self.pool: Optional[asyncpg.Pool] = None
+        self._embed_slots = asyncio.Semaphore(EMBED_CONCURRENCY)
+
+    @classmethod
+    async def create(cls, min_size: int = DEFAULT_MIN_SIZE, max_size: int = DEFAULT_MAX_SIZE) -> 'AsyncPgVectorStorage':
+        """Tạo storage và mở pool kết nối."""
+        storage = cls()
+        await storage.open(min_size, max_size)
+        return storage
+
+    async def open(self, min_size: int = DEFAULT_MIN_SIZE, max_size: int = DEFAULT_MAX_SIZE) -> None:
+        if self.pool is None:
+            with metrics.timed('db.connect'):
+                self.pool = await asyncpg.create_pool(
+                    **self.conn_params, min_size=min_size, max_size=max_size,
+                    command_timeout=COMMAND_TIMEOUT, init=_init_connection,
+                )
+
+    async def close(self) -> None:
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def __aenter__(self) -> 'AsyncPgVectorStorage':
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    # --- embeddings ---------------------------------------------------------------------
+
+    async def create_embedding(self, text: str) -> Optional[List[float]]:
+        return (await self.create_embeddings([text]))[0]
+
+    async def embed_query(self, query: str) -> Optional[List[float]]:
+        """Embedding của câu hỏi qua cache LRU/TTL; các task hỏi cùng câu chỉ tạo một request."""
+        return await self.query_cache.aget_or_compute(query, lambda: self.create_embedding(query))
+
+    async def create_embeddings(self, texts: List[str],
+                                task_type: Optional[str] = EMBEDDING_TASK_TYPE) -> List[Optional[List[float]]]:
+        """
+        Như PgVectorStorage.create_embeddings: qua cache trên đĩa, mỗi text chỉ gửi một lần,
+        gửi theo lô; các lô được gửi đồng thời (tối đa ASYNC_EMBED_CONCURRENCY request).
+        """
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        if self.embedding_cache is not None:
+            results = await asyncio.to_thread(self.embedding_cache.get_many, texts, EMBEDDING_MODEL, task_type)
+
+        positions: Dict[str, List[int]] = {}
+        for index, text in enumerate(texts):
+            if results[index] is None:
+                positions.setdefault(normalize_text(text or ''), []).append(index)
+        if not positions:
+            return results
+
+        missing = [indices[0] for indices in positions.values()]
+        missing_texts = [texts[i] for i in missing]
+        embeddings: List[Optional[List[float]]] = [None] * len(missing)
+        batches = plan_batches(missing_texts)
+        batch_results = await asyncio.gather(*(
+            self._embed_batch([missing_texts[i] for i in indices], EMBED_MAX_RETRIES, task_type)
+            for indices in batches
+        ))
+        for indices, vectors in zip(batches, batch_results):
+            for index, vector in zip(indices, vectors):
+                embeddings[index] = vector
+
+        for first, embedding in zip(missing, embeddings):
+            for index in positions[normalize_text(texts[first] or '')]:
+                results[index] = embedding
+        if self.embedding_cache is not None:
+            await asyncio.to_thread(self.embedding_cache.put_many, missing_texts, embeddings,
+                                    EMBEDDING_MODEL, task_type)
+        return results
+
+    async def _embed_batch(self, texts: List[str], attempts: int,
+                           task_type: Optional[str]) -> List[Optional[List[float]]]:
+        """Một lô; lô lỗi được chia đôi (mỗi nửa thử một lần) để chỉ bỏ các text thực sự lỗi."""
+        embeddings = await self._embed_with_retry(texts, attempts, task_type)
+        if embeddings is not None:
+            return embeddings
+        if len(texts) == 1:
+            logger.error(f"Lỗi tạo embedding cho text: {texts[0][:80]!r}")
+            return [None]
+        middle = len(texts) // 2
+        left, right = await asyncio.gather(self._embed_batch(texts[:middle], 1, task_type),
+                                           self._embed_batch(texts[middle:], 1, task_type))
+        return left + right
+
+    async def _embed_with_retry(self, texts: List[str], attempts: int,
+                                task_type: Optional[str]) -> Optional[List[List[float]]]:
+        for attempt in range(attempts):
+            try:
+                async with self._embed_slots:
+                    with metrics.timed('gemini.embed_content', model=EMBEDDING_MODEL, mode='async'):
+                        result = await self.client.aio.models.embed_content(
+                            model=EMBEDDING_MODEL,
+                            contents=texts,
+                            config={'task_type': task_type} if task_type else None,
+                        )
+                if len(result.embeddings) != len(texts):
+                    raise ValueError(f"nhận {len(result.embeddings)} embedding cho {len(texts)} text")
+                metrics.inc('embedded_texts_total', len(texts))
+                return [embedding.values for embedding in result.embeddings]
+            except Exception as e:
+                logger.warning(f"Lỗi tạo embedding cho lô {len(texts)} text "
+                               f"(lần {attempt + 1}/{attempts}): {e}")
+                if attempt + 1 < attempts:
+                    await asyncio.sleep(min(2 ** attempt, 10))
+        return None
+
+    # --- ghi ----------------------------------------------------------------------------
+
+    async def save_document(self, doc_data: Dict[str, Any]) -> bool:
+        """Lưu document và chunks (tạo embedding theo lô) trong một transaction"""
+        chunks = doc_data['chunk_metadata']
+        embeddings = await self.create_embeddings([chunk['chunk_text'] for chunk in chunks])
+        return await self.save_embedded_document(doc_data['document_metadata'], chunks, embeddings)
+
+    async def save_embedded_document(self, doc_meta: Dict[str, Any], chunks: List[Dict[str, Any]],
+                                     embeddings: List[Optional[List[float]]]) -> bool:
+        """Lưu document và chunks với embeddings đã tạo sẵn (embeddings[i] ứng với chunks[i])"""
+        doc_id = doc_meta.get('DOC_ID')
+        rows = []
+        for chunk, embedding in zip(chunks, embeddings):
+            if embedding is None:
+                logger.warning(f"Bỏ qua chunk {chunk.get('CHUNK_ID')} - không tạo được embedding")
+                continue
+            rows.append((
+                chunk.get('CHUNK_ID'), doc_id, chunk.get('PAGE_NUMBER'), chunk.get('SECTION_TITLE'),
+                chunk.get('CHUNK_TOPIC'), chunk.get('CONTENT_TYPE'), chunk.get('SPECIFIC_TARGET'),
+                chunk.get('APPLICABLE_COHORT'), str(chunk.get('VALUE')) if chunk.get('VALUE') else None,
+                chunk.get('UNIT'), chunk.get('KEYWORDS', []), chunk['chunk_text'], embedding,
+            ))
+        try:
+            with metrics.timed('db.save_document', mode='async'):
+                async with self.pool.acquire() as conn, conn.transaction():
+                    await conn.execute("""
+                        INSERT INTO documents (
+                            doc_id, file_name, doc_title, doc_type, issue_number,
+                            issuing_authority, issuing_dept, issue_date,
+                            effective_date, expiration_date, major_topic
+                        ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11)
+                        ON CONFLICT (doc_id) DO UPDATE SET
+                            file_name = EXCLUDED.file_name,
+                            doc_title = EXCLUDED.doc_title,
+                            doc_type = EXCLUDED.doc_type,
+                            updated_at = CURRENT_TIMESTAMP
+                    """, doc_id, doc_meta.get('FILE_NAME'), doc_meta.get('DOC_TITLE'), doc_meta.get('DOC_TYPE'),
+                        doc_meta.get('ISSUE_NUMBER'), doc_meta.get('ISSUING_AUTHORITY'), doc_meta.get('ISSUING_DEPT'),
+                        _date(doc_meta.get('ISSUE_DATE')), doc_meta.get('EFFECTIVE_DATE'),
+                        _date(doc_meta.get('EXPIRATION_DATE')), doc_meta.get('MAJOR_TOPIC'))
+                    if rows:
+                        await conn.executemany("""
+                            INSERT INTO chunks (
+                                chunk_id, doc_id, page_number, section_title, chunk_topic,
+                                content_type, specific_target, applicable_cohort, value, unit,
+                                keywords, chunk_text, embedding
+                            ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13)
+                            ON CONFLICT (chunk_id) DO UPDATE SET
+                                chunk_text = EXCLUDED.chunk_text,
+                                embedding = EXCLUDED.embedding,
+                                updated_at = CURRENT_TIMESTAMP
+                        """, rows)
+            metrics.inc('db_chunks_written_total', len(rows))
+            logger.info(f"Đã lưu document: {doc_id} ({len(rows)} chunks với embeddings)")
+            return True
+        except Exception as e:
+            logger.error(f"Lỗi lưu document: {e}")
+            return False
+
+    # --- tìm kiếm -----------------------------------------------------------------------
+
+    async def semantic_search(self, query: str, limit: int = 5,
+                              content_type: Optional[str] = None,
+                              applicable_cohort: Optional[str] = None) -> List[Dict]:
+        """Tìm kiếm semantic sử dụng vector similarity"""
+        try:
+            query_embedding = await self.embed_query(query)
+            if query_embedding is None:
+                return []
+
+            params: List[Any] = [query_embedding]
+            where_clauses = []
+            if content_type:
+                params.append(content_type)
+                where_clauses.append(f"c.content_type = ${len(params)}")
+            if applicable_cohort:
+                params.append(f"%{applicable_cohort}%")
+                where_clauses.append(f"c.applicable_cohort LIKE ${len(params)}")
+            where_sql = "WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+            params.append(limit)
+
+            with metrics.timed('db.semantic_search', mode='async'):
+                async with self.pool.acquire() as conn:
+                    rows = await conn.fetch(f"""
+                        SELECT
+                            c.chunk_id,
+                            c.chunk_text,
+                            c.chunk_topic,
+                            c.content_type,
+                            c.specific_target,
+                            c.applicable_cohort,
+                            c.value,
+                            c.unit,
+                            d.doc_title,
+                            d.doc_type,
+                            d.file_name,
+                            d.issue_date,
+                            1 - (c.embedding <=> $1) as similarity
+                        FROM chunks c
+                        JOIN documents d ON c.doc_id = d.doc_id
+                        {where_sql}
+                        ORDER BY c.embedding <=> $1
+                        LIMIT ${len(params)}
+                    """, *params)
+            return [dict(row) for row in rows]
+
+        except Exception as e:
+            logger.error(f"Lỗi tìm kiếm semantic: {e}")
+            return []
+
+    async def hybrid_search(self, query: str, limit: int = 5,
+                            content_type: Optional[str] = None,
+                            applicable_cohort: Optional[str] = None,
+                            candidates: Optional[int] = None,
+                            semantic_weight: float = 1.0,
+                            keyword_weight: float = 1.0) -> List[Dict]:
+        """Như PgVectorStorage.hybrid_search: semantic + full-text gộp bằng RRF trong một truy vấn"""
+        candidates = candidates or max(HYBRID_CANDIDATES, limit * 2)
+        try:
+            query_embedding = await self.embed_query(query)
+
+            # $1..$7 cố định; tham số lọc (nếu có) nối tiếp phía sau
+            params: List[Any] = [query_embedding, query, candidates, HYBRID_RRF_K,
+                                 semantic_weight, keyword_weight, limit]
+            where_clauses = []
+            if content_type:
+                params.append(content_type)
+                where_clauses.append(f"c.content_type = ${len(params)}")
+            if applicable_cohort:
+                params.append(f"%{applicable_cohort}%")
+                where_clauses.append(f"c.applicable_cohort LIKE ${len(params)}")
+            filter_sql = "".join(f" AND {clause}" for clause in where_clauses)
+
+            with metrics.timed('db.hybrid_search', mode='async'):
+                async with self.pool.acquire() as conn:
+                    async with conn.transaction():
+                        if candidates > HNSW_EF_SEARCH_DEFAULT:
+                            # Index HNSW chỉ trả về tối đa hnsw.ef_search dòng
+                            await conn.execute(f"SET LOCAL hnsw.ef_search = {int(candidates)}")
+                        rows = await conn.fetch(f"""
+                            WITH semantic AS (
+                                SELECT chunk_id, ROW_NUMBER() OVER (ORDER BY distance) AS rank
+                                FROM (
+                                    SELECT c.chunk_id, c.embedding <=> $1 AS distance
+                                    FROM chunks c
+                                    WHERE $1::vector IS NOT NULL{filter_sql}
+                                    ORDER BY distance
+                                    LIMIT $3
+                                ) nearest
+                            ),
+                            keyword AS (
+                                SELECT chunk_id, ROW_NUMBER() OVER (ORDER BY text_rank DESC) AS rank
+                                FROM (
+                                    SELECT c.chunk_id, ts_rank_cd(c.chunk_tsv, q.tsq) AS text_rank
+                                    FROM chunks c, websearch_to_tsquery('vietnamese', $2) AS q(tsq)
+                                    WHERE c.chunk_tsv @@ q.tsq{filter_sql}
+                                    ORDER BY text_rank DESC
+                                    LIMIT $3
+                                ) matches
+                            ),
+                            fused AS (
+                                SELECT
+                                    COALESCE(s.chunk_id, k.chunk_id) AS chunk_id,
+                                    COALESCE($5::float8 / ($4::int + s.rank), 0)
+                                        + COALESCE($6::float8 / ($4::int + k.rank), 0) AS score,
+                                    s.rank AS semantic_rank,
+                                    k.rank AS keyword_rank
+                                FROM semantic s
+                                FULL OUTER JOIN keyword k ON k.chunk_id = s.chunk_id
+                            )
+                            SELECT
+                                c.chunk_id,
+                                c.chunk_text,
+                                c.chunk_topic,
+                                c.content_type,
+                                c.specific_target,
+                                c.applicable_cohort,
+                                c.value,
+                                c.unit,
+                                d.doc_title,
+                                d.doc_type,
+                                d.file_name,
+                                d.issue_date,
+                                1 - (c.embedding <=> $1) as similarity,
+                                f.score,
+                                f.semantic_rank,
+                                f.keyword_rank
+                            FROM fused f
+                            JOIN chunks c ON c.chunk_id = f.chunk_id
+                            JOIN documents d ON c.doc_id = d.doc_id
+                            ORDER BY f.score DESC, f.chunk_id
+                            LIMIT $7
+                        """, *params)
+            return [dict(row) for row in rows]
+
+        except Exception as e:
+            logger.error(f"Lỗi tìm kiếm hybrid: {e}")
+            return []
+
+    async def keyword_search(self, keyword: str, limit: int = 10) -> List[Dict]:
+        """Tìm kiếm full-text trên cột chunk_tsv (cú pháp websearch: "cụm từ", OR, -loại trừ)"""
+        try:
+            with metrics.timed('db.keyword_search', mode='async'):
+                async with self.pool.acquire() as conn:
+                    rows = await conn.fetch("""
+                        SELECT
+                            c.chunk_id,
+                            c.chunk_text,
+                            c.chunk_topic,
+                            c.content_type,
+                            d.doc_title,
+                            d.file_name,
+                            ts_rank(c.chunk_tsv, websearch_to_tsquery('vietnamese', $1)) as rank
+                        FROM chunks c
+                        JOIN documents d ON c.doc_id = d.doc_id
+                        WHERE c.chunk_tsv @@ websearch_to_tsquery('vietnamese', $1)
+                        ORDER BY rank DESC
+                        LIMIT $2
+                    """, keyword, limit)
+            return [dict(row) for row in rows]
+
+        except Exception as e:
+            logger.error(f"Lỗi tìm kiếm keyword: {e}")
+            return []
+
+    async def get_statistics(self) -> Dict:
+        """Lấy thống kê database"""
+        try:
+            with metrics.timed('db.get_statistics', mode='async'):
+                async with self.pool.acquire() as conn:
+                    row = await conn.fetchrow("""
+                        SELECT
+                            (SELECT COUNT(*) FROM documents) as total_documents,
+                            (SELECT COUNT(*) FROM chunks) as total_chunks,
+                            (SELECT COUNT(DISTINCT doc_type) FROM documents) as doc_types,
+                            (SELECT COUNT(DISTINCT content_type) FROM chunks WHERE content_type IS NOT NULL) as content_types
+                    """)
+            return dict(row)
+
+        except Exception as e:
+            logger.error(f"Lỗi lấy thống kê: {e}")
+            return {}
+
+
+# Ví dụ: nhiều tìm kiếm đồng thời trên một event loop
+if __name__ == '__main__':
+    import time
+
+    async def demo(concurrency: int = 200):
+        async with AsyncPgVectorStorage() as storage:
+            started = time.perf_counter()
+            results = await asyncio.gather(*(
+                storage.keyword_search("học phí", limit=5) for _ in range(concurrency)
+            ))
+            elapsed = time.perf_counter() - started
+            print(f"🔍 {concurrency} tìm kiếm đồng thời: {elapsed:.2f}s "
+                  f"({concurrency / elapsed:.0f} truy vấn/s), {len(results[0])} kết quả mỗi truy vấn")
+            stats = await storage.get_statistics()
+            print(f"📊 Documents: {stats.get('total_documents', 0)}, Chunks: {stats.get('total_chunks', 0)}")
+
+    asyncio.run(demo())
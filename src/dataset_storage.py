@@ -0,0 +1,296 @@
+"""
+Consolidated, partitioned output dataset for extraction results.
+
+Instead of one JSON and two CSV files per PDF, every document (with its
+chunks) is appended as its own gzip member to a part file under
+
+    data/dataset/major_topic=<topic>/doc_type=<type>/part-00000.jsonl.gz
+
+Each member holds one JSON line shaped like DocumentData. A part file is a
+valid multi-member gzip file, so ``zcat part-*.jsonl.gz`` reads it as plain
+JSONL. The manifest maps DOC_ID to (part, offset, length) for direct seeks
+and records each part's committed size: bytes past it (from a run that
+crashed mid-append) are ignored by readers and truncated by the next writer,
+so an append is all-or-nothing.
+
+The manifest is ``manifest.json`` (a snapshot) plus ``manifest.log``, one JSON
+line per append. Appending a document only writes and fsyncs its log line;
+readers replay the lines they have not seen yet. close() (and every
+DATASET_COMPACT_EVERY appends) folds the log into the snapshot.
+"""
+
+import os
+import re
+import gzip
+import json
+import logging
+import threading
+import unicodedata
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATASET_DIR = os.getenv('DATASET_DIR', 'data/dataset')
+# Sang part mới khi part hiện tại vượt quá kích thước này
+DEFAULT_PART_MAX_MB = float(os.getenv('DATASET_PART_MAX_MB', '64'))
+MANIFEST_VERSION = 1
+# Gộp manifest.log vào manifest.json sau chừng này dòng log
+DEFAULT_COMPACT_EVERY = int(os.getenv('DATASET_COMPACT_EVERY', '5000'))
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+def _slug(value: Optional[str]) -> str:
+    """'Tài chính' -> 'tai_chinh'; giá trị rỗng -> 'unknown'."""
+    if not value:
+        return 'unknown'
+    value = unicodedata.normalize('NFKD', value.replace('đ', 'd').replace('Đ', 'D'))
+    value = ''.join(c for c in value if not unicodedata.combining(c)).lower()
+    return re.sub(r'[^a-z0-9]+', '_', value).strip('_') or 'unknown'
+
+
+def partition_for(document: Dict[str, Any]) -> str:
+    """Thư mục phân vùng (tương đối) của một document theo MAJOR_TOPIC/DOC_TYPE."""
+    return f"major_topic={_slug(document.get('MAJOR_TOPIC'))}/doc_type={_slug(document.get('DOC_TYPE'))}"
+
+
+def _empty_manifest() -> Dict[str, Any]:
+    return {'version': MANIFEST_VERSION, 'parts': {}, 'documents': {}, 'files': {}}
+
+
+def _apply(manifest: Dict[str, Any], record: Dict[str, Any]) -> None:
+    """Áp một dòng manifest.log (idempotent: áp lại dòng đã có trong snapshot không đổi gì)."""
+    doc_id, entry = record['doc_id'], record['entry']
+    previous = manifest['files'].get(entry['file_name'])
+    if previous and previous != doc_id:
+        manifest['documents'].pop(previous, None)
+    manifest['parts'][entry['part']] = entry['offset'] + entry['length']
+    manifest['documents'][doc_id] = entry
+    if entry['file_name']:
+        manifest['files'][entry['file_name']] = doc_id
+
+
+class DocumentDataset:
+    """Ghi/đọc dataset JSONL nén gzip, phân vùng theo MAJOR_TOPIC/DOC_TYPE, có manifest DOC_ID -> offset."""
+
+    def __init__(self, root: str = DEFAULT_DATASET_DIR, part_max_mb: float = DEFAULT_PART_MAX_MB,
+                 compact_every: int = DEFAULT_COMPACT_EVERY):
+        self.root = Path(root)
+        self.manifest_path = self.root / 'manifest.json'
+        self.log_path = self.root / 'manifest.log'
+        self.part_max_bytes = int(part_max_mb * 1024 * 1024)
+        self.compact_every = compact_every
+        self._lock = threading.RLock()
+        # Manifest trong bộ nhớ: snapshot (định danh bởi inode + mtime) + các dòng log đã đọc
+        self._manifest = _empty_manifest()
+        self._snapshot_id = None
+        self._log_offset = 0
+        self._log_records = 0
+
+    @contextmanager
+    def _locked(self):
+        """Khóa trong tiến trình + khóa file giữa các tiến trình (nếu hệ điều hành hỗ trợ)."""
+        with self._lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            with open(self.root / 'manifest.lock', 'a+') as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _refresh(self) -> Dict[str, Any]:
+        """
+        Cập nhật manifest trong bộ nhớ (gọi khi đang giữ self._lock): chỉ đọc phần log mới;
+        đọc lại từ đầu nếu snapshot đã được gộp lại (bởi tiến trình này hoặc tiến trình khác).
+        """
+        try:
+            stat = self.manifest_path.stat()
+            snapshot_id = (stat.st_ino, stat.st_mtime_ns)
+        except FileNotFoundError:
+            snapshot_id = None
+        try:
+            log_size = self.log_path.stat().st_size
+        except FileNotFoundError:
+            log_size = 0
+
+        if snapshot_id != self._snapshot_id or log_size < self._log_offset:
+            try:
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    self._manifest = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self._manifest = _empty_manifest()
+            self._snapshot_id = snapshot_id
+            self._log_offset = self._log_records = 0
+
+        if log_size > self._log_offset:
+            with open(self.log_path, 'rb') as f:
+                f.seek(self._log_offset)
+                for line in f:
+                    # Dòng cuối không có '\n' là dòng ghi dở: bỏ qua, bị cắt ở lần ghi sau
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        _apply(self._manifest, json.loads(line))
+                    except (json.JSONDecodeError, KeyError) as e:
+                        logger.warning(f"Bỏ qua dòng manifest.log hỏng @ {self._log_offset}: {e}")
+                    self._log_offset += len(line)
+                    self._log_records += 1
+        return self._manifest
+
+    def load_manifest(self) -> Dict[str, Any]:
+        """Bản sao manifest hiện tại (snapshot + log)."""
+        with self._lock:
+            manifest = self._refresh()
+            return {key: dict(value) if isinstance(value, dict) else value for key, value in manifest.items()}
+
+    def _write_manifest(self, manifest: Dict[str, Any]) -> None:
+        tmp_path = self.manifest_path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+    def _append_log(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+        with open(self.log_path, 'r+b' if self.log_path.exists() else 'w+b') as f:
+            # Bỏ dòng ghi dở của lần chạy bị lỗi trước đó
+            f.truncate(self._log_offset)
+            f.seek(self._log_offset)
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        _apply(self._manifest, record)
+        self._log_offset += len(line)
+        self._log_records += 1
+
+    def _compact(self) -> None:
+        """Gộp manifest.log vào manifest.json rồi làm rỗng log (gọi khi đang giữ _locked())."""
+        manifest = self._refresh()
+        if not self._log_records:
+            return
+        self._write_manifest(manifest)
+        # Snapshot đã có mọi dòng log: mất điện giữa hai bước chỉ làm log được áp lại
+        with open(self.log_path, 'r+b') as f:
+            f.truncate(0)
+            f.flush()
+            os.fsync(f.fileno())
+        stat = self.manifest_path.stat()
+        self._snapshot_id = (stat.st_ino, stat.st_mtime_ns)
+        self._log_offset = self._log_records = 0
+
+    def compact(self) -> None:
+        """Gộp manifest.log vào manifest.json."""
+        with self._locked():
+            self._compact()
+
+    def close(self) -> None:
+        """Gộp manifest khi kết thúc một lần chạy."""
+        if self.log_path.exists():
+            self.compact()
+
+    def _current_part(self, manifest: Dict[str, Any], partition: str) -> str:
+        """Part đang ghi của phân vùng; tạo part mới nếu part cuối đã đầy."""
+        parts = sorted(part for part in manifest['parts'] if part.startswith(partition + '/'))
+        if parts and manifest['parts'][parts[-1]] < self.part_max_bytes:
+            return parts[-1]
+        return f"{partition}/part-{len(parts):05d}.jsonl.gz"
+
+    def append(self, document: Dict[str, Any], chunks: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Ghi một document (dict DocumentMetadata) cùng các chunk (dict ChunkMetadata,
+        có thể là generator) thành một gzip member mới. Nếu FILE_NAME đã có trong
+        dataset, bản cũ bị thay thế trong manifest. Trả về entry manifest của document.
+        """
+        doc_id = document['DOC_ID']
+        partition = partition_for(document)
+
+        with self._locked():
+            manifest = self._refresh()
+            part = self._current_part(manifest, partition)
+            part_path = self.root / part
+            part_path.parent.mkdir(parents=True, exist_ok=True)
+            committed = manifest['parts'].get(part, 0)
+
+            chunk_count = 0
+            with open(part_path, 'r+b' if part_path.exists() else 'w+b') as f:
+                # Bỏ phần ghi dở của lần chạy bị lỗi trước đó
+                f.truncate(committed)
+                f.seek(committed)
+                with gzip.GzipFile(fileobj=f, mode='wb', mtime=0) as gz:
+                    gz.write(b'{"document_metadata": ')
+                    gz.write(json.dumps(document, ensure_ascii=False).encode('utf-8'))
+                    gz.write(b', "chunk_metadata": [')
+                    for chunk in chunks:
+                        if chunk_count:
+                            gz.write(b', ')
+                        gz.write(json.dumps(chunk, ensure_ascii=False).encode('utf-8'))
+                        chunk_count += 1
+                    gz.write(b']}\n')
+                f.flush()
+                os.fsync(f.fileno())
+                end = f.tell()
+
+            entry = {
+                'part': part,
+                'offset': committed,
+                'length': end - committed,
+                'file_name': document.get('FILE_NAME'),
+                'chunks': chunk_count,
+                'written_at': datetime.now().isoformat(timespec='seconds'),
+            }
+            # Dòng log là điểm commit: trước đó phần vừa ghi vào part chưa tồn tại với người đọc
+            self._append_log({'doc_id': doc_id, 'entry': entry})
+            if self._log_records >= self.compact_every:
+                self._compact()
+
+        logger.info(f"✅ Đã ghi {doc_id} ({chunk_count} chunks) vào dataset: {part} @ {committed}")
+        return entry
+
+    def has_file(self, file_name: str) -> bool:
+        with self._lock:
+            return file_name in self._refresh()['files']
+
+    def _read_entry(self, f, entry: Dict[str, Any]) -> Dict[str, Any]:
+        f.seek(entry['offset'])
+        return json.loads(gzip.decompress(f.read(entry['length'])))
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """Đọc một document (dạng DocumentData) bằng cách seek thẳng tới offset trong manifest."""
+        with self._lock:
+            entry = self._refresh()['documents'].get(doc_id)
+        if entry is None:
+            return None
+        with open(self.root / entry['part'], 'rb') as f:
+            return self._read_entry(f, entry)
+
+    def iter_documents(self, where: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Duyệt toàn bộ dataset trong một lượt đọc tuần tự từng part. Chỉ trả về các bản
+        ghi còn hiệu lực trong manifest; `where` lọc theo entry manifest (vd. theo part).
+        """
+        by_part: Dict[str, list] = {}
+        for entry in self.load_manifest()['documents'].values():
+            if where is None or where(entry):
+                by_part.setdefault(entry['part'], []).append(entry)
+
+        for part in sorted(by_part):
+            with open(self.root / part, 'rb') as f:
+                for entry in sorted(by_part[part], key=lambda e: e['offset']):
+                    yield self._read_entry(f, entry)
+
+    def iter_chunks(self) -> Iterator[Dict[str, Any]]:
+        """Duyệt mọi chunk của dataset, kèm DOC_ID của document chứa nó."""
+        for record in self.iter_documents():
+            doc_id = record['document_metadata']['DOC_ID']
+            for chunk in record['chunk_metadata']:
+                yield {'DOC_ID': doc_id, **chunk}
@@ -0,0 +1,284 @@
+"""
+Thread-safe PostgreSQL connection pool for PgVectorStorage and JobQueue.
+
+Opening a psycopg2 connection costs a TCP (and TLS) handshake plus
+authentication, often more than the query itself. The pool keeps up to
+DB_POOL_MAX connections open and hands them out per operation:
+
+    with pool.connection() as conn:        # blocks up to DB_POOL_TIMEOUT when all are busy
+        with conn, conn.cursor() as cur:
+            ...
+
+    rows = pool.run(lambda conn: ...)      # same, retried once on a fresh connection
+                                           # if the server connection was lost
+
+A connection is pinged (``SELECT 1``) before reuse when it sat idle longer
+than DB_POOL_CHECK_SECONDS, or when another connection was found dead (a
+restart or failover usually kills all of them), and is replaced when it is
+older than DB_POOL_MAX_LIFETIME. Connections returned mid-transaction are
+rolled back. For failover, POSTGRES_HOST may list several hosts
+("db1,db2") with POSTGRES_TARGET_SESSION_ATTRS=read-write.
+
+DB_POOL=0 disables pooling (one connection per operation, e.g. behind
+pgbouncer in transaction mode).
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, TypeVar
+
+import psycopg2
+from psycopg2 import extensions
+
+from src.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+USE_POOL = os.getenv('DB_POOL', '1') == '1'
+DEFAULT_MIN_SIZE = int(os.getenv('DB_POOL_MIN', '1'))
+DEFAULT_MAX_SIZE = int(os.getenv('DB_POOL_MAX', '10'))
+DEFAULT_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+DEFAULT_CHECK_SECONDS = float(os.getenv('DB_POOL_CHECK_SECONDS', '30'))
+DEFAULT_MAX_IDLE_SECONDS = float(os.getenv('DB_POOL_MAX_IDLE', '300'))
+DEFAULT_MAX_LIFETIME = float(os.getenv('DB_POOL_MAX_LIFETIME', '3600'))
+
+# Tham số libpq mặc định: phát hiện sớm kết nối chết và không treo khi host không phản hồi
+CONNECT_DEFAULTS = {
+    'connect_timeout': os.getenv('POSTGRES_CONNECT_TIMEOUT', '5'),
+    'keepalives': 1,
+    'keepalives_idle': 30,
+    'keepalives_interval': 10,
+    'keepalives_count': 3,
+}
+
+T = TypeVar('T')
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """Không lấy được kết nối trong thời gian chờ (pool đã dùng hết)."""
+
+
+def connect_params(conn_params: Dict[str, Any]) -> Dict[str, Any]:
+    """conn_params + các tham số mặc định (timeout, keepalive, target_session_attrs)."""
+    params = dict(CONNECT_DEFAULTS)
+    target = os.getenv('POSTGRES_TARGET_SESSION_ATTRS')
+    if target:
+        params['target_session_attrs'] = target
+    params.update(conn_params)
+    return params
+
+
+def _is_broken(conn) -> bool:
+    return conn.closed != 0
+
+
+class ConnectionPool:
+    """Pool kết nối psycopg2 có giới hạn, kiểm tra sức khỏe và tự kết nối lại."""
+
+    def __init__(self, conn_params: Dict[str, Any], min_size: int = DEFAULT_MIN_SIZE,
+                 max_size: int = DEFAULT_MAX_SIZE, timeout: float = DEFAULT_TIMEOUT,
+                 check_seconds: float = DEFAULT_CHECK_SECONDS,
+                 max_idle_seconds: float = DEFAULT_MAX_IDLE_SECONDS,
+                 max_lifetime: float = DEFAULT_MAX_LIFETIME):
+        self.conn_params = connect_params(conn_params)
+        self.max_size = max(1, max_size)
+        self.min_size = min(max(0, min_size), self.max_size)
+        self.timeout = timeout
+        self.check_seconds = check_seconds
+        self.max_idle_seconds = max_idle_seconds
+        self.max_lifetime = max_lifetime
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._lock = threading.Lock()
+        # (conn, thời điểm trả về, thời điểm tạo); lấy ra từ cuối (LIFO) để kết nối nóng được dùng lại
+        self._idle = deque()
+        self._created: Dict[int, float] = {}
+        # Kết nối trả về trước mốc này phải được ping lại trước khi dùng
+        self._suspect_before = 0.0
+        self._warmed = False
+
+    # --- vòng đời kết nối -------------------------------------------------------------
+
+    def _connect(self):
+        with metrics.timed('db.connect'):
+            conn = psycopg2.connect(**self.conn_params)
+        with self._lock:
+            self._created[id(conn)] = time.monotonic()
+        return conn
+
+    def _discard(self, conn) -> None:
+        with self._lock:
+            self._created.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _healthy(self, conn, returned_at: float, created_at: float) -> bool:
+        now = time.monotonic()
+        if _is_broken(conn) or now - created_at > self.max_lifetime:
+            return False
+        if returned_at >= self._suspect_before and now - returned_at < self.check_seconds:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _warm(self) -> None:
+        """Mở sẵn min_size kết nối ở lần dùng đầu tiên (không mở khi khởi tạo storage)."""
+        with self._lock:
+            if self._warmed:
+                return
+            self._warmed = True
+        for _ in range(self.min_size):
+            try:
+                conn = self._connect()
+            except psycopg2.Error as e:
+                logger.warning(f"Không mở trước được kết nối PostgreSQL: {e}")
+                return
+            with self._lock:
+                self._idle.append((conn, time.monotonic(), self._created[id(conn)]))
+
+    def getconn(self):
+        """Lấy một kết nối (chờ tối đa `timeout` giây nếu pool đã dùng hết). Trả lại bằng putconn()."""
+        if not self._warmed:
+            self._warm()
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            metrics.inc('db_pool_timeouts_total')
+            raise PoolTimeout(f"hết kết nối trong pool ({self.max_size}) sau {self.timeout}s")
+        metrics.observe('db_pool_wait_seconds', time.perf_counter() - started)
+        try:
+            while True:
+                with self._lock:
+                    item = self._idle.pop() if self._idle else None
+                if item is None:
+                    return self._connect()
+                conn, returned_at, created_at = item
+                if self._healthy(conn, returned_at, created_at):
+                    return conn
+                metrics.inc('db_pool_reconnects_total')
+                self._discard(conn)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn, broken: bool = False) -> None:
+        """Trả kết nối về pool; kết nối hỏng (hoặc broken=True) bị đóng."""
+        try:
+            if broken or _is_broken(conn):
+                # Máy chủ khởi động lại/failover thường làm chết mọi kết nối: kiểm tra lại tất cả
+                self._suspect_before = time.monotonic()
+                self._discard(conn)
+                return
+            if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    self._discard(conn)
+                    return
+            now = time.monotonic()
+            stale = []
+            with self._lock:
+                created_at = self._created.get(id(conn), now)
+                self._idle.append((conn, now, created_at))
+                # Đóng bớt kết nối rảnh quá lâu, giữ lại min_size
+                while len(self._idle) > self.min_size and now - self._idle[0][1] > self.max_idle_seconds:
+                    stale.append(self._idle.popleft()[0])
+            for old in stale:
+                self._discard(old)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Context manager: một kết nối của pool, tự trả về khi ra khỏi khối."""
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def run(self, work: Callable[[Any], T], retries: int = 1) -> T:
+        """
+        Chạy work(conn) với một kết nối của pool. Nếu kết nối tới máy chủ bị mất giữa chừng
+        (restart, failover), chạy lại trên kết nối mới tối đa `retries` lần; chỉ dùng cho
+        thao tác chạy lại được (đọc, upsert trong một transaction).
+        """
+        for attempt in range(retries + 1):
+            conn = self.getconn()
+            try:
+                return work(conn)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                if not _is_broken(conn) or attempt >= retries:
+                    raise
+                logger.warning(f"Mất kết nối PostgreSQL ({e.__class__.__name__}: {str(e).strip()}), "
+                               f"thử lại trên kết nối mới")
+            finally:
+                self.putconn(conn)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'open': len(self._created), 'idle': len(self._idle), 'max': self.max_size}
+
+    def close(self) -> None:
+        """Đóng mọi kết nối rảnh (kết nối đang được dùng đóng khi được trả về)."""
+        with self._lock:
+            idle = [item[0] for item in self._idle]
+            self._idle.clear()
+            self._warmed = False
+        for conn in idle:
+            self._discard(conn)
+
+
+class DirectConnections:
+    """Cùng giao diện với ConnectionPool nhưng mở một kết nối mới cho mỗi thao tác (DB_POOL=0)."""
+
+    def __init__(self, conn_params: Dict[str, Any]):
+        self.conn_params = connect_params(conn_params)
+
+    def getconn(self):
+        with metrics.timed('db.connect'):
+            return psycopg2.connect(**self.conn_params)
+
+    def putconn(self, conn, broken: bool = False) -> None:
+        conn.close()
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def run(self, work: Callable[[Any], T], retries: int = 1) -> T:
+        for attempt in range(retries + 1):
+            conn = self.getconn()
+            try:
+                return work(conn)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                if not _is_broken(conn) or attempt >= retries:
+                    raise
+            finally:
+                self.putconn(conn)
+
+    def stats(self) -> Dict[str, int]:
+        return {'open': 0, 'idle': 0, 'max': 0}
+
+    def close(self) -> None:
+        pass
+
+
+def create_pool(conn_params: Dict[str, Any], **kwargs):
+    """ConnectionPool, hoặc DirectConnections nếu DB_POOL=0."""
+    if not USE_POOL:
+        return DirectConnections(conn_params)
+    return ConnectionPool(conn_params, **kwargs)
@@ -0,0 +1,350 @@
+"""
+Persistent embedding cache in a local SQLite database.
+
+Entries are keyed by the SHA-256 of the normalized text (Unicode NFC,
+collapsed whitespace) together with the model, task type and output
+dimensionality, so re-loading the same documents, or chunks that repeat the
+same boilerplate ("Căn cứ ..."), are embedded only once. Vectors are stored
+as compact float32 blobs; the least recently used entries are evicted once
+the cache holds more than ``max_entries``.
+
+QueryEmbeddingCache is the in-process counterpart for search queries: an LRU
+with a TTL in front of the embedding call in semantic_search, which also
+coalesces concurrent identical queries into a single request (from threads
+through get_or_compute, from asyncio tasks through aget_or_compute).
+"""
+
+import os
+import re
+import time
+import array
+import asyncio
+import hashlib
+import sqlite3
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from src.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Model và task_type cho embedding chunk tài liệu (PgVectorStorage, AsyncPgVectorStorage,
+# scripts/batch_process.py). Cả hai là một phần của khóa cache nên mọi nơi phải dùng chung.
+# task_type None = mặc định của model, giống embedding câu hỏi tìm kiếm.
+EMBEDDING_MODEL = 'models/text-embedding-004'
+EMBEDDING_TASK_TYPE: Optional[str] = None
+
+DEFAULT_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH', 'data/cache/embeddings.sqlite')
+DEFAULT_MAX_ENTRIES = int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', '200000'))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    key       TEXT PRIMARY KEY,
+    model     TEXT NOT NULL,
+    dim       INTEGER NOT NULL,
+    vector    BLOB NOT NULL,          -- float32, little-endian
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used);
+"""
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_text(text: str) -> str:
+    """Chuẩn hóa text trước khi băm: Unicode NFC, gộp khoảng trắng, bỏ khoảng trắng hai đầu."""
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFC', text)).strip()
+
+
+def embedding_key(text: str, model: str, task_type: Optional[str] = None,
+                  dimensionality: Optional[int] = None) -> str:
+    payload = '\x1f'.join([model, task_type or '-', str(dimensionality or '-'), normalize_text(text)])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _pack(vector: Sequence[float]) -> bytes:
+    values = array.array('f', vector)
+    if values.itemsize != 4:
+        raise RuntimeError("float32 không được hỗ trợ trên nền tảng này")
+    return values.tobytes()
+
+
+def _unpack(blob: bytes) -> List[float]:
+    values = array.array('f')
+    values.frombytes(blob)
+    return values.tolist()
+
+
+class EmbeddingCache:
+    """Cache embedding trên đĩa (SQLite), khóa theo (hash text chuẩn hóa, model, task_type, số chiều)."""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # Một kết nối ngắn cho mỗi thao tác: an toàn khi gọi từ nhiều luồng / tiến trình
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get_many(self, texts: Sequence[str], model: str, task_type: Optional[str] = None,
+                 dimensionality: Optional[int] = None) -> List[Optional[List[float]]]:
+        """Embedding đã cache cho từng text (None nếu chưa có), theo đúng vị trí."""
+        keys = [embedding_key(text, model, task_type, dimensionality) for text in texts]
+        found: Dict[str, bytes] = {}
+        unique = list(dict.fromkeys(keys))
+        with self._connect() as conn:
+            # SQLite giới hạn số tham số của một câu lệnh
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch)
+                found.update(rows.fetchall())
+            if found:
+                now = time.time()
+                conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                 [(now, key) for key in found])
+
+        results = [_unpack(found[key]) if key in found else None for key in keys]
+        hits = sum(1 for result in results if result is not None)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(results) - hits
+        metrics.inc('embedding_cache_total', hits, result='hit')
+        metrics.inc('embedding_cache_total', len(results) - hits, result='miss')
+        return results
+
+    def get(self, text: str, model: str, task_type: Optional[str] = None,
+            dimensionality: Optional[int] = None) -> Optional[List[float]]:
+        return self.get_many([text], model, task_type, dimensionality)[0]
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Optional[Sequence[float]]], model: str,
+                 task_type: Optional[str] = None, dimensionality: Optional[int] = None) -> None:
+        """Lưu embedding của các text (bỏ qua vector None)."""
+        now = time.time()
+        rows = [(embedding_key(text, model, task_type, dimensionality), model, len(vector), _pack(vector), now)
+                for text, vector in zip(texts, vectors) if vector is not None]
+        if not rows:
+            return
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO embeddings (key, model, dim, vector, last_used) "
+                             "VALUES (?, ?, ?, ?, ?)", rows)
+        with self._lock:
+            self._writes_since_evict += len(rows)
+            # Kiểm tra kích thước định kỳ thay vì sau mỗi lần ghi
+            evict = self._writes_since_evict >= max(1, self.max_entries // 100)
+            if evict:
+                self._writes_since_evict = 0
+        if evict:
+            self.evict()
+
+    def put(self, text: str, vector: Sequence[float], model: str, task_type: Optional[str] = None,
+            dimensionality: Optional[int] = None) -> None:
+        self.put_many([text], [vector], model, task_type, dimensionality)
+
+    def evict(self) -> int:
+        """Xóa các entry ít được dùng gần đây nhất khi vượt max_entries. Trả về số entry đã xóa."""
+        with self._connect() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            excess = count - self.max_entries
+            if excess <= 0:
+                return 0
+            conn.execute("DELETE FROM embeddings WHERE key IN "
+                         "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,))
+        logger.info(f"🧹 Cache embedding: xóa {excess} entry ít dùng nhất")
+        return excess
+
+    def stats(self) -> Dict[str, float]:
+        """Số lần hit/miss trong tiến trình này, tỷ lệ hit, số entry và dung lượng trên đĩa."""
+        with self._connect() as conn:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'entries': entries,
+            'vector_mb': round(size / 1024 / 1024, 2),
+        }
+
+    def log_stats(self) -> None:
+        stats = self.stats()
+        logger.info(f"🧠 Cache embedding: {stats['hits']} hit / {stats['misses']} miss "
+                    f"({stats['hit_rate']:.0%}), {stats['entries']} entry, {stats['vector_mb']} MB")
+
+
+DEFAULT_QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', '2048'))
+DEFAULT_QUERY_CACHE_TTL = float(os.getenv('QUERY_CACHE_TTL', '3600'))
+
+
+def normalize_query(query: str) -> str:
+    """Khóa cache của câu hỏi: text chuẩn hóa, không phân biệt hoa thường."""
+    return normalize_text(query).lower()
+
+
+class _Flight:
+    """Một lần tính embedding đang chạy, các luồng hỏi cùng câu chờ kết quả của nó."""
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+class QueryEmbeddingCache:
+    """
+    Cache LRU trong bộ nhớ, có TTL, cho embedding của câu hỏi tìm kiếm. Các lời gọi
+    đồng thời cùng một câu hỏi chỉ tạo một request embedding (single-flight).
+    """
+
+    def __init__(self, max_size: int = DEFAULT_QUERY_CACHE_SIZE, ttl_seconds: float = DEFAULT_QUERY_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        # key -> (embedding, hết hạn lúc)
+        self._entries: OrderedDict = OrderedDict()
+        self._inflight: Dict[str, _Flight] = {}
+        self._async_inflight: Dict[str, asyncio.Future] = {}
+
+    def get_or_compute(self, query: str, compute) -> Optional[List[float]]:
+        """Embedding của query từ cache; nếu chưa có thì gọi compute() (một lần cho mỗi query đang chờ)."""
+        key = normalize_query(query)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                result = 'hit'
+            else:
+                if entry is not None:
+                    del self._entries[key]
+                flight = self._inflight.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._inflight[key] = _Flight()
+                    self.misses += 1
+                    result = 'miss'
+                else:
+                    self.coalesced += 1
+                    result = 'coalesced'
+        metrics.inc('query_embedding_cache_total', result=result)
+        if result == 'hit':
+            return entry[0]
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        value = None
+        try:
+            value = compute()
+        except Exception as e:
+            # Các luồng đang chờ nhận cùng lỗi thay vì None
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._remember(key, value)
+                del self._inflight[key]
+            flight.value = value
+            flight.done.set()
+        return value
+
+    async def aget_or_compute(self, query: str, compute) -> Optional[List[float]]:
+        """
+        Như get_or_compute nhưng cho asyncio: compute() trả về coroutine, các task hỏi
+        cùng câu chờ chung một future thay vì chặn event loop.
+        """
+        key = normalize_query(query)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                result = 'hit'
+            else:
+                if entry is not None:
+                    del self._entries[key]
+                future = self._async_inflight.get(key)
+                leader = future is None
+                if leader:
+                    future = self._async_inflight[key] = asyncio.get_running_loop().create_future()
+                    self.misses += 1
+                    result = 'miss'
+                else:
+                    self.coalesced += 1
+                    result = 'coalesced'
+        metrics.inc('query_embedding_cache_total', result=result)
+        if result == 'hit':
+            return entry[0]
+        if not leader:
+            # shield: task chờ bị hủy không hủy luôn kết quả dùng chung
+            return await asyncio.shield(future)
+
+        value = error = None
+        try:
+            value = await compute()
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            with self._lock:
+                self._remember(key, value)
+                del self._async_inflight[key]
+            if error is not None:
+                # Các task đang chờ nhận cùng lỗi như luồng ở get_or_compute
+                future.set_exception(error)
+                # Không có task nào chờ thì asyncio không cảnh báo "exception was never retrieved"
+                future.exception()
+            else:
+                future.set_result(value)
+        return value
+
+    def _remember(self, key: str, value: Optional[List[float]]) -> None:
+        # Không cache lỗi (None): lần hỏi sau sẽ thử lại. Gọi khi đang giữ self._lock
+        if value is not None and self.max_size > 0:
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Số lần hit/miss/gộp chung request, tỷ lệ hit và số câu hỏi đang cache."""
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'hit_rate': round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0,
+                'size': len(self._entries),
+            }
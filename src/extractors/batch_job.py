@@ -0,0 +1,178 @@
+"""
+Offline batch-job extraction through the Gemini Batch API.
+
+One JSONL request line is written per PDF (prompt + uploaded file reference +
+``DocumentData`` JSON schema), the JSONL file is submitted as a single batch
+job, and the result lines are mapped back to their PDFs by ``key``.
+
+``LocalBatchBackend`` is an in-process stand-in for ``client.files`` /
+``client.batches`` so the whole flow can be exercised without the API.
+"""
+
+import json
+import time
+import uuid
+import logging
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+COMPLETED_STATES = {
+    'JOB_STATE_SUCCEEDED',
+    'JOB_STATE_FAILED',
+    'JOB_STATE_CANCELLED',
+    'JOB_STATE_EXPIRED',
+}
+
+
+def build_request_line(key: str, prompt: str, file_uri: str, schema: Dict[str, Any],
+                       temperature: float, mime_type: str = 'application/pdf') -> Dict[str, Any]:
+    """Tạo một dòng request JSONL theo đúng dạng process_document gửi lên model."""
+    return {
+        'key': key,
+        'request': {
+            'contents': [{
+                'role': 'user',
+                'parts': [
+                    {'text': prompt},
+                    {'file_data': {'file_uri': file_uri, 'mime_type': mime_type}},
+                ],
+            }],
+            'generation_config': {
+                'response_mime_type': 'application/json',
+                'response_json_schema': schema,
+                'temperature': temperature,
+            },
+        },
+    }
+
+
+def write_requests(path: str, lines: Iterable[Dict[str, Any]]) -> int:
+    """Ghi các request ra file JSONL, trả về số dòng."""
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for line in lines:
+            f.write(json.dumps(line, ensure_ascii=False) + '\n')
+            count += 1
+    return count
+
+
+def submit_batch(client, requests_path: str, model: str, display_name: str):
+    """Tải file JSONL lên và tạo batch job."""
+    uploaded = client.files.upload(
+        file=requests_path,
+        config={'mime_type': 'jsonl', 'display_name': display_name},
+    )
+    job = client.batches.create(model=model, src=uploaded.name, config={'display_name': display_name})
+    logger.info(f"Đã tạo batch job {job.name} (file requests: {uploaded.name})")
+    return job
+
+
+def wait_for_batch(client, job_name: str, poll_seconds: float = 60, timeout: Optional[float] = None):
+    """Thăm dò trạng thái batch job cho đến khi kết thúc (hoặc hết timeout)."""
+    started = time.monotonic()
+    while True:
+        job = client.batches.get(name=job_name)
+        state = job.state.name
+        if state in COMPLETED_STATES:
+            logger.info(f"Batch job {job_name} kết thúc với trạng thái {state}")
+            return job
+        if timeout is not None and time.monotonic() - started > timeout:
+            raise TimeoutError(f"Batch job {job_name} chưa xong sau {timeout}s (trạng thái {state})")
+        logger.info(f"Batch job {job_name}: {state}, thử lại sau {poll_seconds}s...")
+        time.sleep(poll_seconds)
+
+
+def parse_result_line(line: Dict[str, Any]) -> Tuple[str, Optional[str], Optional[str]]:
+    """Trả về (key, text JSON của model, lỗi) cho một dòng kết quả."""
+    key = line.get('key')
+    if line.get('error'):
+        return key, None, json.dumps(line['error'], ensure_ascii=False)
+    try:
+        parts = line['response']['candidates'][0]['content']['parts']
+    except (KeyError, IndexError, TypeError):
+        return key, None, 'Phản hồi không có nội dung'
+    text = ''.join(part.get('text', '') for part in parts)
+    return key, text, None
+
+
+def iter_results(client, job) -> Iterator[Tuple[str, Optional[str], Optional[str]]]:
+    """Tải file kết quả của batch job và duyệt từng dòng."""
+    content = client.files.download(file=job.dest.file_name)
+    if isinstance(content, bytes):
+        content = content.decode('utf-8')
+    for raw in content.splitlines():
+        if raw.strip():
+            yield parse_result_line(json.loads(raw))
+
+
+class LocalBatchBackend:
+    """
+    Fake endpoint cho Batch API: cung cấp `files` và `batches` giống client của google-genai.
+    `responder(request) -> str` sinh text JSON cho mỗi request; job hoàn tất sau `polls_until_done` lần get.
+    """
+
+    def __init__(self, responder: Callable[[Dict[str, Any]], str], polls_until_done: int = 1):
+        self.responder = responder
+        self.polls_until_done = polls_until_done
+        self.stored: Dict[str, bytes] = {}
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self.files = SimpleNamespace(upload=self._upload, download=self._download,
+                                     delete=self._delete, get=self._get)
+        self.batches = SimpleNamespace(create=self._create, get=self._get_job)
+
+    # --- files ---
+    def _upload(self, file, config=None):
+        name = f"files/{uuid.uuid4().hex[:12]}"
+        with open(file, 'rb') as f:
+            self.stored[name] = f.read()
+        return SimpleNamespace(name=name, uri=f"local://{name}", state=SimpleNamespace(name='ACTIVE'))
+
+    def _get(self, name):
+        if name not in self.stored:
+            raise KeyError(name)
+        return SimpleNamespace(name=name, uri=f"local://{name}", state=SimpleNamespace(name='ACTIVE'))
+
+    def _download(self, file):
+        return self.stored[file]
+
+    def _delete(self, name):
+        self.stored.pop(name, None)
+
+    # --- batches ---
+    def _create(self, model, src, config=None):
+        name = f"batches/{uuid.uuid4().hex[:12]}"
+        self.jobs[name] = {'src': src, 'model': model, 'polls': 0, 'dest': None}
+        return self._job_view(name, 'JOB_STATE_PENDING')
+
+    def _get_job(self, name):
+        job = self.jobs[name]
+        job['polls'] += 1
+        if job['polls'] < self.polls_until_done:
+            return self._job_view(name, 'JOB_STATE_RUNNING')
+        if job['dest'] is None:
+            job['dest'] = self._run(job['src'])
+        return self._job_view(name, 'JOB_STATE_SUCCEEDED')
+
+    def _run(self, src: str) -> str:
+        out_lines = []
+        for raw in self.stored[src].decode('utf-8').splitlines():
+            if not raw.strip():
+                continue
+            line = json.loads(raw)
+            try:
+                text = self.responder(line['request'])
+                out_lines.append({'key': line['key'], 'response': {
+                    'candidates': [{'content': {'parts': [{'text': text}], 'role': 'model'}}]
+                }})
+            except Exception as e:
+                out_lines.append({'key': line['key'], 'error': {'message': str(e)}})
+        dest = f"files/{uuid.uuid4().hex[:12]}"
+        self.stored[dest] = '\n'.join(json.dumps(l, ensure_ascii=False) for l in out_lines).encode('utf-8')
+        return dest
+
+    def _job_view(self, name: str, state: str):
+        dest_name = self.jobs[name]['dest']
+        dest = SimpleNamespace(file_name=dest_name) if dest_name else None
+        return SimpleNamespace(name=name, state=SimpleNamespace(name=state), dest=dest)
@@ -0,0 +1,166 @@
+"""
+Content-addressed cache for extraction results.
+
+Each entry is keyed by the SHA-256 of the PDF bytes plus a hash of everything
+that influences the model output (prompt template, response schema, model name
+and temperature). Renaming a file therefore hits the cache, while editing the
+prompt or schema produces a new key.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.getenv('EXTRACTION_CACHE_DIR', 'data/cache/extractions')
+DEFAULT_MAX_BYTES = int(float(os.getenv('EXTRACTION_CACHE_MAX_MB', '500')) * 1024 * 1024)
+
+
+def file_sha256(file_path: str, block_size: int = 1 << 20) -> str:
+    """Tính SHA-256 của nội dung file (đọc theo block để tiết kiệm bộ nhớ)."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def config_hash(prompt_template: str, schema: Dict[str, Any], model: str, temperature: float) -> str:
+    """Hash cấu hình trích xuất: prompt, JSON schema, model và temperature."""
+    payload = json.dumps({
+        'prompt': prompt_template,
+        'schema': schema,
+        'model': model,
+        'temperature': temperature,
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def make_cache_key(pdf_sha256: str, cfg_hash: str) -> str:
+    """Ghép hash PDF và hash cấu hình thành khóa cache."""
+    return f"{pdf_sha256[:32]}-{cfg_hash[:32]}"
+
+
+class ExtractionCache:
+    """Cache kết quả trích xuất trên đĩa, mỗi entry là một file JSON."""
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Trả về entry nếu có, đồng thời cập nhật mtime để phục vụ LRU."""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Entry cache hỏng, bỏ qua {path.name}: {e}")
+            return None
+
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return entry
+
+    def put(self, key: str, data: Dict[str, Any], **meta: Any) -> None:
+        """Ghi entry một cách atomic (file tạm + os.replace) rồi dọn cache nếu vượt dung lượng."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        entry = dict(meta, key=key, created_at=time.time(), data=data)
+        path = self._path(key)
+        tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def list_entries(self) -> List[Dict[str, Any]]:
+        """Liệt kê các entry (mới dùng gần nhất trước)."""
+        if not self.cache_dir.exists():
+            return []
+
+        entries = []
+        for path in self.cache_dir.glob('*.json'):
+            try:
+                stat = path.stat()
+                with open(path, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+            entries.append({
+                'key': path.stem,
+                'file_name': entry.get('file_name'),
+                'model': entry.get('model'),
+                'chunks': len(entry.get('data', {}).get('chunk_metadata', [])),
+                'size': stat.st_size,
+                'created_at': entry.get('created_at'),
+                'last_used': stat.st_mtime,
+            })
+        return sorted(entries, key=lambda e: e['last_used'], reverse=True)
+
+    def total_size(self) -> int:
+        """Tổng dung lượng cache (bytes)."""
+        if not self.cache_dir.exists():
+            return 0
+        return sum(p.stat().st_size for p in self.cache_dir.glob('*.json'))
+
+    def evict(self, max_bytes: Optional[int] = None) -> int:
+        """Xóa các entry ít dùng nhất cho đến khi tổng dung lượng <= max_bytes."""
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        if not self.cache_dir.exists():
+            return 0
+
+        files = []
+        for path in self.cache_dir.glob('*.json'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for _, size, path in sorted(files):
+            if total <= limit:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+
+        if removed:
+            logger.info(f"Đã xóa {removed} entry cache cũ (dung lượng còn {total / 1024 / 1024:.1f} MB)")
+        return removed
+
+    def prune(self, older_than_days: Optional[float] = None, max_bytes: Optional[int] = None) -> int:
+        """Xóa entry lâu không dùng và/hoặc giảm cache xuống max_bytes."""
+        removed = 0
+        if older_than_days is not None and self.cache_dir.exists():
+            cutoff = time.time() - older_than_days * 86400
+            for path in self.cache_dir.glob('*.json'):
+                try:
+                    if path.stat().st_mtime < cutoff:
+                        path.unlink()
+                        removed += 1
+                except OSError:
+                    continue
+        if max_bytes is not None:
+            removed += self.evict(max_bytes)
+        return removed
+
+    def clear(self) -> int:
+        """Xóa toàn bộ cache."""
+        return self.prune(max_bytes=0)
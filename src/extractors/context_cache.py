@@ -0,0 +1,141 @@
+"""
+Explicit Gemini context caching for the static analysis instructions.
+
+The instructions are identical for every file, so they are uploaded once per
+run (and per model) as a cached system instruction; each request then only
+sends the short per-file prompt plus the PDF. The cache's TTL is extended
+shortly before it expires, so long-running workers keep using it.
+"""
+
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from src.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Gia hạn (hoặc tạo lại) cache khi còn ít hơn khoảng này trước khi hết TTL
+EXPIRY_MARGIN_SECONDS = 5 * 60
+# Sau khi tạo cache thất bại, gửi prompt đầy đủ và chỉ thử tạo lại sau khoảng này
+RETRY_AFTER_SECONDS = 10 * 60
+
+
+def is_cache_error(error: Exception) -> bool:
+    """True nếu lỗi API có thể do cached_content không còn (hết hạn / bị xóa)."""
+    return getattr(error, 'code', None) in (400, 404) or \
+        getattr(error, 'status', None) in ('NOT_FOUND', 'INVALID_ARGUMENT')
+
+
+class PromptContextCache:
+    """
+    Tạo (lười) một cached content cho mỗi model, gia hạn TTL trước khi hết hạn
+    và xóa khi kết thúc lần chạy.
+    """
+
+    def __init__(self, system_instruction: str, ttl_seconds: int = 3600, display_name: str = 'analysis-prompt',
+                 clock: Callable[[], float] = time.time):
+        self.system_instruction = system_instruction
+        self.ttl_seconds = ttl_seconds
+        self.display_name = display_name
+        self._clock = clock
+        self._lock = threading.Lock()
+        # model -> (tên cached content, thời điểm hết hạn). Tên None nghĩa là tạo thất bại;
+        # thời điểm đi kèm là lúc được thử tạo lại.
+        self._entries: Dict[str, Tuple[Optional[str], float]] = {}
+
+    def _expires_at(self, cache) -> float:
+        expiration = getattr(cache, 'expire_time', None)
+        if isinstance(expiration, datetime):
+            return expiration.timestamp()
+        return self._clock() + self.ttl_seconds
+
+    def _create(self, client, model: str) -> Tuple[Optional[str], float]:
+        try:
+            with metrics.timed('gemini.caches.create', model=model):
+                cache = client.caches.create(
+                    model=model,
+                    config={
+                        'display_name': self.display_name,
+                        'system_instruction': self.system_instruction,
+                        'ttl': f'{self.ttl_seconds}s',
+                    },
+                )
+            logger.info(f"Đã tạo context cache {cache.name} cho prompt phân tích ({model})")
+            return cache.name, self._expires_at(cache)
+        except Exception as e:
+            logger.warning(f"Không tạo được context cache cho {model}, gửi prompt đầy đủ. Lỗi: {e}")
+            return None, self._clock() + RETRY_AFTER_SECONDS
+
+    def _refresh(self, client, model: str, name: str) -> Optional[Tuple[str, float]]:
+        try:
+            with metrics.timed('gemini.caches.update', model=model):
+                cache = client.caches.update(name=name, config={'ttl': f'{self.ttl_seconds}s'})
+            logger.info(f"Đã gia hạn context cache {name} ({model})")
+            return name, self._expires_at(cache)
+        except Exception as e:
+            logger.info(f"Không gia hạn được context cache {name} ({e}), tạo lại.")
+            return None
+
+    def get_name(self, client, model: str) -> Optional[str]:
+        """
+        Trả về tên cached content cho model: tạo mới ở lần gọi đầu tiên, gia hạn TTL
+        (hoặc tạo lại) khi sắp hết hạn. None nếu không có cache (gửi prompt đầy đủ).
+        """
+        with self._lock:
+            now = self._clock()
+            name, expires_at = self._entries.get(model, (None, 0.0))
+            if name and expires_at - EXPIRY_MARGIN_SECONDS > now:
+                return name
+            if not name and expires_at > now:
+                # Lần tạo trước thất bại, chưa đến lúc thử lại
+                return None
+            entry = self._refresh(client, model, name) if name else None
+            self._entries[model] = entry or self._create(client, model)
+            return self._entries[model][0]
+
+    def invalidate(self, model: str, name: str) -> None:
+        """Bỏ cache `name` của model (server báo không còn); lần gọi sau sẽ tạo lại."""
+        with self._lock:
+            if self._entries.get(model, (None, 0.0))[0] == name:
+                self._entries.pop(model)
+                logger.warning(f"Context cache {name} ({model}) không còn dùng được, bỏ khỏi danh sách.")
+
+    def delete(self, client) -> None:
+        """Xóa mọi cached content đã tạo trong lần chạy này."""
+        with self._lock:
+            for model, (name, _) in self._entries.items():
+                if not name:
+                    continue
+                try:
+                    client.caches.delete(name=name)
+                    logger.info(f"Đã xóa context cache {name}")
+                except Exception as e:
+                    logger.warning(f"Không thể xóa context cache {name}. Lỗi: {e}")
+            self._entries.clear()
+
+
+def record_usage(report: Dict[str, Any], usage, lock: Optional[threading.Lock] = None) -> None:
+    """
+    Cộng dồn usage_metadata của một lần gọi vào report:
+    input_tokens, cached_input_tokens, uncached_input_tokens, output_tokens.
+    """
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, 'prompt_token_count', None) or 0
+    cached_tokens = getattr(usage, 'cached_content_token_count', None) or 0
+    output_tokens = getattr(usage, 'candidates_token_count', None) or 0
+
+    def _add():
+        report['input_tokens'] = report.get('input_tokens', 0) + prompt_tokens
+        report['cached_input_tokens'] = report.get('cached_input_tokens', 0) + cached_tokens
+        report['uncached_input_tokens'] = report.get('uncached_input_tokens', 0) + prompt_tokens - cached_tokens
+        report['output_tokens'] = report.get('output_tokens', 0) + output_tokens
+
+    if lock is None:
+        _add()
+    else:
+        with lock:
+            _add()
@@ -0,0 +1,190 @@
+"""
+Registry of files uploaded to the Gemini Files API, keyed by content hash.
+
+Uploads are reused across retries, re-prompts, extraction schemas and
+processes until shortly before their server-side expiration. The registry is
+a small JSON file guarded by a lock file, so concurrent batch runs share it.
+
+End-of-run cleanup only forgets expired entries; release() deletes just the
+files this process uploaded, never uploads other live processes may be using.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+from src.extractors.cache import file_sha256
+from src.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REGISTRY_PATH = os.getenv('UPLOAD_REGISTRY_PATH', 'data/cache/uploads.json')
+# File trên Gemini Files API tự hết hạn sau 48 giờ
+DEFAULT_TTL_SECONDS = 48 * 3600
+# Không dùng lại file sắp hết hạn (model có thể cần file trong vài phút)
+EXPIRY_MARGIN_SECONDS = 30 * 60
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+def _expires_at(uploaded) -> float:
+    expiration = getattr(uploaded, 'expiration_time', None)
+    if isinstance(expiration, datetime):
+        return expiration.timestamp()
+    return time.time() + DEFAULT_TTL_SECONDS
+
+
+class UploadRegistry:
+    """Đăng ký các file đã tải lên theo SHA-256 để tái sử dụng."""
+
+    def __init__(self, path: str = DEFAULT_REGISTRY_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._guard = threading.Lock()
+        self._content_locks: Dict[str, threading.Lock] = {}
+        # sha256 -> đối tượng File đã xác minh trong tiến trình này
+        self._live: Dict[str, Any] = {}
+        # sha256 -> tên file do chính tiến trình này tải lên (chỉ những file này được release)
+        self._own: Dict[str, str] = {}
+        self.reused = 0
+        self.uploaded = 0
+
+    @contextmanager
+    def _locked(self):
+        """Khóa trong tiến trình + khóa file giữa các tiến trình (nếu hệ điều hành hỗ trợ)."""
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(f"{self.path}.lock", 'a+') as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write(self, entries: Dict[str, Dict[str, Any]]) -> None:
+        tmp_path = self.path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def _content_lock(self, sha256: str) -> threading.Lock:
+        with self._guard:
+            return self._content_locks.setdefault(sha256, threading.Lock())
+
+    def get_or_upload(self, client, file_path: str, sha256: Optional[str] = None):
+        """Trả về file đã tải lên cho nội dung này, chỉ tải lên nếu chưa có bản còn hạn."""
+        sha256 = sha256 or file_sha256(file_path)
+
+        # Các luồng cùng xử lý một nội dung chờ nhau thay vì tải lên hai lần;
+        # nội dung khác nhau vẫn được tải lên song song.
+        with self._content_lock(sha256):
+            with self._locked():
+                entry = self._read().get(sha256)
+
+            if entry and entry['expires_at'] - EXPIRY_MARGIN_SECONDS > time.time():
+                uploaded = self._live.get(sha256)
+                if uploaded is None:
+                    try:
+                        uploaded = client.files.get(name=entry['name'])
+                    except Exception as e:
+                        logger.info(f"File {entry['name']} không còn trên server ({e}), tải lên lại.")
+                if uploaded is not None:
+                    self._live[sha256] = uploaded
+                    self.reused += 1
+                    logger.info(f"♻️ Dùng lại file đã tải lên {entry['name']} cho {os.path.basename(file_path)}")
+                    return uploaded
+
+            logger.info(f"Đang tải file lên: {os.path.basename(file_path)}...")
+            with metrics.timed('gemini.files.upload'):
+                uploaded = client.files.upload(file=file_path)
+            metrics.inc('upload_bytes_total', os.path.getsize(file_path))
+            self.uploaded += 1
+            self._live[sha256] = uploaded
+            self._own[sha256] = uploaded.name
+
+            with self._locked():
+                entries = self._read()
+                entries[sha256] = {
+                    'name': uploaded.name,
+                    'file_name': os.path.basename(file_path),
+                    'uploaded_at': time.time(),
+                    'expires_at': _expires_at(uploaded),
+                }
+                self._write(entries)
+            return uploaded
+
+    def owns(self, name: str) -> bool:
+        """True nếu file `name` do tiến trình này tải lên."""
+        return name in self._own.values()
+
+    def _prune_live(self, entries: Dict[str, Dict[str, Any]]) -> None:
+        """Bỏ các đối tượng File trong _live không còn (hoặc đã đổi tên) trong registry."""
+        for sha256, uploaded in list(self._live.items()):
+            entry = entries.get(sha256)
+            if entry is None or entry['name'] != getattr(uploaded, 'name', entry['name']):
+                self._live.pop(sha256, None)
+
+    def release(self, client, names: Optional[Iterable[str]] = None) -> int:
+        """
+        Xóa các file trên server và bỏ chúng khỏi registry. Mặc định (names=None) chỉ xóa
+        các file do tiến trình này tải lên; file tiến trình khác tải lên không bị đụng tới.
+        """
+        wanted = set(names) if names is not None else set(self._own.values())
+        if not wanted:
+            return 0
+        deleted = 0
+        with self._locked():
+            entries = self._read()
+            for name in wanted:
+                try:
+                    client.files.delete(name=name)
+                    deleted += 1
+                except Exception as e:
+                    logger.warning(f"Không thể xóa file tạm {name}. Lỗi: {e}")
+            for sha256, entry in list(entries.items()):
+                if entry['name'] in wanted:
+                    entries.pop(sha256)
+            for sha256, name in list(self._own.items()):
+                if name in wanted:
+                    self._own.pop(sha256)
+            self._prune_live(entries)
+            self._write(entries)
+        return deleted
+
+    def gc(self, client, release_own: bool = False) -> int:
+        """
+        Dọn registry cuối mỗi lần chạy: bỏ các entry đã hết hạn (server tự xóa file), file
+        còn hạn được giữ lại cho lần chạy sau và các tiến trình khác. release_own=True xóa
+        thêm các file do chính tiến trình này tải lên.
+        """
+        deleted = self.release(client) if release_own else 0
+
+        now = time.time()
+        with self._locked():
+            entries = self._read()
+            expired = [sha for sha, e in entries.items() if e['expires_at'] - EXPIRY_MARGIN_SECONDS <= now]
+            for sha256 in expired:
+                entries.pop(sha256)
+            self._prune_live(entries)
+            self._write(entries)
+        logger.info(f"Registry upload: bỏ {len(expired)} entry hết hạn, xóa {deleted} file của lần chạy này "
+                    f"(tải lên {self.uploaded}, dùng lại {self.reused} lần)")
+        return len(expired)
@@ -0,0 +1,935 @@
+"""
+Gemini extraction library: PDF -> DocumentData (document + chunk metadata).
+
+Importing this module is cheap and has no side effects: google-genai is only
+imported, and the client only created, on the first API call (get_client()).
+Environment variables are read at import time, so entry points should call
+load_dotenv() before importing it.
+"""
+
+import os
+import json
+import csv
+import logging
+import time
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterator, Optional
+
+from pydantic import ValidationError
+
+from src.dataset_storage import DocumentDataset
+from src.extractors.cache import ExtractionCache, config_hash, file_sha256, make_cache_key
+from src.extractors.context_cache import PromptContextCache, is_cache_error, record_usage
+from src.extractors.file_registry import UploadRegistry
+from src.extractors.json_repair import chunk_fingerprint, salvage_json
+from src.extractors.preflight import PreflightResult, estimate_text_tokens, preflight_pdf
+from src.extractors.prompts import (
+    ANALYSIS_INSTRUCTIONS,
+    get_continuation_prompt,
+    get_file_prompt,
+    get_full_analysis_prompt,
+    get_window_prompt,
+)
+from src.extractors.routing import ModelRouter, ModelTier, extract_features
+from src.extractors.schemas import ChunkData, ChunkMetadata, DocumentData, DocumentMetadata
+from src.extractors.sharding import count_pages, merge_chunks, plan_windows, split_pdf
+from src.extractors.streaming import DocumentStream, iter_events
+from src.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Model và tham số sinh dùng cho trích xuất (cũng là một phần của khóa cache)
+EXTRACTION_MODEL = 'gemini-2.5-flash'
+EXTRACTION_TEMPERATURE = 0.1
+
+# Bảng định tuyến model (MODEL_ROUTING=0 để luôn dùng EXTRACTION_MODEL)
+model_router = ModelRouter.from_env(EXTRACTION_MODEL)
+
+extraction_cache = ExtractionCache()
+
+upload_registry = UploadRegistry()
+
+# Context caching cho phần hướng dẫn tĩnh của prompt (tạo một lần mỗi lần chạy)
+USE_CONTEXT_CACHE = os.getenv('USE_CONTEXT_CACHE', '1') == '1'
+CONTEXT_CACHE_TTL = int(os.getenv('CONTEXT_CACHE_TTL', '3600'))
+prompt_cache = PromptContextCache(ANALYSIS_INSTRUCTIONS, ttl_seconds=CONTEXT_CACHE_TTL)
+_usage_lock = threading.Lock()
+
+# Định dạng đầu ra: 'dataset' (gộp vào data/dataset), 'files' (JSON + 2 CSV mỗi file) hoặc 'both'
+OUTPUT_FORMAT = os.getenv('OUTPUT_FORMAT', 'dataset')
+output_dataset = DocumentDataset()
+
+# Gửi lớp text (gắn số trang) thay cho file PDF khi PDF có lớp text tốt
+TEXT_FAST_PATH = os.getenv('TEXT_FAST_PATH', '1') == '1'
+
+# Số lần tối đa yêu cầu model trích xuất tiếp phần bị cắt ngang
+MAX_CONTINUATIONS = int(os.getenv('MAX_CONTINUATIONS', '3'))
+
+# Chia nhỏ PDF theo cửa sổ trang (0 = tắt). Có thể ghi đè qua tham số của process_document.
+PAGE_WINDOW = int(os.getenv('PDF_PAGE_WINDOW', '0'))
+PAGE_OVERLAP = int(os.getenv('PDF_PAGE_OVERLAP', '1'))
+SHARD_WORKERS = int(os.getenv('PDF_SHARD_WORKERS', '4'))
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Trả về genai.Client dùng chung, tạo ở lần gọi đầu tiên.
+    Báo RuntimeError (thay vì thoát chương trình) nếu thiếu GEMINI_API_KEY.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            api_key = os.getenv('GEMINI_API_KEY')
+            if not api_key:
+                raise RuntimeError("Không tìm thấy GEMINI_API_KEY. Vui lòng tạo file .env và thêm key vào.")
+            from google import genai
+            _client = genai.Client(api_key=api_key)
+        return _client
+
+
+def get_extraction_config_hash(model: Optional[str] = None) -> str:
+    """
+    Hash của prompt (dạng template, không phụ thuộc tên file), schema, bảng định tuyến
+    model và temperature. Đổi bất kỳ thành phần nào sẽ làm các entry cache cũ không còn được dùng.
+    Truyền `model` để lấy hash theo đúng một model thay cho cả bảng định tuyến (kết quả
+    sinh ngoài bộ định tuyến, ví dụ batch job).
+    """
+    return config_hash(
+        get_full_analysis_prompt('{file_name}'),
+        DocumentData.model_json_schema(),
+        model or model_router.fingerprint(),
+        EXTRACTION_TEMPERATURE,
+    )
+
+
+def stage_config_hashes() -> dict:
+    """
+    Hash cấu hình của từng bước xử lý một file, theo thứ tự chạy (dùng cho
+    RunManifest): đổi prompt/schema/model làm lại từ 'extract', đổi OUTPUT_FORMAT
+    chỉ cần ghi lại đầu ra ('save', kết quả trích xuất lấy từ cache).
+    """
+    return {
+        'extract': get_extraction_config_hash(),
+        'save': OUTPUT_FORMAT,
+    }
+
+
+DOCUMENT_CSV_COLUMNS = [
+    'DOC_ID', 'FILE_NAME', 'DOC_TITLE', 'DOC_TYPE', 
+    'ISSUE_NUMBER', 'ISSUING_AUTHORITY', 'ISSUING_DEPT',
+    'ISSUE_DATE', 'EFFECTIVE_DATE', 'EXPIRATION_DATE', 'MAJOR_TOPIC'
+]
+
+CHUNK_CSV_COLUMNS = [
+    'CHUNK_ID', 'PAGE_NUMBER', 'SECTION_TITLE', 'CHUNK_TOPIC',
+    'CONTENT_TYPE', 'SPECIFIC_TARGET', 'APPLICABLE_COHORT',
+    'VALUE', 'UNIT', 'KEYWORDS', 'chunk_text'
+]
+
+
+def _document_csv_row(doc: DocumentMetadata) -> list:
+    return [
+        doc.DOC_ID, doc.FILE_NAME, doc.DOC_TITLE, doc.DOC_TYPE,
+        doc.ISSUE_NUMBER, doc.ISSUING_AUTHORITY, doc.ISSUING_DEPT,
+        doc.ISSUE_DATE, doc.EFFECTIVE_DATE, doc.EXPIRATION_DATE, doc.MAJOR_TOPIC
+    ]
+
+
+def _chunk_csv_row(chunk: ChunkMetadata) -> list:
+    return [
+        chunk.CHUNK_ID, chunk.PAGE_NUMBER, chunk.SECTION_TITLE, chunk.CHUNK_TOPIC,
+        chunk.CONTENT_TYPE, chunk.SPECIFIC_TARGET, chunk.APPLICABLE_COHORT,
+        chunk.VALUE, chunk.UNIT, 
+        ', '.join(chunk.KEYWORDS) if chunk.KEYWORDS else '',
+        chunk.chunk_text
+    ]
+
+
+def _output_paths(file_name: str):
+    """Trả về (json_output, doc_csv, chunks_csv) và tạo thư mục output nếu chưa có."""
+    # Tạo base filename (bỏ phần mở rộng .pdf)
+    base_filename = os.path.splitext(file_name)[0]
+    
+    json_dir = 'data/processed/json'
+    csv_dir = 'data/processed/csv'
+    os.makedirs(json_dir, exist_ok=True)
+    os.makedirs(csv_dir, exist_ok=True)
+    
+    return (
+        os.path.join(json_dir, f'{base_filename}_output.json'),
+        os.path.join(csv_dir, f'{base_filename}_document.csv'),
+        os.path.join(csv_dir, f'{base_filename}_chunks.csv'),
+    )
+
+
+def _writes_dataset() -> bool:
+    return OUTPUT_FORMAT in ('dataset', 'both')
+
+
+def _writes_files() -> bool:
+    return OUTPUT_FORMAT in ('files', 'both')
+
+
+def is_processed(file_name: str) -> bool:
+    """File PDF (tên có đuôi .pdf) đã có kết quả trong dataset hoặc trong data/processed chưa."""
+    if _writes_dataset() and output_dataset.has_file(file_name):
+        return True
+    return _writes_files() and os.path.exists(_output_paths(file_name)[0])
+
+
+def save_outputs(data: DocumentData, file_name: str) -> None:
+    """
+    Ghi kết quả trích xuất vào dataset gộp và/hoặc JSON + 2 file CSV trong
+    data/processed, tùy OUTPUT_FORMAT.
+    """
+    if _writes_dataset():
+        output_dataset.append(
+            data.document_metadata.model_dump(mode='json'),
+            (chunk.model_dump(mode='json') for chunk in data.chunk_metadata),
+        )
+    if _writes_files():
+        _save_files(data, file_name)
+
+
+def _save_files(data: DocumentData, file_name: str) -> None:
+    """Ghi kết quả trích xuất ra JSON + 2 file CSV trong data/processed."""
+    json_output, doc_csv, chunks_csv = _output_paths(file_name)
+    
+    # 1. Ghi kết quả ra file JSON
+    with open(json_output, 'w', encoding='utf-8') as f:
+        # Sử dụng model_dump_json để xuất chuẩn (xử lý UUID, date, v.v.)
+        f.write(data.model_dump_json(indent=2, ensure_ascii=False))
+    logger.info(f"✅ Đã lưu JSON vào: {json_output}")
+    
+    # 2. Ghi document metadata ra CSV
+    with open(doc_csv, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(DOCUMENT_CSV_COLUMNS)
+        writer.writerow(_document_csv_row(data.document_metadata))
+    logger.info(f"✅ Đã lưu Document CSV vào: {doc_csv}")
+    
+    # 3. Ghi chunk metadata ra CSV
+    with open(chunks_csv, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(CHUNK_CSV_COLUMNS)
+        for chunk in data.chunk_metadata:
+            writer.writerow(_chunk_csv_row(chunk))
+    logger.info(f"✅ Đã lưu Chunks CSV vào: {chunks_csv}")
+
+
+class StreamingOutputWriter:
+    """
+    Ghi kết quả từng chunk một trong chế độ streaming.
+    Dữ liệu được ghi vào file tạm và chỉ được đưa vào dataset (hoặc đổi tên thành
+    file chính thức) khi commit(), để một lần chạy lỗi giữa chừng không để lại
+    kết quả dở dang.
+    """
+
+    def __init__(self, file_name: str, doc: DocumentMetadata):
+        self.doc = doc
+        self.count = 0
+        self.paths, self.tmp_paths = [], []
+        self._json = self._chunks_file = self._spool = None
+
+        if _writes_dataset():
+            # Chunk được ghi tạm ra đĩa, không giữ trong bộ nhớ
+            self._spool = tempfile.TemporaryFile(mode='w+', encoding='utf-8', prefix='dataset_chunks_')
+
+        if _writes_files():
+            self.paths = _output_paths(file_name)
+            self.tmp_paths = [f"{path}.part" for path in self.paths]
+
+            with open(self.tmp_paths[1], 'w', encoding='utf-8-sig', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(DOCUMENT_CSV_COLUMNS)
+                writer.writerow(_document_csv_row(doc))
+
+            self._json = open(self.tmp_paths[0], 'w', encoding='utf-8')
+            self._json.write('{\n  "document_metadata": ')
+            self._json.write(self._indent(doc.model_dump_json(indent=2)))
+            self._json.write(',\n  "chunk_metadata": [')
+
+            self._chunks_file = open(self.tmp_paths[2], 'w', encoding='utf-8-sig', newline='')
+            self._chunks_csv = csv.writer(self._chunks_file)
+            self._chunks_csv.writerow(CHUNK_CSV_COLUMNS)
+
+    @staticmethod
+    def _indent(text: str, prefix: str = '  ') -> str:
+        return text.replace('\n', '\n' + prefix)
+
+    def write_chunk(self, chunk: ChunkMetadata) -> None:
+        if self._spool:
+            self._spool.write(chunk.model_dump_json() + '\n')
+        if self._json:
+            separator = ',' if self.count else ''
+            self._json.write(separator + '\n    ' + self._indent(chunk.model_dump_json(indent=2), '    '))
+            self._chunks_csv.writerow(_chunk_csv_row(chunk))
+            self._chunks_file.flush()
+        self.count += 1
+
+    def _close(self) -> None:
+        for f in (self._json, self._chunks_file, self._spool):
+            if f:
+                f.close()
+
+    def _spooled_chunks(self) -> Iterator[dict]:
+        self._spool.seek(0)
+        for line in self._spool:
+            yield json.loads(line)
+
+    def commit(self) -> None:
+        if self._spool:
+            output_dataset.append(self.doc.model_dump(mode='json'), self._spooled_chunks())
+        if self._json:
+            self._json.write('\n  ]\n}' if self.count else ']\n}')
+        self._close()
+        for tmp_path, path in zip(self.tmp_paths, self.paths):
+            os.replace(tmp_path, path)
+            logger.info(f"✅ Đã lưu: {path}")
+
+    def abort(self) -> None:
+        self._close()
+        for tmp_path in self.tmp_paths:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def _generation_config(schema, model: str, use_cache: bool = True):
+    """
+    Cấu hình sinh cho một lần gọi. Nếu context cache khả dụng, phần hướng dẫn tĩnh
+    được lấy từ cache (của đúng model) thay vì gửi lại trong mỗi request.
+    """
+    from google.genai import types
+
+    cache_name = prompt_cache.get_name(get_client(), model) if use_cache and USE_CONTEXT_CACHE else None
+    config = types.GenerateContentConfig(
+        response_mime_type='application/json',
+        response_schema=schema,
+        temperature=EXTRACTION_TEMPERATURE,
+        cached_content=cache_name,
+    )
+    return config, cache_name
+
+
+def _contents(file_prompt: str, document_part, cache_name: Optional[str]) -> list:
+    prompt = file_prompt if cache_name else ANALYSIS_INSTRUCTIONS + file_prompt
+    return [prompt, document_part]
+
+
+def _document_part(file_path: str, document_text: Optional[str]):
+    """
+    Nội dung tài liệu gửi cho model: lớp text gắn số trang (nếu có) hoặc file PDF đã tải lên.
+    """
+    if document_text is not None:
+        return ("Nội dung văn bản của file PDF (trích từ lớp text, mỗi trang bắt đầu bằng "
+                "'=== TRANG n ===', n là PAGE_NUMBER):\n\n" + document_text)
+    return upload_registry.get_or_upload(get_client(), file_path)
+
+
+def _generate_json(file_path: str, file_prompt: str, schema, usage: Optional[dict] = None,
+                   document_text: Optional[str] = None, model: str = EXTRACTION_MODEL) -> str:
+    """
+    Lấy file đã tải lên (hoặc tải lên nếu chưa có), gọi model với response_schema
+    và trả về JSON thô. File trên server được giữ lại trong registry để các lần
+    thử lại / prompt khác dùng lại; xóa bằng cleanup_run() khi kết thúc lần chạy.
+    Nếu có document_text (lớp text của PDF), text được gửi thay cho file, không cần upload.
+    Số token (có/không qua cache) được cộng dồn vào `usage` nếu truyền vào.
+    """
+    uploaded_file = _document_part(file_path, document_text)
+    config, cache_name = _generation_config(schema, model)
+    
+    logger.info(f"Bắt đầu phân tích tài liệu với {model} (có thể mất vài giây)...")
+    
+    def _call(config, cache_name):
+        # Gửi yêu cầu phân tích với model đã được định tuyến
+        with metrics.timed('gemini.generate_content', model=model,
+                           route='upload' if document_text is None else 'text'):
+            return get_client().models.generate_content(
+                model=model,
+                contents=_contents(file_prompt, uploaded_file, cache_name),
+                config=config,
+            )
+
+    try:
+        response = _call(config, cache_name)
+    except Exception as e:
+        if not cache_name or not is_cache_error(e):
+            raise
+        # Cache đã hết hạn / bị xóa trên server: bỏ nó và thử lại một lần với prompt đầy đủ
+        prompt_cache.invalidate(model, cache_name)
+        response = _call(*_generation_config(schema, model, use_cache=False))
+    metrics.record_tokens('gemini.generate_content', model, response.usage_metadata)
+    if usage is not None:
+        record_usage(usage, response.usage_metadata, _usage_lock)
+    return response.text
+
+
+def _stream_json(file_path: str, file_prompt: str, schema, usage: Optional[dict] = None,
+                 document_text: Optional[str] = None, model: str = EXTRACTION_MODEL) -> Iterator[str]:
+    """
+    Giống _generate_json nhưng dùng generate_content_stream và trả về từng phần text
+    ngay khi model sinh ra.
+    """
+    uploaded_file = _document_part(file_path, document_text)
+    config, cache_name = _generation_config(schema, model)
+    
+    logger.info(f"Bắt đầu phân tích tài liệu với {model} (streaming)...")
+    last_usage = None
+    started = False
+    # Thời gian đo gồm cả thời gian bên gọi xử lý từng phần của luồng
+    with metrics.timed('gemini.generate_content_stream', model=model,
+                       route='upload' if document_text is None else 'text'):
+        while True:
+            try:
+                for part in get_client().models.generate_content_stream(
+                    model=model,
+                    contents=_contents(file_prompt, uploaded_file, cache_name),
+                    config=config,
+                ):
+                    # usage_metadata đầy đủ nằm ở phần cuối cùng của luồng
+                    last_usage = part.usage_metadata or last_usage
+                    if part.text:
+                        started = True
+                        yield part.text
+                break
+            except Exception as e:
+                if started or not cache_name or not is_cache_error(e):
+                    raise
+                # Cache đã hết hạn / bị xóa trên server: thử lại một lần với prompt đầy đủ
+                prompt_cache.invalidate(model, cache_name)
+                config, cache_name = _generation_config(schema, model, use_cache=False)
+    metrics.record_tokens('gemini.generate_content_stream', model, last_usage)
+    if usage is not None:
+        record_usage(usage, last_usage, _usage_lock)
+
+
+def _log_usage(file_name: str, usage: dict) -> None:
+    if not usage:
+        return
+    total = usage.get('input_tokens', 0)
+    cached = usage.get('cached_input_tokens', 0)
+    ratio = cached / total * 100 if total else 0
+    logger.info(f"📊 Token {file_name}: đầu vào {total} (cache {cached} = {ratio:.0f}%, "
+                 f"không cache {usage.get('uncached_input_tokens', 0)}), đầu ra {usage.get('output_tokens', 0)}")
+
+
+def cleanup_run(release_uploads: bool = False) -> None:
+    """
+    Dọn tài nguyên trên server khi kết thúc một lần chạy: context cache của prompt và
+    các entry upload đã hết hạn. File còn hạn được giữ lại để lần chạy sau (hoặc tiến
+    trình khác) dùng lại; release_uploads=True xóa các file do tiến trình này tải lên.
+    Manifest của dataset đầu ra được gộp lại (xem DocumentDataset.close).
+    """
+    if _writes_dataset():
+        output_dataset.close()
+    if _client is None:
+        # Chưa gọi API lần nào trong tiến trình này: không có gì để dọn
+        return
+    prompt_cache.delete(_client)
+    upload_registry.gc(_client, release_own=release_uploads)
+
+
+def _validate(schema, raw_text: str):
+    """
+    Xác thực JSON trả về bằng schema Pydantic, in phản hồi thô nếu lỗi để gỡ lỗi.
+    """
+    try:
+        with metrics.timed('validate', schema=schema.__name__):
+            return schema.model_validate_json(raw_text)
+    except (ValidationError, json.JSONDecodeError):
+        logger.error(f"Phản hồi thô từ model: {raw_text}")
+        raise
+
+
+# Mức độ "xấu" của kết quả, dùng để gộp kết quả của nhiều cửa sổ trang
+OUTCOME_RANK = {'ok': 0, 'salvaged': 1, 'continued': 2}
+
+
+def _collect_valid_chunks(candidates: list, chunks: list, seen: set) -> int:
+    """Thêm các chunk hợp lệ, chưa có vào `chunks`; trả về số chunk được thêm."""
+    added = 0
+    for candidate in candidates:
+        try:
+            chunk = ChunkMetadata.model_validate(candidate)
+        except ValidationError as e:
+            logger.warning(f"Bỏ qua chunk không hợp lệ: {e.errors()[0].get('msg')}")
+            continue
+        fingerprint = chunk_fingerprint(candidate)
+        if fingerprint in seen:
+            continue
+        seen.add(fingerprint)
+        chunks.append(chunk)
+        added += 1
+    return added
+
+
+def _salvage(file_path: str, file_prompt: str, schema, raw_text: str, usage: Optional[dict],
+             document_text: Optional[str] = None, model: str = EXTRACTION_MODEL):
+    """
+    Giữ lại mọi chunk hợp lệ từ phản hồi lỗi. Nếu mảng chunk bị cắt ngang, chỉ yêu cầu
+    model trích xuất tiếp phần còn thiếu (tối đa MAX_CONTINUATIONS lần), không chạy lại toàn bộ.
+    Trả về (dữ liệu, 'salvaged' | 'continued') hoặc None nếu không cứu được.
+    """
+    result = salvage_json(raw_text)
+
+    metadata = None
+    if schema is DocumentData:
+        if result.document_metadata is None:
+            return None
+        try:
+            metadata = DocumentMetadata.model_validate(result.document_metadata)
+        except ValidationError:
+            return None
+
+    chunks, seen = [], set()
+    _collect_valid_chunks(result.chunks, chunks, seen)
+    outcome = 'salvaged'
+    complete = result.complete
+
+    attempts = 0
+    while not complete and chunks and attempts < MAX_CONTINUATIONS:
+        attempts += 1
+        logger.info(f"Phản hồi bị cắt ngang sau {len(chunks)} chunks - yêu cầu phần tiếp theo (lần {attempts})...")
+        prompt = get_continuation_prompt(file_prompt, chunks[-1].model_dump())
+        continuation = salvage_json(_generate_json(file_path, prompt, ChunkData, usage, document_text, model))
+        added = _collect_valid_chunks(continuation.chunks, chunks, seen)
+        outcome = 'continued'
+        complete = continuation.complete
+        if not added:
+            break
+
+    if not chunks:
+        return None
+    if not complete:
+        logger.warning(f"Vẫn thiếu phần cuối tài liệu sau {attempts} lần yêu cầu tiếp, giữ {len(chunks)} chunks đã có.")
+
+    if schema is DocumentData:
+        return DocumentData(document_metadata=metadata, chunk_metadata=chunks), outcome
+    return ChunkData(chunk_metadata=chunks), outcome
+
+
+def _extract(file_path: str, file_prompt: str, schema, usage: Optional[dict] = None,
+             document_text: Optional[str] = None, model: str = EXTRACTION_MODEL):
+    """
+    Gọi model và xác thực kết quả; nếu JSON lỗi/bị cắt ngang thì thử cứu dữ liệu.
+    Trả về (dữ liệu, outcome) với outcome là 'ok', 'salvaged' hoặc 'continued'.
+    """
+    raw_text = _generate_json(file_path, file_prompt, schema, usage, document_text, model)
+    
+    logger.info("Phân tích hoàn tất. Đang xác thực (validate) schema Pydantic...")
+    
+    try:
+        # Đây là bước quan trọng nhất để đảm bảo "chuẩn chỉ"
+        return _validate(schema, raw_text), 'ok'
+    except (ValidationError, json.JSONDecodeError) as e:
+        logger.warning(f"Phản hồi không hợp lệ ({e.__class__.__name__}), đang thử cứu dữ liệu...")
+        salvaged = _salvage(file_path, file_prompt, schema, raw_text, usage, document_text, model)
+        if salvaged is None:
+            raise
+        return salvaged
+
+
+def _extract_sharded(file_path: str, file_name: str, windows, max_workers: int,
+                     usage: Optional[dict] = None, text_source: Optional[PreflightResult] = None,
+                     model: str = EXTRACTION_MODEL):
+    """
+    Trích xuất song song từng cửa sổ trang rồi gộp chunk_metadata.
+    document_metadata chỉ được trích xuất một lần, ở cửa sổ đầu tiên.
+    Nếu có text_source, mỗi cửa sổ gửi lớp text của các trang tương ứng thay vì file PDF con.
+    Trả về (dữ liệu, outcome xấu nhất trong các cửa sổ).
+    """
+    def extract_window(index: int, shard_path: str):
+        first, last = windows[index]
+        with_metadata = index == 0
+        prompt = get_window_prompt(file_name, first, last, with_metadata)
+        schema = DocumentData if with_metadata else ChunkData
+        document_text = text_source.page_tagged_text(first, last) if text_source else None
+        result, outcome = _extract(shard_path, prompt, schema, usage, document_text, model)
+        logger.info(f"Cửa sổ trang {first}-{last}: {len(result.chunk_metadata)} chunks ({outcome}).")
+        return result, outcome
+
+    with tempfile.TemporaryDirectory(prefix='pdf_shards_') as tmp_dir:
+        shard_paths = [file_path] * len(windows) if text_source else split_pdf(file_path, windows, tmp_dir)
+        with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='shard') as pool:
+            window_results = list(pool.map(extract_window, range(len(windows)), shard_paths))
+
+    results = [result for result, _ in window_results]
+    outcome = max((outcome for _, outcome in window_results), key=OUTCOME_RANK.get)
+    shards = [
+        (window, [chunk.model_dump() for chunk in result.chunk_metadata])
+        for window, result in zip(windows, results)
+    ]
+    data = DocumentData(
+        document_metadata=results[0].document_metadata,
+        chunk_metadata=[ChunkMetadata.model_validate(c) for c in merge_chunks(shards)],
+    )
+    return data, outcome
+
+
+def _log_route(file_name: str, preflight: Optional[PreflightResult],
+               text_source: Optional[PreflightResult], usage: dict) -> None:
+    """Ghi lại đường xử lý đã chọn (text/upload) và số token ước tính tiết kiệm được."""
+    usage['route'] = 'text' if text_source else 'upload'
+    if preflight is None:
+        logger.info(f"🛣️ {file_name}: route=upload (không kiểm tra được lớp text)")
+        return
+
+    usage['text_coverage'] = round(preflight.coverage, 3)
+    if text_source:
+        pdf_tokens = preflight.estimated_pdf_tokens()
+        text_tokens = estimate_text_tokens(preflight.page_tagged_text())
+        usage['estimated_pdf_tokens'] = pdf_tokens
+        usage['estimated_text_tokens'] = text_tokens
+        usage['estimated_token_delta'] = pdf_tokens - text_tokens
+        logger.info(f"🛣️ {file_name}: route=text ({preflight.text_pages}/{preflight.page_count} trang có text) - "
+                     f"~{text_tokens} token text thay cho ~{pdf_tokens} token PDF "
+                     f"(chênh lệch ~{pdf_tokens - text_tokens}), không cần upload")
+    else:
+        logger.info(f"🛣️ {file_name}: route=upload (lớp text chỉ phủ {preflight.coverage:.0%} số trang)")
+
+
+def _run_extraction(file_path: str, file_name: str, windows, usage: dict,
+                    text_source: Optional[PreflightResult], model: str = EXTRACTION_MODEL):
+    """Trích xuất toàn bộ tài liệu (hoặc theo cửa sổ trang) qua đường text hoặc upload."""
+    if windows:
+        return _extract_sharded(file_path, file_name, windows, SHARD_WORKERS, usage, text_source, model)
+
+    logger.info("Đang tạo prompt...")
+    prompt = get_file_prompt(file_name)
+    document_text = text_source.page_tagged_text() if text_source else None
+    return _extract(file_path, prompt, DocumentData, usage, document_text, model)
+
+
+def _extract_with_fallback(file_path: str, file_name: str, windows, usage: dict,
+                           text_source: Optional[PreflightResult], model: str):
+    """Trích xuất bằng một model; nếu đường text thất bại thì thử lại bằng cách tải file PDF lên."""
+    try:
+        return _run_extraction(file_path, file_name, windows, usage, text_source, model)
+    except Exception as e:
+        if text_source is None:
+            raise
+        logger.warning(f"Trích xuất từ lớp text thất bại ({e}), chuyển sang tải file PDF lên...")
+        usage['route'] = 'upload'
+        return _run_extraction(file_path, file_name, windows, usage, None, model)
+
+
+_TOKEN_KEYS = ('input_tokens', 'cached_input_tokens', 'uncached_input_tokens', 'output_tokens')
+
+
+def _extract_routed(file_path: str, file_name: str, windows, usage: dict,
+                    text_source: Optional[PreflightResult], tier: ModelTier,
+                    extract: Optional[Callable[[str], Any]] = None):
+    """
+    Trích xuất với tier đã chọn; nếu kết quả không qua được validate thì nâng lên
+    tier mạnh hơn kế tiếp. Độ trễ, token và chi phí của mỗi lần thử được ghi theo tier.
+
+    `extract(model)` thay cho _extract_with_fallback khi bên gọi dùng prompt/schema riêng
+    (vd. scripts/batch_process.py); hàm này phải cộng token vào `usage` bằng record_usage.
+    """
+    if extract is None:
+        def extract(model):
+            return _extract_with_fallback(file_path, file_name, windows, usage, text_source, model)
+
+    escalations = 0
+    while True:
+        before = {key: usage.get(key, 0) for key in _TOKEN_KEYS}
+        started = time.perf_counter()
+        error = None
+        try:
+            result = extract(tier.model)
+        except (ValidationError, json.JSONDecodeError) as e:
+            error = e
+        ok = error is None
+        spent = {key: usage.get(key, 0) - before[key] for key in _TOKEN_KEYS}
+        cost = model_router.record(tier, time.perf_counter() - started, spent, ok)
+        metrics.inc('cost_usd_total', cost, model=tier.model)
+        usage['cost_usd'] = round(usage.get('cost_usd', 0.0) + cost, 6)
+        usage['tier'], usage['model'], usage['escalations'] = tier.name, tier.model, escalations
+        if ok:
+            return result
+
+        next_tier = model_router.escalate(tier)
+        if next_tier is None:
+            raise error
+        logger.warning(f"⬆️ {file_name}: {tier.model} trả về kết quả không hợp lệ, nâng lên {next_tier.model}...")
+        tier = next_tier
+        escalations += 1
+
+
+def _page_count(file_path: str, preflight: Optional[PreflightResult]) -> int:
+    """Số trang của PDF (lấy từ preflight nếu có); 0 nếu pypdf không đọc được file."""
+    if preflight:
+        return preflight.page_count
+    try:
+        return count_pages(file_path)
+    except Exception as e:
+        logger.warning(f"Không đếm được số trang của {os.path.basename(file_path)}: {e}")
+        return 0
+
+
+def prepare_document(file_path: str) -> Optional[PreflightResult]:
+    """
+    Bước chuẩn bị của process_document, tách riêng để chạy song song với bước sinh
+    (xem src/pipeline.py): kiểm tra lớp text và tải file lên trước nếu tài liệu sẽ đi
+    đường upload nguyên file. Trả về kết quả preflight để truyền cho process_document.
+    """
+    preflight = preflight_pdf(file_path) if TEXT_FAST_PATH else None
+    if preflight and preflight.has_text_layer:
+        return preflight
+
+    # PDF dài được chia cửa sổ thì tải lên từng file con, không cần tải file gốc
+    if PAGE_WINDOW > 0 and _page_count(file_path, preflight) > PAGE_WINDOW:
+        return preflight
+    upload_registry.get_or_upload(get_client(), file_path)
+    return preflight
+
+
+def has_cached_extraction(file_path: str) -> bool:
+    """True nếu process_document sẽ lấy kết quả của file này từ cache (không cần upload)."""
+    cache_key = make_cache_key(file_sha256(file_path), get_extraction_config_hash())
+    return extraction_cache.get(cache_key) is not None
+
+
+def save_cached_extraction(file_path: str, report: Optional[dict] = None) -> Optional[DocumentData]:
+    """
+    Chỉ chạy bước 'save' (xem stage_config_hashes): ghi lại đầu ra từ kết quả trong cache
+    trích xuất, không gọi model. Trả về None nếu file chưa có kết quả trong cache.
+    """
+    usage = report if report is not None else {}
+    usage['stage'] = 'save'
+    cache_key = make_cache_key(file_sha256(file_path), get_extraction_config_hash())
+    data = _serve_cached(cache_key, os.path.basename(file_path), usage)
+    if data is None:
+        usage.pop('stage')
+    return data
+
+
+def _serve_cached(cache_key: str, file_name: str, usage: dict) -> Optional[DocumentData]:
+    """Lấy kết quả từ cache trích xuất và ghi đầu ra; None nếu không có entry hợp lệ."""
+    entry = extraction_cache.get(cache_key)
+    if entry is None:
+        return None
+    try:
+        data = DocumentData.model_validate(entry['data'])
+    except (ValidationError, KeyError) as e:
+        logger.warning(f"Entry cache {cache_key} không hợp lệ, trích xuất lại. Lỗi: {e}")
+        return None
+    # File có thể đã được đổi tên: luôn dùng tên hiện tại
+    data.document_metadata.FILE_NAME = file_name
+    logger.info(f"♻️ Cache hit ({cache_key}) - bỏ qua upload cho {file_name}")
+    usage['outcome'] = 'cached'
+    metrics.inc('documents_total', outcome='cached')
+    started = time.perf_counter()
+    save_outputs(data, file_name)
+    usage.setdefault('timings', {})['save'] = round(time.perf_counter() - started, 3)
+    metrics.observe('stage_seconds', time.perf_counter() - started, stage='save')
+    return data
+
+
+def process_document(file_path: str, use_cache: bool = True,
+                     page_window: Optional[int] = None,
+                     page_overlap: Optional[int] = None,
+                     report: Optional[dict] = None,
+                     preflight: Optional[PreflightResult] = None) -> Optional[DocumentData]:
+    """
+    Thực hiện toàn bộ quy trình: Tải file, phân tích, xác thực và trả về dữ liệu.
+    Nếu use_cache=True, kết quả của cùng nội dung PDF + cùng cấu hình được lấy từ cache
+    mà không cần tải file lên.
+    Nếu page_window > 0 và PDF dài hơn page_window trang, file được chia thành các cửa sổ
+    trang (chồng lấn page_overlap trang) và trích xuất song song.
+    Nếu PDF có lớp text tốt (TEXT_FAST_PATH), text gắn số trang được gửi thay cho file
+    (không upload); PDF scan/ít text dùng đường upload như cũ. `preflight` nhận kết quả
+    đã có từ prepare_document để không phải đọc lại PDF.
+    Model được chọn theo bảng định tuyến (model_router) và tự động nâng tier khi
+    kết quả không qua được validate.
+    Nếu truyền `report` (dict), số token đầu vào/đầu ra (có/không qua cache), đường xử lý
+    `route` ('text' | 'upload'), `tier`/`model`/`escalations`/`cost_usd` và kết quả
+    `outcome` ('ok' | 'salvaged' | 'continued' | 'failed' | 'cached') được ghi vào đó.
+    JSON bị cắt ngang/hỏng không bị bỏ đi: các chunk hợp lệ được giữ lại và chỉ phần
+    còn thiếu được yêu cầu lại.
+    """
+    if not os.path.exists(file_path):
+        logger.error(f"Lỗi: File không tồn tại tại đường dẫn: {file_path}")
+        return None
+
+    file_name = os.path.basename(file_path)
+    page_window = PAGE_WINDOW if page_window is None else page_window
+    page_overlap = PAGE_OVERLAP if page_overlap is None else page_overlap
+    usage = report if report is not None else {}
+
+    # Tra cache theo SHA-256 nội dung PDF + hash cấu hình
+    cache_key = pdf_sha256 = None
+    if use_cache:
+        pdf_sha256 = file_sha256(file_path)
+        cache_key = make_cache_key(pdf_sha256, get_extraction_config_hash())
+        data = _serve_cached(cache_key, file_name, usage)
+        if data is not None:
+            return data
+
+    # Thời gian từng bước và bước cuối cùng đã bắt đầu (để ghi lại khi lỗi)
+    timings = usage.setdefault('timings', {})
+    step_started = time.perf_counter()
+
+    def step(name: str) -> None:
+        nonlocal step_started
+        previous = usage.get('stage')
+        if previous:
+            elapsed = time.perf_counter() - step_started
+            timings[previous] = round(elapsed, 3)
+            metrics.observe('stage_seconds', elapsed, stage=previous)
+        usage['stage'] = name
+        step_started = time.perf_counter()
+
+    try:
+        # Preflight offline: PDF có lớp text tốt thì gửi text thay cho file
+        step('preflight')
+        if preflight is None and TEXT_FAST_PATH:
+            preflight = preflight_pdf(file_path)
+        text_source = preflight if preflight and preflight.has_text_layer else None
+        _log_route(file_name, preflight, text_source, usage)
+
+        # pypdf không đọc được file (0 trang): không chia cửa sổ, vẫn định tuyến và đi đường upload
+        page_count = _page_count(file_path, preflight)
+        windows = None
+        if page_window and page_window > 0 and page_count > page_window:
+            windows = plan_windows(page_count, page_window, page_overlap)
+            logger.info(f"PDF có {page_count} trang → chia thành {len(windows)} cửa sổ {page_window} trang.")
+
+        # Chọn tier model theo số trang, mật độ text/bảng và loại văn bản
+        features = extract_features(file_name, preflight, page_count=page_count)
+        tier = model_router.route(features)
+        logger.info(f"🧭 {file_name}: tier {tier.name} ({tier.model}) - {features.page_count} trang, "
+                     f"{features.chars_per_page:.0f} ký tự/trang, mật độ bảng {features.table_density:.2f}, "
+                     f"loại {features.doc_type or '?'}")
+        
+        # Kết quả của đúng model này sinh ngoài bộ định tuyến (batch job)
+        if use_cache:
+            data = _serve_cached(make_cache_key(pdf_sha256, get_extraction_config_hash(tier.model)),
+                                 file_name, usage)
+            if data is not None:
+                return data
+
+        step('extract')
+        data, outcome = _extract_routed(file_path, file_name, windows, usage, text_source, tier)
+        
+        usage['outcome'] = outcome
+        logger.info(f"Trích xuất thành công {len(data.chunk_metadata)} chunks ({outcome}).")
+        _log_usage(file_name, usage)
+        
+        step('save')
+        save_outputs(data, file_name)
+        
+        # Chỉ cache kết quả trọn vẹn; kết quả đã cứu sẽ được thử lại ở lần chạy sau
+        if cache_key and outcome == 'ok':
+            extraction_cache.put(
+                cache_key, data.model_dump(mode='json'),
+                file_name=file_name, model=usage.get('model', EXTRACTION_MODEL)
+            )
+        step('done')
+        metrics.inc('documents_total', outcome=outcome)
+        
+        return data
+
+    # Xử lý các lỗi có thể xảy ra
+    except (ValidationError, json.JSONDecodeError) as e:
+        logger.error(f"!!! Lỗi VALIDATE/JSON: Model đã trả về JSON không hợp lệ hoặc không khớp schema.")
+        logger.error(f"Chi tiết lỗi: {e}")
+        _record_failure(usage, e)
+        return None
+    except Exception as e:
+        logger.error(f"!!! Đã xảy ra lỗi không xác định: {e}")
+        _record_failure(usage, e)
+        return None
+
+
+def _record_failure(usage: dict, error: Exception) -> None:
+    metrics.inc('documents_total', outcome='failed', stage=usage.get('stage'))
+    usage['outcome'] = 'failed'
+    usage['error_class'] = error.__class__.__name__
+    usage['error'] = str(error)
+
+
+def stream_document(file_path: str, usage: Optional[dict] = None) -> DocumentStream:
+    """
+    Trích xuất ở chế độ streaming: trả về DocumentStream, lặp qua nó để nhận từng
+    ChunkMetadata đã xác thực ngay khi model sinh xong chunk đó.
+    """
+    file_name = os.path.basename(file_path)
+    prompt = get_file_prompt(file_name)
+    preflight = preflight_pdf(file_path) if TEXT_FAST_PATH else None
+    text_source = preflight if preflight and preflight.has_text_layer else None
+    _log_route(file_name, preflight, text_source, usage if usage is not None else {})
+    document_text = text_source.page_tagged_text() if text_source else None
+    # Streaming không nâng tier được giữa chừng (chunk đã được trả ra), chỉ chọn tier ban đầu
+    tier = model_router.route(extract_features(file_name, preflight))
+    if usage is not None:
+        usage['tier'], usage['model'] = tier.name, tier.model
+    return DocumentStream(
+        iter_events(_stream_json(file_path, prompt, DocumentData, usage, document_text, tier.model)),
+        DocumentMetadata.model_validate,
+        ChunkMetadata.model_validate,
+    )
+
+
+def process_document_stream(file_path: str, storage=None, report: Optional[dict] = None) -> Optional[int]:
+    """
+    Giống process_document nhưng ghi JSON/CSV (và lưu vào pgvector nếu truyền `storage`,
+    một PgVectorStorage) từng chunk một khi chúng đến, không giữ cả tài liệu trong bộ nhớ.
+    Chế độ này không dùng cache và không chia nhỏ PDF. Trả về số chunk, None nếu lỗi.
+    """
+    if not os.path.exists(file_path):
+        logger.error(f"Lỗi: File không tồn tại tại đường dẫn: {file_path}")
+        return None
+
+    file_name = os.path.basename(file_path)
+    started = time.perf_counter()
+    writer = None
+    usage = report if report is not None else {}
+
+    try:
+        stream = stream_document(file_path, usage)
+        doc = stream.document_metadata
+        if doc is None:
+            raise ValueError("Luồng kết thúc mà không có document_metadata")
+        doc.FILE_NAME = doc.FILE_NAME or file_name
+        logger.info(f"Đã nhận metadata tài liệu sau {time.perf_counter() - started:.1f}s")
+
+        writer = StreamingOutputWriter(file_name, doc)
+
+        def written_chunks():
+            for chunk in stream:
+                writer.write_chunk(chunk)
+                if writer.count == 1:
+                    logger.info(f"⚡ Chunk đầu tiên sau {time.perf_counter() - started:.1f}s")
+                yield chunk
+
+        if storage is not None:
+            saved = storage.save_document_stream(
+                doc.model_dump(mode='json'),
+                (chunk.model_dump(mode='json') for chunk in written_chunks())
+            )
+            if saved < 0:
+                raise RuntimeError("Lưu vào PostgreSQL thất bại")
+        else:
+            for _ in written_chunks():
+                pass
+
+        writer.commit()
+        logger.info(f"Trích xuất (streaming) thành công {writer.count} chunks "
+                     f"trong {time.perf_counter() - started:.1f}s "
+                     f"({stream.invalid_chunks} chunk không hợp lệ bị bỏ qua).")
+        _log_usage(file_name, usage)
+        usage['outcome'] = 'ok'
+        return writer.count
+
+    except Exception as e:
+        if writer is not None:
+            writer.abort()
+        logger.error(f"!!! Lỗi trích xuất streaming {file_name}: {e}")
+        _record_failure(usage, e)
+        return None
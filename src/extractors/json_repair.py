@@ -0,0 +1,51 @@
+"""
+Salvage of truncated or slightly malformed ``DocumentData`` JSON.
+
+Instead of discarding a response that fails validation, every complete
+``chunk_metadata`` element is recovered (the truncated array is effectively
+closed after the last complete chunk) so only the missing tail has to be
+requested again.
+"""
+
+import re
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from src.extractors.streaming import IncrementalJsonParser
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SalvageResult:
+    """Kết quả cứu dữ liệu từ một phản hồi JSON lỗi."""
+    document_metadata: Optional[Dict[str, Any]]
+    chunks: List[Dict[str, Any]] = field(default_factory=list)
+    # False nếu mảng chunk_metadata bị cắt ngang (cần yêu cầu tiếp phần còn thiếu)
+    complete: bool = False
+    broken_objects: int = 0
+
+
+def salvage_json(raw_text: str) -> SalvageResult:
+    """Lấy document_metadata và mọi chunk hoàn chỉnh từ JSON bị cắt ngang/hỏng."""
+    parser = IncrementalJsonParser()
+    metadata = None
+    chunks = []
+    broken = 0
+    for kind, payload in parser.feed(raw_text or ''):
+        if kind == 'document_metadata':
+            metadata = payload
+        elif kind == 'chunk':
+            chunks.append(payload)
+        else:
+            broken += 1
+    result = SalvageResult(metadata, chunks, parser.chunks_closed, broken)
+    logger.info(f"Cứu được {len(chunks)} chunk (mảng chunk {'đầy đủ' if result.complete else 'bị cắt ngang'}, "
+                f"{broken} đối tượng hỏng)")
+    return result
+
+
+def chunk_fingerprint(chunk: Dict[str, Any]) -> str:
+    """Khóa so trùng chunk theo nội dung (bỏ khác biệt khoảng trắng/hoa thường)."""
+    return re.sub(r'\s+', ' ', chunk.get('chunk_text') or '').strip().lower()
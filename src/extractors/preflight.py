@@ -0,0 +1,84 @@
+"""
+Offline preflight of a PDF's text layer.
+
+Born-digital PDFs carry a usable text layer; sending that text (tagged with
+page numbers) instead of the binary file avoids the upload round-trip and
+costs fewer input tokens. Scanned or low-text PDFs fall back to the upload.
+"""
+
+import os
+import logging
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Trang có ít hơn số ký tự này coi như không có lớp text (trang scan, hình ảnh)
+MIN_CHARS_PER_PAGE = int(os.getenv('TEXT_MIN_CHARS_PER_PAGE', '200'))
+# Tỷ lệ trang có text tối thiểu để dùng đường text thay cho upload
+MIN_TEXT_COVERAGE = float(os.getenv('TEXT_MIN_COVERAGE', '0.9'))
+# Gemini tính mỗi trang PDF khoảng 258 token
+PDF_TOKENS_PER_PAGE = 258
+# Ước lượng thô cho tiếng Việt có dấu
+CHARS_PER_TOKEN = 3.0
+
+
+@dataclass
+class PreflightResult:
+    """Thông tin lớp text của một file PDF."""
+    page_count: int
+    page_texts: List[str] = field(default_factory=list)
+
+    @property
+    def text_pages(self) -> int:
+        return sum(1 for text in self.page_texts if len(text.strip()) >= MIN_CHARS_PER_PAGE)
+
+    @property
+    def coverage(self) -> float:
+        return self.text_pages / self.page_count if self.page_count else 0.0
+
+    @property
+    def total_chars(self) -> int:
+        return sum(len(text) for text in self.page_texts)
+
+    @property
+    def has_text_layer(self) -> bool:
+        return self.page_count > 0 and self.coverage >= MIN_TEXT_COVERAGE
+
+    def page_tagged_text(self, first_page: int = 1, last_page: Optional[int] = None) -> str:
+        """
+        Ghép text các trang [first_page, last_page], mỗi trang mở đầu bằng '=== TRANG n ==='.
+        Số trang được đánh lại từ 1 trong phạm vi được chọn.
+        """
+        last_page = last_page or self.page_count
+        parts = []
+        for number, text in enumerate(self.page_texts[first_page - 1:last_page], 1):
+            parts.append(f"=== TRANG {number} ===\n{text.strip()}")
+        return '\n\n'.join(parts)
+
+    def estimated_pdf_tokens(self, first_page: int = 1, last_page: Optional[int] = None) -> int:
+        last_page = last_page or self.page_count
+        return (last_page - first_page + 1) * PDF_TOKENS_PER_PAGE
+
+
+def estimate_text_tokens(text: str) -> int:
+    """Ước lượng số token của một đoạn text."""
+    return int(len(text) / CHARS_PER_TOKEN)
+
+
+def preflight_pdf(file_path: str) -> Optional[PreflightResult]:
+    """Đọc lớp text của từng trang (offline). Trả về None nếu không đọc được file."""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        logger.warning("Chưa cài pypdf, bỏ qua kiểm tra lớp text (pip install pypdf)")
+        return None
+
+    try:
+        reader = PdfReader(file_path)
+        page_texts = [page.extract_text() or '' for page in reader.pages]
+    except Exception as e:
+        logger.warning(f"Không đọc được lớp text của {os.path.basename(file_path)}: {e}")
+        return None
+
+    return PreflightResult(page_count=len(page_texts), page_texts=page_texts)
@@ -0,0 +1,234 @@
+"""
+Prompts for the document analysis.
+
+ANALYSIS_INSTRUCTIONS is identical for every file (and is what goes into the
+context cache); the per-file, continuation and page-window prompts are small
+additions sent with each request.
+"""
+
+
+# Phần hướng dẫn tĩnh, giống hệt nhau cho mọi file (được đưa vào context cache).
+ANALYSIS_INSTRUCTIONS = """
+Bạn là một hệ thống Trích xuất Dữ liệu (Data Extraction System). Nhiệm vụ của bạn là phân tích nội dung văn bản được cung cấp từ file PDF đính kèm (tên file được nêu trong yêu cầu) và trả về MỘT VÀ CHỈ MỘT đối tượng JSON hợp lệ.
+
+## YÊU CẦU NGHIÊM NGẶT:
+
+### 1. ĐỊNH DẠNG ĐẦU RA
+* **CHỈ TRẢ VỀ JSON:** Không được chứa văn bản giải thích, không dùng markdown.
+* **TUÂN THỦ SCHEMA:** JSON phải khớp chính xác với schema Pydantic `DocumentData`.
+
+### 2. CHUNKING (CHIA ĐOẠN)
+* **Bảng biểu:** MỖI DÒNG = MỘT CHUNK
+* **Văn bản:** MỖI ĐIỀU/MỤC/ĐOẠN = MỘT CHUNK  
+* **Thông báo ngắn:** CÓ THỂ LÀ MỘT CHUNK DUY NHẤT
+
+### 3. ĐIỀN DỮ LIỆU - QUY TẮC CHI TIẾT
+
+#### A. METADATA CƠ BẢN
+* `FILE_NAME`: PHẢI là tên file được nêu trong yêu cầu
+* `DOC_TYPE`: Quyết định/Thông báo/Quy chế/Hướng dẫn
+* `MAJOR_TOPIC`: Học vụ/Tài chính/Tuyển sinh/KTX/HĐSV
+* Dùng `null` nếu không tìm thấy (KHÔNG dùng chuỗi "null")
+
+#### B. CHUNK METADATA - CÁC TRƯỜNG QUAN TRỌNG
+
+**B1. SECTION_TITLE** (Tiêu đề mục)
+* Ví dụ: "Điều 1", "Khoản 2", "Phụ lục", "Căn cứ"
+* Lấy CHÍNH XÁC từ văn bản, không thêm bớt
+
+**B2. CHUNK_TOPIC** (Chủ đề ngắn gọn)
+* MỤC ĐÍCH: Xác định điểm khác biệt chính của chunk này so với các chunk khác
+* GIỚI HẠN: 3-7 từ, ngắn gọn, súc tích
+* **QUY TẮC BẮT BUỘC:**
+  1. TUYỆT ĐỐI KHÔNG lặp lại thông tin đã có trong CONTENT_TYPE
+  2. KHÔNG viết lại toàn bộ tên chương trình (đã có ở CONTENT_TYPE)
+  3. TẬP TRUNG vào yếu tố PHÂN BIỆT: khóa học, đối tượng, thời gian, điều kiện
+* **ĐỐI VỚI HỌC PHÍ - CÁCH VIẾT:**
+  - Nếu chunk nói về học phí của một khóa cụ thể → Viết: "Mức học phí Khóa [X]"
+  - Nếu chunk nói về học phần cụ thể → Viết: "Học phí học phần [tên học phần]"
+  - Nếu chunk nói về điều kiện miễn giảm → Viết: "Điều kiện [loại miễn giảm]"
+  - KHÔNG BAO GIỜ viết: "Mức học phí chương trình [tên chương trình]" vì tên chương trình đã ở CONTENT_TYPE
+* **ĐỐI VỚI VĂN BẢN HÀNH CHÍNH:**
+  - Căn cứ pháp lý → Viết: "Căn cứ [tên nghị định/quyết định ngắn gọn]"
+  - Điều khoản → Viết: "[Nội dung chính của điều]"
+  - Thời hạn → Viết: "Thời hạn [hành động]"
+
+**B3. CONTENT_TYPE** (Loại chương trình)
+* MỤC ĐÍCH: Phân loại chương trình đào tạo hoặc loại hình dịch vụ
+* CHỈ áp dụng cho: Văn bản về HỌC PHÍ, CHƯƠNG TRÌNH ĐÀO TẠO
+* CÁCH VIẾT: Ngắn gọn, KHÔNG thêm từ "Chương trình" phía trước
+* CÁC GIÁ TRỊ HỢP LỆ:
+  - "Đại trà" (không viết "Chương trình đại trà")
+  - "Chất lượng cao" (không viết "Chương trình chất lượng cao")
+  - "Hoàn toàn tiếng Anh" (không viết "Chương trình hoàn toàn tiếng Anh")
+  - "Liên kết quốc tế"
+  - "Vừa học vừa làm"
+  - "Thạc sỹ"
+  - "Tiến sỹ"
+* Với văn bản KHÔNG liên quan học phí/đào tạo (thông báo, quy chế, hướng dẫn): Điền `null`
+
+**B4. SPECIFIC_TARGET** (Đối tượng cụ thể)
+* MỤC ĐÍCH: Chỉ rõ đối tượng áp dụng CHI TIẾT hơn CONTENT_TYPE
+* CẤP ĐỘ: Chi tiết hơn một bước so với CONTENT_TYPE
+* CÁCH SỬ DỤNG:
+  - Nếu chunk phân biệt giữa các HỌC PHẦN trong cùng một chương trình → Ghi rõ tên học phần
+    VD: "Học phần tiếng Anh", "Học phần tiếng Việt"
+  - Nếu chunk chỉ áp dụng cho MỘT NGÀNH cụ thể → Ghi tên ngành
+    VD: "Ngành Công nghệ thông tin", "Ngành Kế toán"
+  - Nếu chunk áp dụng cho MỘT HÌNH THỨC cụ thể → Ghi hình thức
+    VD: "Sinh viên chính quy", "Sinh viên tại chức"
+* QUAN HỆ với CONTENT_TYPE:
+  - CONTENT_TYPE: "Hoàn toàn tiếng Anh" → SPECIFIC_TARGET có thể là: "Học phần tiếng Anh" hoặc "Học phần tiếng Việt"
+  - CONTENT_TYPE: "Đại trà" → SPECIFIC_TARGET thường là `null` (trừ khi có phân biệt ngành)
+* Nếu chunk KHÔNG có phân biệt chi tiết → Điền `null`
+
+**B5. APPLICABLE_COHORT** (Khóa áp dụng)
+* MỤC ĐÍCH: Xác định khóa học hoặc đợt áp dụng chính sách
+* **CÚ PHÁP BẮT BUỘC:**
+  - Một khóa duy nhất: "Khóa [năm]" 
+    VD: "Khóa 2024"
+  - Hai hoặc nhiều khóa liệt kê: "Khóa [năm1] và Khóa [năm2]" (dùng "và", KHÔNG dùng dấu ";")
+    VD: "Khóa 2024 và Khóa 2025"
+  - Từ khóa X trở về trước: "Khóa [năm] trở về trước"
+    VD: "Khóa 2023 trở về trước"
+  - Từ khóa X trở về sau: "Khóa [năm] trở về sau"
+    VD: "Khóa 2025 trở về sau"
+  - Tất cả các khóa: "Tất cả khóa"
+  - Đợt tuyển sinh: "Đợt [số] năm [năm]" hoặc "Khóa [mã khóa]"
+    VD: "Đợt 1 năm 2024-2025", "Khóa 25.01"
+* **SAI LẦM CẦN TRÁNH:**
+  - KHÔNG dùng dấu chấm phẩy (;) để ngăn cách khóa
+  - KHÔNG viết tắt: "K2024" → Phải viết đầy đủ: "Khóa 2024"
+  - KHÔNG bỏ chữ "Khóa": "2024" → Phải viết: "Khóa 2024"
+* Nếu chunk KHÔNG đề cập khóa cụ thể → Điền `null`
+
+**B6. VALUE và UNIT** (Giá trị và đơn vị)
+* MỤC ĐÍCH: Lưu trữ giá trị số liệu và đơn vị đo lường
+* **QUY TẮC NGHIÊM NGẶT cho VALUE:**
+  1. CHỈ GHI SỐ THUẦN TÚY, KHÔNG kèm đơn vị, KHÔNG có dấu phân cách
+  2. Với học phí: Ghi số tiền nguyên (VD: 450000, KHÔNG: "450.000" hoặc "450000đ")
+  3. Với điểm: Ghi số điểm (VD: 90, KHÔNG: "90 điểm")
+  4. Với thời gian: Ghi số ngày/tháng (VD: 30, KHÔNG: "30 ngày")
+  5. Cho phép: Số thực (VD: 3.5) hoặc chuỗi đặc biệt (VD: "Miễn phí")
+* **QUY TẮC cho UNIT:**
+  1. CHỈ điền khi có VALUE
+  2. CÁC ĐƠN VỊ HỢP LỆ:
+     - Tiền tệ: "Đ/tín chỉ", "Đ/tháng", "Đ/học kỳ", "Đ/năm"
+     - Điểm: "Điểm"
+     - Thời gian: "Ngày", "Tháng", "Tuần"
+  3. Viết CHÍNH XÁC, phân biệt hoa/thường
+* **LOGIC PHỐI HỢP:**
+  - Nếu VALUE = `null` → UNIT PHẢI = `null`
+  - Nếu VALUE có giá trị → UNIT PHẢI có đơn vị tương ứng
+  - Nếu VALUE = "Miễn phí" → UNIT có thể = `null`
+
+**B7. KEYWORDS** (Từ khóa)
+* MỤC ĐÍCH: Hỗ trợ tìm kiếm và phân loại chunk
+* SỐ LƯỢNG: Từ 3 đến 8 từ khóa
+* NGUYÊN TẮC CHỌN:
+  1. Chọn từ khóa QUAN TRỌNG NHẤT trong chunk
+  2. Ưu tiên: Tên riêng, số liệu, thuật ngữ chuyên môn
+  3. KHÔNG chọn: Từ quá chung chung (VD: "văn bản", "quy định")
+  4. Bao gồm: Số hiệu văn bản, tên chương trình, khóa học, số tiền
+* ĐỊNH DẠNG:
+  - Viết thường toàn bộ
+  - Mỗi từ khóa ngắn gọn (1-4 từ)
+  - Không trùng lặp
+* PHÂN BỐ:
+  - 2-3 từ khóa về CHỦ ĐỀ CHÍNH
+  - 1-2 từ khóa về ĐỐI TƯỢNG/KHÓA
+  - 1-2 từ khóa về GIÁ TRỊ/SỐ LIỆU (nếu có)
+  - 1-2 từ khóa về VĂN BẢN PHÁP LÝ (nếu có)
+
+#### C. chunk_text - TRƯỜNG QUAN TRỌNG NHẤT ⭐
+
+**VAI TRÒ QUYẾT ĐỊNH:** 
+chunk_text là dữ liệu GỐC để tạo vector embedding cho semantic search. Nếu chunk_text kém chất lượng, toàn bộ hệ thống tìm kiếm sẽ SAI.
+
+**NGUYÊN TẮC VÀNG - 3 PHẢI:**
+1. **PHẢI ĐỘC LẬP:** Người đọc chunk_text PHẢI hiểu đầy đủ ý nghĩa MÀ KHÔNG CẦN xem bất kỳ trường metadata nào khác
+2. **PHẢI HOÀN CHỈNH:** Câu văn phải có đầy đủ: CHỦ NGỮ + VỊ NGỮ + BỔ NGỮ + CÁC THÔNG TIN NGỮCẢNH cần thiết
+3. **PHẢI RÕ RÀNG:** Mỗi thông tin quan trọng (chương trình, khóa, giá trị, điều kiện) phải được DIỄN ĐẠT TƯỜNG MINH
+
+**CẤU TRÚC CÂU CHUẨN cho HỌC PHÍ:**
+"Mức thu học phí [theo tín chỉ/theo tháng] cho [loại chương trình] [đối tượng cụ thể nếu có] dành cho [khóa/đợt] là [số tiền bằng chữ] đồng [đơn vị]."
+
+**PHÂN TÍCH CẤU TRÚC:**
+- Phần 1: "Mức thu học phí" → Chủ đề chính
+- Phần 2: "[theo tín chỉ/theo tháng]" → Hình thức tính phí (nếu cần thiết)
+- Phần 3: "cho [loại chương trình]" → VD: "cho chương trình đại trà", "cho chương trình chất lượng cao"
+- Phần 4: "[đối tượng cụ thể]" → VD: "học phần tiếng Anh", "học phần tiếng Việt" (nếu có)
+- Phần 5: "dành cho [khóa]" → VD: "dành cho sinh viên Khóa 2024 và Khóa 2025"
+- Phần 6: "là [số tiền]" → VD: "là 450.000 đồng", "là 1.500.000 đồng"
+- Phần 7: "[đơn vị]" → VD: "mỗi tín chỉ", "mỗi tháng"
+
+**ĐIỀU TUYỆT ĐỐI CẤM:**
+- KHÔNG viết chunk_text chỉ có giá trị đơn lẻ: "450.000đ", "400.000đ/tín chỉ"
+- KHÔNG bỏ qua thông tin về khóa học
+- KHÔNG bỏ qua thông tin về loại chương trình
+- KHÔNG dùng đại từ không rõ nghĩa: "nó", "đó", "này"
+- KHÔNG viết tắt: "SV" → Phải viết: "sinh viên"
+
+**XỬ LÝ CÁC TRƯỜNG HỢP ĐẶC BIỆT:**
+1. Nếu có phân biệt học phần (tiếng Anh/tiếng Việt):
+   → PHẢI ghi rõ: "cho học phần tiếng Anh trong chương trình hoàn toàn tiếng Anh"
+2. Nếu có nhiều khóa:
+   → Liệt kê đầy đủ: "dành cho sinh viên Khóa 2024 và Khóa 2025"
+3. Nếu là văn bản hành chính (Căn cứ, Điều khoản):
+   → Copy NGUYÊN VĂN từ PDF, giữ nguyên dấu chấm phẩy cuối câu
+
+### 4. TẦM QUAN TRỌNG
+* chunk_text là trường QUAN TRỌNG NHẤT
+* Nếu chunk_text ngắn/thiếu ngữ cảnh → Semantic search SẼ SAI
+* Luôn viết câu ĐẦY ĐỦ, RÕ RÀNG, ĐỘC LẬP
+"""
+
+
+def get_file_prompt(file_name: str) -> str:
+    """
+    Phần prompt riêng của từng file (gửi kèm file PDF, ngoài phần hướng dẫn tĩnh).
+    """
+    return f"""
+## TÀI LIỆU CẦN PHÂN TÍCH
+* Tên file PDF: '{file_name}'
+* `FILE_NAME` PHẢI là '{file_name}'
+"""
+
+
+def get_full_analysis_prompt(file_name: str) -> str:
+    """
+    Tạo prompt phân tích chi tiết, tổng quát cho mọi loại tài liệu.
+    """
+    return ANALYSIS_INSTRUCTIONS + get_file_prompt(file_name)
+
+
+def get_continuation_prompt(file_prompt: str, last_chunk: dict) -> str:
+    """
+    Prompt yêu cầu model trích xuất tiếp phần còn thiếu sau chunk cuối cùng đã nhận được.
+    """
+    last_text = (last_chunk.get('chunk_text') or '')[:300]
+    return file_prompt + f"""
+## TIẾP TỤC TRÍCH XUẤT
+* Phản hồi trước đã bị cắt ngang. Các chunk từ đầu tài liệu đến hết chunk dưới đây ĐÃ được trích xuất:
+  - PAGE_NUMBER: {last_chunk.get('PAGE_NUMBER')}
+  - SECTION_TITLE: {last_chunk.get('SECTION_TITLE')}
+  - chunk_text: "{last_text}"
+* CHỈ trả về `chunk_metadata` (schema `ChunkData`) gồm các chunk NẰM SAU chunk trên, đến hết tài liệu.
+* KHÔNG lặp lại các chunk đã trích xuất.
+"""
+
+
+def get_window_prompt(file_name: str, first_page: int, last_page: int, with_metadata: bool) -> str:
+    """
+    Phần prompt riêng cho một cửa sổ trang của PDF đã được chia nhỏ.
+    """
+    if with_metadata:
+        scope = "Trả về `document_metadata` cho TOÀN BỘ văn bản (dựa trên phần đầu này) và `chunk_metadata` của phần này."
+    else:
+        scope = "CHỈ trả về `chunk_metadata` (schema `ChunkData`), KHÔNG trả về `document_metadata`."
+    return get_file_prompt(file_name) + f"""
+## PHẠM VI XỬ LÝ
+* File đính kèm CHỈ là trang {first_page}-{last_page} của tài liệu gốc '{file_name}'.
+* {scope}
+* `PAGE_NUMBER`: đánh số theo trang TRONG FILE ĐÍNH KÈM (trang đầu tiên của file đính kèm = 1).
+"""
@@ -0,0 +1,235 @@
+"""
+Cost- and latency-aware model routing.
+
+Each document is routed to the cheapest model tier whose limits fit its
+preflight features (page count, text density, table density and the
+DOC_TYPE guessed from the file name). When a tier returns output that
+fails validation, the document is escalated to the next, stronger tier.
+
+The routing table can be overridden with a JSON file (MODEL_ROUTING_FILE):
+
+    {"tiers": [
+        {"name": "lite", "model": "gemini-2.5-flash-lite", "max_pages": 4,
+         "max_table_density": 0.1, "requires_text_layer": true,
+         "input_per_mtok": 0.10, "cached_input_per_mtok": 0.025, "output_per_mtok": 0.40},
+        {"name": "flash", "model": "gemini-2.5-flash"}
+    ]}
+
+Tiers are tried in order; a limit left out (or null) is not checked.
+"""
+
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+import unicodedata
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Từ khóa trong tên file (đã bỏ dấu, viết thường) -> DOC_TYPE
+DOC_TYPE_KEYWORDS = [
+    ('thong_bao', 'Thông báo'),
+    ('quyet_dinh', 'Quyết định'),
+    ('quy_che', 'Quy chế'),
+    ('quy_dinh', 'Quy định'),
+    ('huong_dan', 'Hướng dẫn'),
+    ('ke_hoach', 'Kế hoạch'),
+]
+
+_NUMBER = re.compile(r'\d[\d.,]*')
+
+
+@dataclass
+class ModelTier:
+    """Một bậc model trong bảng định tuyến, kèm giới hạn và đơn giá (USD / 1 triệu token)."""
+    name: str
+    model: str
+    max_pages: Optional[int] = None
+    max_chars_per_page: Optional[int] = None
+    max_table_density: Optional[float] = None
+    doc_types: Optional[List[str]] = None
+    requires_text_layer: bool = False
+    input_per_mtok: float = 0.0
+    cached_input_per_mtok: float = 0.0
+    output_per_mtok: float = 0.0
+
+    def accepts(self, features: 'DocumentFeatures') -> bool:
+        if self.requires_text_layer and not features.has_text_layer:
+            return False
+        if self.max_pages is not None and features.page_count > self.max_pages:
+            return False
+        if self.max_chars_per_page is not None and features.chars_per_page > self.max_chars_per_page:
+            return False
+        if self.max_table_density is not None and features.table_density > self.max_table_density:
+            return False
+        # DOC_TYPE không đoán được thì không dùng để loại
+        if self.doc_types and features.doc_type and features.doc_type not in self.doc_types:
+            return False
+        return True
+
+    def cost(self, uncached_input_tokens: int, cached_input_tokens: int, output_tokens: int) -> float:
+        return (uncached_input_tokens * self.input_per_mtok
+                + cached_input_tokens * self.cached_input_per_mtok
+                + output_tokens * self.output_per_mtok) / 1_000_000
+
+
+# Bảng mặc định: rẻ/nhanh trước, mạnh sau. Đơn giá theo bảng giá Gemini API (cập nhật khi giá thay đổi).
+DEFAULT_TIERS = [
+    ModelTier('lite', 'gemini-2.5-flash-lite', max_pages=4, max_table_density=0.1,
+              doc_types=['Thông báo', 'Hướng dẫn', 'Kế hoạch'], requires_text_layer=True,
+              input_per_mtok=0.10, cached_input_per_mtok=0.025, output_per_mtok=0.40),
+    ModelTier('flash', 'gemini-2.5-flash', max_pages=60, max_table_density=0.35,
+              input_per_mtok=0.30, cached_input_per_mtok=0.075, output_per_mtok=2.50),
+    ModelTier('pro', 'gemini-2.5-pro',
+              input_per_mtok=1.25, cached_input_per_mtok=0.31, output_per_mtok=10.00),
+]
+
+
+@dataclass
+class DocumentFeatures:
+    """Đặc trưng của tài liệu dùng để chọn model."""
+    page_count: int = 0
+    chars_per_page: float = 0.0
+    table_density: float = 0.0
+    doc_type: Optional[str] = None
+    has_text_layer: bool = False
+
+
+def guess_doc_type(file_name: str) -> Optional[str]:
+    """Đoán DOC_TYPE từ tên file (vd. 'Quy_dinh_hoc_phi_2025.pdf' -> 'Quy định')."""
+    normalized = unicodedata.normalize('NFKD', file_name.replace('đ', 'd').replace('Đ', 'D'))
+    normalized = ''.join(c for c in normalized if not unicodedata.combining(c)).lower()
+    normalized = re.sub(r'[\s\-.]+', '_', normalized)
+    for keyword, doc_type in DOC_TYPE_KEYWORDS:
+        if keyword in normalized:
+            return doc_type
+    return None
+
+
+def table_density(text: str) -> float:
+    """Tỷ lệ dòng trông giống một hàng của bảng số liệu (có từ 3 con số trở lên)."""
+    lines = [line for line in text.splitlines() if line.strip()]
+    if not lines:
+        return 0.0
+    rows = sum(1 for line in lines if len(_NUMBER.findall(line)) >= 3)
+    return rows / len(lines)
+
+
+def extract_features(file_name: str, preflight=None, page_count: int = 0) -> DocumentFeatures:
+    """
+    Tính đặc trưng từ kết quả preflight (PreflightResult, có thể None với PDF không
+    đọc được lớp text; khi đó chỉ dùng page_count và tên file).
+    """
+    features = DocumentFeatures(page_count=page_count, doc_type=guess_doc_type(file_name))
+    if preflight is not None and preflight.page_count:
+        features.page_count = preflight.page_count
+        features.chars_per_page = preflight.total_chars / preflight.page_count
+        features.table_density = table_density('\n'.join(preflight.page_texts))
+        features.has_text_layer = preflight.has_text_layer
+    return features
+
+
+def load_routing_table(path: Optional[str] = None) -> List[ModelTier]:
+    """Đọc bảng định tuyến từ file JSON; không có file thì dùng DEFAULT_TIERS."""
+    if not path:
+        return [ModelTier(**asdict(tier)) for tier in DEFAULT_TIERS]
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    tiers = [ModelTier(**tier) for tier in config.get('tiers', [])]
+    if not tiers:
+        raise ValueError(f"Bảng định tuyến {path} không có tier nào")
+    return tiers
+
+
+@dataclass
+class TierStats:
+    """Số liệu tích lũy của một tier trong lần chạy."""
+    calls: int = 0
+    failures: int = 0
+    seconds: float = 0.0
+    input_tokens: int = 0
+    cached_input_tokens: int = 0
+    output_tokens: int = 0
+    cost_usd: float = 0.0
+
+
+class ModelRouter:
+    """Chọn tier cho từng tài liệu, nâng tier khi thất bại và thống kê độ trễ/chi phí."""
+
+    def __init__(self, tiers: List[ModelTier]):
+        if not tiers:
+            raise ValueError("ModelRouter cần ít nhất một tier")
+        self.tiers = tiers
+        self._lock = threading.Lock()
+        self._stats: Dict[str, TierStats] = {tier.name: TierStats() for tier in tiers}
+
+    @classmethod
+    def from_env(cls, default_model: str) -> 'ModelRouter':
+        """
+        MODEL_ROUTING=0 tắt định tuyến (chỉ dùng default_model);
+        MODEL_ROUTING_FILE trỏ tới bảng định tuyến JSON tùy chỉnh.
+        """
+        if os.getenv('MODEL_ROUTING', '1') != '1':
+            return cls([ModelTier('default', default_model)])
+        return cls(load_routing_table(os.getenv('MODEL_ROUTING_FILE')))
+
+    def fingerprint(self) -> str:
+        """Hash của bảng định tuyến, dùng trong hash cấu hình của cache trích xuất."""
+        payload = json.dumps([asdict(tier) for tier in self.tiers], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+    def route(self, features: DocumentFeatures) -> ModelTier:
+        """Tier rẻ nhất chấp nhận tài liệu; nếu không có thì tier cuối (mạnh nhất)."""
+        for tier in self.tiers:
+            if tier.accepts(features):
+                return tier
+        return self.tiers[-1]
+
+    def escalate(self, tier: ModelTier) -> Optional[ModelTier]:
+        """Tier kế tiếp mạnh hơn, None nếu đã ở tier cuối."""
+        index = self.tiers.index(tier)
+        return self.tiers[index + 1] if index + 1 < len(self.tiers) else None
+
+    def record(self, tier: ModelTier, seconds: float, usage: Dict[str, int], ok: bool = True) -> float:
+        """Ghi nhận một lần trích xuất bằng tier; `usage` là số token của riêng lần đó. Trả về chi phí."""
+        uncached = usage.get('uncached_input_tokens', 0)
+        cached = usage.get('cached_input_tokens', 0)
+        output = usage.get('output_tokens', 0)
+        cost = tier.cost(uncached, cached, output)
+        with self._lock:
+            stats = self._stats[tier.name]
+            stats.calls += 1
+            stats.failures += 0 if ok else 1
+            stats.seconds += seconds
+            stats.input_tokens += uncached + cached
+            stats.cached_input_tokens += cached
+            stats.output_tokens += output
+            stats.cost_usd += cost
+        return cost
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Thống kê theo tier: số lần gọi, lỗi, độ trễ trung bình, token và chi phí."""
+        with self._lock:
+            result = {}
+            for tier in self.tiers:
+                stats = self._stats[tier.name]
+                if not stats.calls:
+                    continue
+                result[tier.name] = {
+                    'model': tier.model,
+                    **asdict(stats),
+                    'seconds': round(stats.seconds, 2),
+                    'avg_seconds': round(stats.seconds / stats.calls, 2),
+                    'cost_usd': round(stats.cost_usd, 6),
+                }
+            return result
+
+    def log_summary(self) -> None:
+        for name, stats in self.summary().items():
+            logger.info(f"🧭 Tier {name} ({stats['model']}): {stats['calls']} lần gọi, {stats['failures']} lỗi, "
+                        f"TB {stats['avg_seconds']}s, token vào {stats['input_tokens']} / ra {stats['output_tokens']}, "
+                        f"~${stats['cost_usd']:.4f}")
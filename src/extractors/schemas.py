@@ -1,38 +1,50 @@
 """
 Pydantic schemas for document and chunk metadata.
+
+These are also the response schemas sent to Gemini, so any change here
+changes the extraction config hash (and invalidates cached results).
 """
 
+from datetime import date
+from typing import List, Optional, Union
+from uuid import uuid4
+
 from pydantic import BaseModel, Field
-from typing import Optional, List
 
 
 class DocumentMetadata(BaseModel):
-    """Metadata cấp tài liệu."""
-    
-    DOC_ID: str = Field(description="Mã định danh duy nhất của tài liệu")
-    FILE_NAME: str = Field(description="Tên file gốc")
-    DOC_TITLE: str = Field(description="Tiêu đề đầy đủ của tài liệu")
-    DOC_TYPE: str = Field(description="Loại tài liệu: Thông báo, Quy định, Quy chế, ...")
-    ISSUE_NUMBER: Optional[str] = Field(default=None, description="Số hiệu văn bản")
-    ISSUING_AUTHORITY: Optional[str] = Field(default=None, description="Cơ quan ban hành")
-    ISSUING_DEPT: Optional[str] = Field(default=None, description="Phòng ban ban hành")
-    ISSUE_DATE: Optional[str] = Field(default=None, description="Ngày ban hành (YYYY-MM-DD)")
-    EFFECTIVE_DATE: Optional[str] = Field(default=None, description="Ngày hiệu lực")
-    EXPIRATION_DATE: Optional[str] = Field(default=None, description="Ngày hết hiệu lực")
-    MAJOR_TOPIC: str = Field(description="Chủ đề chính")
-
+    """Metadata cho toàn bộ tài liệu."""
+    DOC_ID: str = Field(default_factory=lambda: str(uuid4()), description="Mã định danh duy nhất của file.")
+    FILE_NAME: Optional[str] = Field(default=None, description="Tên file gốc.")
+    DOC_TITLE: Optional[str] = Field(default=None, description="Tiêu đề chính thức của văn bản.")
+    DOC_TYPE: Optional[str] = Field(default=None, description="Loại văn bản (Quyết định, Quy chế, Thông báo...).")
+    ISSUE_NUMBER: Optional[str] = Field(default=None, description="Số hiệu của văn bản.")
+    ISSUING_AUTHORITY: Optional[str] = Field(default=None, description="Cơ quan/Người ban hành (Hiệu trưởng, Hội đồng Trường...).")
+    ISSUING_DEPT: Optional[str] = Field(default=None, description="Phòng ban chịu trách nhiệm (Phòng Đào tạo, P. CT Sinh viên...).")
+    ISSUE_DATE: Optional[date] = Field(default=None, description="Ngày ban hành chính thức (YYYY-MM-DD).")
+    EFFECTIVE_DATE: Optional[str] = Field(default=None, description="Ngày văn bản bắt đầu có hiệu lực (YYYY-MM-DD hoặc 'Kể từ ngày ký').")
+    EXPIRATION_DATE: Optional[date] = Field(default=None, description="Ngày văn bản hết hiệu lực (YYYY-MM-DD).")
+    MAJOR_TOPIC: Optional[str] = Field(default=None, description="Chủ đề chính (Học vụ, Tài chính, Tuyển sinh...).")
 
 class ChunkMetadata(BaseModel):
-    """Metadata cấp đoạn văn."""
-    
-    CHUNK_ID: str = Field(description="Mã định danh duy nhất của chunk")
-    PAGE_NUMBER: int = Field(description="Số trang trong tài liệu")
-    SECTION_TITLE: Optional[str] = Field(default=None, description="Tiêu đề phần/mục")
-    CHUNK_TOPIC: str = Field(description="Chủ đề của đoạn văn này")
-    CONTENT_TYPE: Optional[str] = Field(default=None, description="Loại nội dung: Đại trà, CLCQ, ...")
-    SPECIFIC_TARGET: Optional[str] = Field(default=None, description="Đối tượng cụ thể")
-    APPLICABLE_COHORT: Optional[str] = Field(default=None, description="Khóa áp dụng: Khóa 2024, Khóa 2025, ...")
-    VALUE: Optional[float] = Field(default=None, description="Giá trị số nếu có")
-    UNIT: Optional[str] = Field(default=None, description="Đơn vị của giá trị")
-    KEYWORDS: List[str] = Field(description="Từ khóa cho semantic search")
-    chunk_text: str = Field(description="Nội dung đầy đủ của đoạn văn")
+    """Metadata cho từng đoạn văn bản (chunk) được bóc tách."""
+    CHUNK_ID: str = Field(default_factory=lambda: str(uuid4()), description="Mã định danh duy nhất của chunk.")
+    PAGE_NUMBER: Optional[int] = Field(default=None, description="Số trang chứa chunk này.")
+    SECTION_TITLE: Optional[str] = Field(default=None, description="Tiêu đề của mục/điều/khoản (VD: 'Điều 3', 'Khoản 2', 'Phụ lục', 'Căn cứ').")
+    CHUNK_TOPIC: Optional[str] = Field(default=None, description="Chủ đề ngắn gọn của chunk (VD: 'Mức học phí Khóa 2025', 'Điều kiện miễn giảm', 'Thời hạn nộp hồ sơ'). KHÔNG trùng lặp với CONTENT_TYPE.")
+    CONTENT_TYPE: Optional[str] = Field(default=None, description="Loại chương trình đào tạo (VD: 'Đại trà', 'Chất lượng cao', 'Liên kết quốc tế', 'Vừa học vừa làm'). CHỈ áp dụng cho văn bản về học phí/chương trình đào tạo.")
+    SPECIFIC_TARGET: Optional[str] = Field(default=None, description="Chi tiết cụ thể của đối tượng áp dụng (VD: 'Học phần tiếng Anh', 'Học phần tiếng Việt', 'Ngành CNTT', 'Sinh viên chính quy').")
+    APPLICABLE_COHORT: Optional[str] = Field(default=None, description="Khóa/đợt áp dụng (VD: 'Khóa 2024', 'Khóa 2023 trở về trước', 'Khóa 2024 và Khóa 2025', 'Tất cả khóa', 'Đợt 1 năm 2024-2025').")
+    VALUE: Optional[Union[float, str]] = Field(default=None, description="Giá trị số liệu thuần túy (VD: 450000, 90, 30). Với học phí, chỉ ghi SỐ TIỀN, KHÔNG ghi đơn vị. Với điểm, chỉ ghi SỐ ĐIỂM.")
+    UNIT: Optional[str] = Field(default=None, description="Đơn vị của VALUE (VD: 'Đ/tín chỉ', 'Đ/tháng', 'Điểm', 'Ngày', 'Tháng'). CHỈ điền khi có VALUE.")
+    KEYWORDS: List[str] = Field(default_factory=list, description="Từ 3-8 từ khóa quan trọng (VD: ['học phí', 'khóa 2025', 'chất lượng cao']).")
+    chunk_text: str = Field(description="Nội dung văn bản ĐẦY ĐỦ NGỮ CẢNH của chunk. PHẢI là câu văn hoàn chỉnh, CÓ THỂ đọc hiểu ĐỘC LẬP mà không cần xem các trường khác.")
+
+class DocumentData(BaseModel):
+    """Schema JSON đầu ra tổng thể mà AI phải tuân thủ."""
+    document_metadata: DocumentMetadata
+    chunk_metadata: List[ChunkMetadata]
+
+class ChunkData(BaseModel):
+    """Schema đầu ra cho các cửa sổ trang phía sau (chỉ gồm chunk, không có metadata tài liệu)."""
+    chunk_metadata: List[ChunkMetadata]
@@ -0,0 +1,121 @@
+"""
+Page-window sharding for large PDFs.
+
+A long PDF is split into overlapping page windows that can be extracted
+concurrently; the per-window chunk lists are then merged back into one list
+with absolute page numbers and without the duplicates produced by the overlap.
+"""
+
+import os
+import re
+import logging
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Hai chunk nằm ở vùng trang chồng lấn được coi là trùng nếu text giống nhau từ ngưỡng này
+DUPLICATE_SIMILARITY = 0.9
+
+
+def _load_pdf_reader(file_path: str):
+    try:
+        from pypdf import PdfReader
+    except ImportError as e:
+        raise ImportError("Cần cài đặt pypdf để chia nhỏ PDF: pip install pypdf") from e
+    return PdfReader(file_path)
+
+
+def count_pages(file_path: str) -> int:
+    """Đếm số trang của file PDF."""
+    return len(_load_pdf_reader(file_path).pages)
+
+
+def plan_windows(page_count: int, window: int, overlap: int = 1) -> List[Tuple[int, int]]:
+    """
+    Chia [1, page_count] thành các cửa sổ (first_page, last_page), đánh số từ 1.
+    Các cửa sổ liền kề chồng lấn `overlap` trang để không cắt đôi một điều khoản.
+    """
+    if window <= 0:
+        raise ValueError("window phải lớn hơn 0")
+    overlap = max(0, min(overlap, window - 1))
+
+    windows = []
+    first = 1
+    while first <= page_count:
+        last = min(first + window - 1, page_count)
+        windows.append((first, last))
+        if last == page_count:
+            break
+        first = last - overlap + 1
+    return windows
+
+
+def split_pdf(file_path: str, windows: List[Tuple[int, int]], out_dir: str) -> List[str]:
+    """Ghi mỗi cửa sổ trang thành một file PDF riêng trong out_dir."""
+    from pypdf import PdfWriter
+
+    reader = _load_pdf_reader(file_path)
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    paths = []
+    for first, last in windows:
+        writer = PdfWriter()
+        for page_index in range(first - 1, last):
+            writer.add_page(reader.pages[page_index])
+        shard_path = os.path.join(out_dir, f"{stem}_p{first:04d}-{last:04d}.pdf")
+        with open(shard_path, 'wb') as f:
+            writer.write(f)
+        paths.append(shard_path)
+    return paths
+
+
+def _normalize_text(text: str) -> str:
+    return re.sub(r'\s+', ' ', text or '').strip().lower()
+
+
+def merge_chunks(shards: List[Tuple[Tuple[int, int], List[Dict[str, Any]]]]) -> List[Dict[str, Any]]:
+    """
+    Gộp chunk của các cửa sổ (theo thứ tự trang):
+    - Chuyển PAGE_NUMBER tương đối trong cửa sổ thành số trang tuyệt đối.
+    - Loại chunk trùng (text giống hệt, hoặc gần giống nếu nằm ở trang chồng lấn).
+    """
+    merged: List[Dict[str, Any]] = []
+    seen_texts = set()
+    previous_last_page = 0
+    removed = 0
+
+    for (first, last), chunks in shards:
+        window_size = last - first + 1
+        # Chunk của cửa sổ trước nằm trên các trang chồng lấn với cửa sổ này
+        overlap_candidates = [
+            _normalize_text(c.get('chunk_text'))
+            for c in merged
+            if c.get('PAGE_NUMBER') is not None and c['PAGE_NUMBER'] >= first
+        ]
+
+        for chunk in chunks:
+            page = chunk.get('PAGE_NUMBER')
+            if isinstance(page, int) and 1 <= page <= window_size:
+                chunk['PAGE_NUMBER'] = first + page - 1
+
+            text = _normalize_text(chunk.get('chunk_text'))
+            if text in seen_texts:
+                removed += 1
+                continue
+
+            in_overlap = chunk.get('PAGE_NUMBER') is None or chunk['PAGE_NUMBER'] <= previous_last_page
+            if in_overlap and any(
+                SequenceMatcher(None, text, other).ratio() >= DUPLICATE_SIMILARITY
+                for other in overlap_candidates
+            ):
+                removed += 1
+                continue
+
+            seen_texts.add(text)
+            merged.append(chunk)
+
+        previous_last_page = last
+
+    if removed:
+        logger.info(f"Đã loại {removed} chunk trùng ở ranh giới các cửa sổ trang")
+    return merged
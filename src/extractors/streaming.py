@@ -0,0 +1,165 @@
+"""
+Incremental parsing of a streamed ``DocumentData`` JSON response.
+
+The model output is fed piece by piece into ``IncrementalJsonParser``, which
+emits the ``document_metadata`` object and every element of the
+``chunk_metadata`` array as soon as its closing brace arrives. Only the object
+currently being read is kept in memory.
+"""
+
+import json
+import logging
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Event = Tuple[str, Any]
+
+
+class IncrementalJsonParser:
+    """Parser JSON tăng dần cho đối tượng {"document_metadata": {...}, "chunk_metadata": [{...}, ...]}."""
+
+    def __init__(self, metadata_key: str = 'document_metadata', chunks_key: str = 'chunk_metadata'):
+        self.metadata_key = metadata_key
+        self.chunks_key = chunks_key
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._expect_key = False
+        self._key_chars: Optional[List[str]] = None
+        self._key: Optional[str] = None
+        self._capture: Optional[List[str]] = None
+        self._capture_kind: Optional[str] = None
+        self._capture_level = 0
+        self.chunks_closed = False
+
+    def feed(self, text: str) -> List[Event]:
+        """
+        Nạp thêm text, trả về các sự kiện vừa hoàn chỉnh: ('document_metadata', dict),
+        ('chunk', dict) hoặc ('invalid', text) nếu đối tượng không phải JSON hợp lệ.
+        """
+        events: List[Event] = []
+        for ch in text:
+            if self._capture is not None:
+                self._capture.append(ch)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._key_chars is not None:
+                        self._key = ''.join(self._key_chars)
+                        self._key_chars = None
+                    continue
+                if self._key_chars is not None:
+                    self._key_chars.append(ch)
+                continue
+
+            depth = len(self._stack)
+            if ch == '"':
+                self._in_string = True
+                if depth == 1 and self._expect_key:
+                    self._key_chars = []
+            elif ch in '{[':
+                if self._capture is None and ch == '{' and self._starts_capture(depth):
+                    self._capture = [ch]
+                    self._capture_level = depth
+                    self._capture_kind = 'document_metadata' if depth == 1 else 'chunk'
+                self._stack.append(ch)
+                if depth == 0:
+                    self._expect_key = True
+            elif ch in '}]':
+                if self._stack:
+                    self._stack.pop()
+                if self._capture is not None and len(self._stack) == self._capture_level:
+                    raw = ''.join(self._capture)
+                    try:
+                        events.append((self._capture_kind, json.loads(raw)))
+                    except json.JSONDecodeError:
+                        # Đối tượng hỏng: báo lại để bên gọi đếm/bỏ qua, không dừng cả luồng
+                        events.append(('invalid', raw))
+                    self._capture = None
+                    self._capture_kind = None
+                if ch == ']' and len(self._stack) == 1 and self._key == self.chunks_key:
+                    self.chunks_closed = True
+            elif depth == 1 and ch == ':':
+                self._expect_key = False
+            elif depth == 1 and ch == ',':
+                self._expect_key = True
+        return events
+
+    def _starts_capture(self, depth: int) -> bool:
+        if depth == 1:
+            return self._key == self.metadata_key
+        return depth == 2 and self._stack[-1] == '[' and self._key == self.chunks_key
+
+    @property
+    def pending_text(self) -> str:
+        """Phần text của đối tượng đang đọc dở (chưa đóng)."""
+        return ''.join(self._capture) if self._capture is not None else ''
+
+
+def iter_events(text_pieces: Iterable[str]) -> Iterator[Event]:
+    """Chuyển luồng text (VD: response.text của từng phần stream) thành luồng sự kiện."""
+    parser = IncrementalJsonParser()
+    for piece in text_pieces:
+        if piece:
+            yield from parser.feed(piece)
+
+
+class DocumentStream:
+    """
+    Bọc luồng sự kiện thành đối tượng dễ dùng:
+    - `document_metadata`: metadata tài liệu (đọc luồng cho đến khi có).
+    - Lặp qua đối tượng để nhận từng chunk đã được xác thực.
+    """
+
+    def __init__(self, events: Iterator[Event],
+                 validate_metadata: Callable[[dict], Any],
+                 validate_chunk: Callable[[dict], Any]):
+        self._events = iter(events)
+        self._validate_metadata = validate_metadata
+        self._validate_chunk = validate_chunk
+        self._metadata = None
+        self._pending_chunks: List[dict] = []
+        self.invalid_chunks = 0
+
+    @property
+    def document_metadata(self):
+        """Metadata tài liệu; None nếu luồng kết thúc mà không có."""
+        while self._metadata is None:
+            try:
+                kind, payload = next(self._events)
+            except StopIteration:
+                break
+            if kind == 'document_metadata':
+                self._metadata = self._validate_metadata(payload)
+            elif kind == 'chunk':
+                self._pending_chunks.append(payload)
+            else:
+                self.invalid_chunks += 1
+        return self._metadata
+
+    def __iter__(self):
+        while self._pending_chunks:
+            yield from self._validated(self._pending_chunks.pop(0))
+        for kind, payload in self._events:
+            if kind == 'invalid':
+                self.invalid_chunks += 1
+                logger.warning(f"Bỏ qua đối tượng JSON hỏng trong luồng: {payload[:200]}")
+                continue
+            if kind == 'document_metadata':
+                if self._metadata is None:
+                    self._metadata = self._validate_metadata(payload)
+                continue
+            yield from self._validated(payload)
+
+    def _validated(self, payload: dict):
+        try:
+            yield self._validate_chunk(payload)
+        except Exception as e:
+            self.invalid_chunks += 1
+            logger.warning(f"Bỏ qua chunk không hợp lệ trong luồng: {e}")
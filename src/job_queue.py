@@ -0,0 +1,194 @@
+"""
+Distributed extraction work queue on PostgreSQL (table `jobs` in init.sql).
+
+Several workers, on one or many machines, share a corpus of PDFs:
+
+    enqueue ──▶ jobs (queued) ──lease──▶ worker ──complete──▶ documents / chunks
+
+A worker leases the next queued job with ``SELECT ... FOR UPDATE SKIP
+LOCKED``, so concurrent workers never block on or double-take the same row.
+The lease has a deadline that the worker extends with heartbeats while it
+extracts; a job whose lease expires (the worker crashed or lost its network)
+is put back in the queue by the next worker that polls, until it has used up
+``max_attempts``. Results are written to `documents`/`chunks` in the same
+transaction that marks the job done, and only while the worker still owns
+the lease.
+
+Workers that cannot see the enqueuer's file system read the PDF from the
+optional ``pdf_data`` column instead of ``file_path``.
+"""
+
+import os
+import socket
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from src.extractors.cache import file_sha256
+from src.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', '600'))
+DEFAULT_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+@dataclass
+class Job:
+    """Một job đã được lease cho worker."""
+    job_id: int
+    file_path: str
+    file_name: str
+    sha256: str
+    attempts: int
+    has_data: bool
+
+
+class JobQueue:
+    """Hàng đợi trích xuất dùng chung trên PostgreSQL, kết nối qua PgVectorStorage."""
+
+    def __init__(self, storage, lease_seconds: int = DEFAULT_LEASE_SECONDS):
+        self.storage = storage
+        self.lease_seconds = lease_seconds
+
+    def _execute(self, sql: str, params: tuple = (), fetch: bool = False):
+        with self.storage.connection() as conn, conn, conn.cursor() as cur:
+            cur.execute(sql, params)
+            if fetch:
+                return cur.fetchall()
+            return cur.rowcount
+
+    def enqueue(self, paths: Iterable[str], store_data: bool = False, priority: int = 0,
+                max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> int:
+        """
+        Thêm các PDF vào hàng đợi (bỏ qua nội dung đã có job). store_data=True lưu luôn
+        nội dung PDF vào bảng để worker ở máy khác không cần truy cập file_path.
+        Trả về số job mới.
+        """
+        from psycopg2 import Binary
+
+        added = 0
+        with self.storage.connection() as conn:
+            with conn, conn.cursor() as cur:
+                for path in paths:
+                    path = str(Path(path).resolve())
+                    data = Binary(Path(path).read_bytes()) if store_data else None
+                    cur.execute("""
+                        INSERT INTO jobs (file_path, file_name, sha256, pdf_data, priority, max_attempts)
+                        VALUES (%s, %s, %s, %s, %s, %s)
+                        ON CONFLICT (sha256) DO NOTHING
+                    """, (path, os.path.basename(path), file_sha256(path), data, priority, max_attempts))
+                    added += cur.rowcount
+        logger.info(f"📥 Đã thêm {added} job vào hàng đợi")
+        return added
+
+    def lease(self, worker_id: str) -> Optional[Job]:
+        """Nhận job đang chờ có độ ưu tiên cao nhất; None nếu hàng đợi trống."""
+        rows = self._execute("""
+            UPDATE jobs SET
+                status = 'leased', worker_id = %s, attempts = attempts + 1,
+                leased_until = CURRENT_TIMESTAMP + make_interval(secs => %s),
+                heartbeat_at = CURRENT_TIMESTAMP, started_at = CURRENT_TIMESTAMP, last_error = NULL
+            WHERE job_id = (
+                SELECT job_id FROM jobs
+                WHERE status = 'queued'
+                ORDER BY priority DESC, job_id
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING job_id, file_path, file_name, sha256, attempts, pdf_data IS NOT NULL
+        """, (worker_id, self.lease_seconds), fetch=True)
+        return Job(*rows[0]) if rows else None
+
+    def read_data(self, job: Job) -> bytes:
+        """Nội dung PDF lưu trong bảng (chỉ khi job.has_data)."""
+        rows = self._execute("SELECT pdf_data FROM jobs WHERE job_id = %s", (job.job_id,), fetch=True)
+        return bytes(rows[0][0])
+
+    def heartbeat(self, job: Job, worker_id: str) -> bool:
+        """Gia hạn lease. False nếu worker không còn giữ job (lease đã hết hạn và bị lấy lại)."""
+        return self._execute("""
+            UPDATE jobs SET
+                leased_until = CURRENT_TIMESTAMP + make_interval(secs => %s),
+                heartbeat_at = CURRENT_TIMESTAMP
+            WHERE job_id = %s AND worker_id = %s AND status = 'leased'
+        """, (self.lease_seconds, job.job_id, worker_id)) == 1
+
+    def complete(self, job: Job, worker_id: str, doc_meta: Dict[str, Any], chunks: List[Dict[str, Any]],
+                 embeddings: List[Optional[List[float]]]) -> bool:
+        """
+        Ghi document + chunks vào PostgreSQL và đánh dấu job 'done' trong cùng một
+        transaction. Không ghi gì (trả về False) nếu worker đã mất lease.
+        """
+        with self.storage.connection() as conn:
+            with metrics.timed('db.complete_job'), conn, conn.cursor() as cur:
+                cur.execute(
+                    "SELECT 1 FROM jobs WHERE job_id = %s AND worker_id = %s AND status = 'leased' FOR UPDATE",
+                    (job.job_id, worker_id),
+                )
+                if cur.fetchone() is None:
+                    logger.warning(f"⚠️ Job {job.job_id} ({job.file_name}) không còn thuộc {worker_id}, bỏ kết quả")
+                    return False
+
+                doc_id = doc_meta.get('DOC_ID')
+                self.storage._insert_document(cur, doc_meta)
+                rows = [self.storage._chunk_row(doc_id, chunk, embedding)
+                        for chunk, embedding in zip(chunks, embeddings) if embedding is not None]
+                if len(rows) < len(chunks):
+                    logger.warning(f"Bỏ qua {len(chunks) - len(rows)} chunk không tạo được embedding")
+                if rows:
+                    self.storage._insert_chunks(cur, rows)
+                cur.execute("""
+                    UPDATE jobs SET status = 'done', doc_id = %s, chunks = %s, leased_until = NULL,
+                        finished_at = CURRENT_TIMESTAMP
+                    WHERE job_id = %s
+                """, (doc_id, len(rows), job.job_id))
+        logger.info(f"✅ Job {job.job_id}: đã lưu {doc_id} ({len(rows)} chunks)")
+        return True
+
+    def fail(self, job: Job, worker_id: str, error: str) -> None:
+        """Trả job về hàng đợi, hoặc đánh dấu 'failed' nếu đã hết số lần thử."""
+        self._execute("""
+            UPDATE jobs SET
+                status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+                worker_id = NULL, leased_until = NULL, last_error = %s, finished_at = CURRENT_TIMESTAMP
+            WHERE job_id = %s AND worker_id = %s AND status = 'leased'
+        """, (error[:1000], job.job_id, worker_id))
+
+    def requeue_expired(self) -> int:
+        """Đưa các job có lease hết hạn (worker đã chết) về hàng đợi. Trả về số job."""
+        count = self._execute("""
+            UPDATE jobs SET
+                status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+                last_error = 'lease expired (' || COALESCE(worker_id, '?') || ')',
+                worker_id = NULL, leased_until = NULL
+            WHERE status = 'leased' AND leased_until < CURRENT_TIMESTAMP
+        """)
+        if count:
+            logger.warning(f"♻️ {count} job hết hạn lease được đưa lại vào hàng đợi")
+        return count
+
+    def retry_failed(self) -> int:
+        """Đưa các job 'failed' về hàng đợi với số lần thử về 0. Trả về số job."""
+        return self._execute(
+            "UPDATE jobs SET status = 'queued', attempts = 0, finished_at = NULL WHERE status = 'failed'"
+        )
+
+    def summary(self) -> Dict[str, int]:
+        """Số job theo trạng thái."""
+        rows = self._execute("SELECT status, COUNT(*) FROM jobs GROUP BY status", fetch=True)
+        return {status: count for status, count in rows}
+
+    def workers(self) -> List[Dict[str, Any]]:
+        """Các job đang được lease: worker, file, lần thử, heartbeat gần nhất, hạn lease."""
+        rows = self._execute("""
+            SELECT worker_id, job_id, file_name, attempts, heartbeat_at, leased_until
+            FROM jobs WHERE status = 'leased' ORDER BY worker_id, job_id
+        """, fetch=True)
+        keys = ('worker_id', 'job_id', 'file_name', 'attempts', 'heartbeat_at', 'leased_until')
+        return [dict(zip(keys, row)) for row in rows]
@@ -0,0 +1,283 @@
+"""
+In-process metrics for extraction runs: operation latency histograms and
+token / cost / outcome counters, exported in the Prometheus text format and
+as a JSON summary.
+
+Every Gemini call (upload, context cache, generate, embed), every
+PgVectorStorage database call and every process_document stage is timed
+through ``metrics.timed(op, **labels)``:
+
+    chatbot_operation_seconds{op="gemini.generate_content",model="gemini-2.5-flash",status="ok"}
+    chatbot_tokens_total{op="gemini.generate_content",model="...",kind="input|cached_input|output"}
+    chatbot_stage_seconds{stage="preflight|extract|save"}
+    chatbot_cost_usd_total{model="..."}
+    chatbot_documents_total{outcome="ok|salvaged|continued|cached|failed"}
+
+Export (all optional, configured by environment variables):
+    METRICS_TEXTFILE=/var/lib/node_exporter/chatbot.prom   written by export_run()
+    METRICS_PORT=9108                                       /metrics over HTTP (start_exporters())
+"""
+
+import os
+import json
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'chatbot'
+
+# Giây: từ truy vấn DB (ms) đến một lần sinh dài (phút)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Tên thuộc tính usage_metadata của google-genai -> nhãn kind
+_TOKEN_FIELDS = (
+    ('prompt_token_count', 'input'),
+    ('cached_content_token_count', 'cached_input'),
+    ('candidates_token_count', 'output'),
+    ('thoughts_token_count', 'thoughts'),
+)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+class _Histogram:
+    __slots__ = ('counts', 'count', 'total', 'min', 'max')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+
+    def observe(self, buckets: Tuple[float, ...], value: float) -> None:
+        self.counts[bisect.bisect_left(buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, buckets: Tuple[float, ...], q: float) -> float:
+        """Ước lượng phân vị bằng nội suy tuyến tính trong bucket (như histogram_quantile)."""
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = buckets[index - 1] if index > 0 else 0.0
+                upper = buckets[index] if index < len(buckets) else self.max
+                lower, upper = max(lower, self.min), min(upper, self.max)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.max
+
+
+class MetricsRegistry:
+    """Counter và histogram có nhãn, an toàn khi dùng từ nhiều luồng."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, _Histogram]] = {}
+        self.started = time.time()
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(self.buckets)
+            histogram.observe(self.buckets, value)
+
+    @contextmanager
+    def timed(self, op: str, **labels) -> Iterator[Dict[str, Any]]:
+        """
+        Đo thời gian một thao tác vào operation_seconds{op, status, ...}. Nhãn có thể
+        bổ sung trong khối `with` qua dict được trả về (vd. model sau khi định tuyến).
+        """
+        extra: Dict[str, Any] = {}
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            yield extra
+            status = 'ok'
+        finally:
+            self.observe('operation_seconds', time.perf_counter() - started,
+                         op=op, status=status, **labels, **extra)
+
+    def record_tokens(self, op: str, model: str, usage_metadata) -> None:
+        """Cộng số token trong usage_metadata của một response Gemini."""
+        if usage_metadata is None:
+            return
+        for field, kind in _TOKEN_FIELDS:
+            value = getattr(usage_metadata, field, None)
+            if value:
+                self.inc('tokens_total', value, op=op, model=model, kind=kind)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self.started = time.time()
+
+    def render_prometheus(self) -> str:
+        """Toàn bộ metric ở định dạng text exposition của Prometheus."""
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                full = f'{PREFIX}_{name}'
+                lines.append(f'# TYPE {full} counter')
+                for labels, value in sorted(series.items()):
+                    lines.append(f'{full}{_format_labels(labels)} {value:g}')
+            for name, series in sorted(self._histograms.items()):
+                full = f'{PREFIX}_{name}'
+                lines.append(f'# TYPE {full} histogram')
+                for labels, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(self.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f'{full}_bucket{_format_labels(labels, ("le", f"{bound:g}"))} {cumulative}')
+                    lines.append(f'{full}_bucket{_format_labels(labels, ("le", "+Inf"))} {histogram.count}')
+                    lines.append(f'{full}_sum{_format_labels(labels)} {histogram.total:.6f}')
+                    lines.append(f'{full}_count{_format_labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Tóm tắt cho báo cáo JSON của một lần chạy: theo từng thao tác và nhãn (gộp
+        status) số lần gọi, lỗi, tổng/trung bình/p50/p95/p99 giây; kèm mọi counter.
+        """
+        with self._lock:
+            operations: Dict[str, Dict[str, Any]] = {}
+            for labels, histogram in self._histograms.get('operation_seconds', {}).items():
+                label_map = dict(labels)
+                op = label_map.pop('op')
+                status = label_map.pop('status')
+                series_name = op + ''.join(f' {key}={value}' for key, value in sorted(label_map.items()))
+                entry = operations.setdefault(series_name, {'calls': 0, 'errors': 0, 'seconds': 0.0, '_h': []})
+                entry['calls'] += histogram.count
+                entry['errors'] += histogram.count if status == 'error' else 0
+                entry['seconds'] += histogram.total
+                entry['_h'].append(histogram)
+
+            for entry in operations.values():
+                merged = _Histogram(self.buckets)
+                for histogram in entry.pop('_h'):
+                    merged.counts = [a + b for a, b in zip(merged.counts, histogram.counts)]
+                    merged.count += histogram.count
+                    merged.total += histogram.total
+                    merged.min = min(merged.min, histogram.min)
+                    merged.max = max(merged.max, histogram.max)
+                entry['seconds'] = round(entry['seconds'], 3)
+                entry['avg_seconds'] = round(merged.total / merged.count, 3) if merged.count else None
+                for q in (0.5, 0.95, 0.99):
+                    entry[f'p{int(q * 100)}_seconds'] = round(merged.quantile(self.buckets, q), 3)
+                entry['max_seconds'] = round(merged.max, 3)
+
+            counters = {
+                name: {','.join(f'{k}={v}' for k, v in labels) or 'total': round(value, 6)
+                       for labels, value in sorted(series.items())}
+                for name, series in sorted(self._counters.items())
+            }
+        return {
+            'elapsed_seconds': round(time.time() - self.started, 2),
+            'operations': dict(sorted(operations.items(), key=lambda item: -item[1]['seconds'])),
+            'counters': counters,
+        }
+
+    def write_textfile(self, path: str) -> None:
+        """Ghi file .prom cho textfile collector của node_exporter (ghi nguyên tử)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+        tmp_path.write_text(self.render_prometheus(), encoding='utf-8')
+        os.replace(tmp_path, path)
+
+    def log_summary(self, top: int = 10) -> None:
+        for name, op in list(self.summary()['operations'].items())[:top]:
+            logger.info(f"⏱️ {name}: {op['calls']} lần, {op['errors']} lỗi, tổng {op['seconds']}s, "
+                        f"p50 {op['p50_seconds']}s, p99 {op['p99_seconds']}s")
+
+
+metrics = MetricsRegistry()
+
+_http_server = None
+
+
+def start_http_exporter(port: int, registry: MetricsRegistry = metrics, host: str = '0.0.0.0'):
+    """Phục vụ /metrics qua HTTP trong một luồng nền. Trả về server."""
+    global _http_server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/metrics', '/'):
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    _http_server = server
+    logger.info(f"📈 Metrics Prometheus: http://{host}:{port}/metrics")
+    return server
+
+
+def start_exporters() -> None:
+    """Bật HTTP exporter nếu đặt METRICS_PORT (gọi một lần từ entry point)."""
+    port = os.getenv('METRICS_PORT')
+    if port and _http_server is None:
+        try:
+            start_http_exporter(int(port))
+        except OSError as e:
+            logger.warning(f"Không mở được cổng metrics {port}: {e}")
+
+
+def export_run(summary_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Kết thúc một lần chạy: ghi METRICS_TEXTFILE (nếu đặt) và tóm tắt JSON vào
+    summary_path (nếu truyền). Trả về tóm tắt.
+    """
+    textfile = os.getenv('METRICS_TEXTFILE')
+    if textfile:
+        metrics.write_textfile(textfile)
+        logger.info(f"📈 Metrics Prometheus: {textfile}")
+    summary = metrics.summary()
+    if summary_path:
+        Path(summary_path).parent.mkdir(parents=True, exist_ok=True)
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+    return summary
@@ -0,0 +1,93 @@
+"""
+PostgreSQL binary COPY encoding for the documents/chunks rows.
+
+``COPY ... FROM STDIN WITH (FORMAT binary)`` skips the server-side text
+parsing of every value, which matters most for 768-float embeddings (a
+vector is 3 KB in binary against ~9 KB of text to parse). Supported column
+kinds: 'text', 'int4', 'bool', 'date', 'text[]' and 'vector' (pgvector's
+vector_recv layout: int16 dim, int16 unused, float4 * dim).
+
+    buffer = BinaryCopyWriter(('text', 'int4', 'vector'))
+    buffer.write_row(('a', 1, [0.1, 0.2]))
+    cur.copy_expert("COPY stage FROM STDIN WITH (FORMAT binary)", buffer.getvalue())
+"""
+
+import io
+import struct
+from datetime import date
+from typing import Any, Optional, Sequence
+
+SIGNATURE = b'PGCOPY\n\xff\r\n\x00'
+_HEADER = SIGNATURE + struct.pack('!ii', 0, 0)
+_TRAILER = struct.pack('!h', -1)
+_NULL = struct.pack('!i', -1)
+_PG_EPOCH = date(2000, 1, 1)
+_TEXT_OID = 25
+
+
+def _as_date(value: Any) -> Optional[date]:
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def _text(value: Any) -> bytes:
+    # PostgreSQL không chấp nhận ký tự NUL trong text
+    return str(value).replace('\x00', '').encode('utf-8')
+
+
+def encode_field(value: Any, kind: str) -> bytes:
+    """Một trường của dòng COPY binary: độ dài (int32, -1 = NULL) + dữ liệu."""
+    if value is None:
+        return _NULL
+    if kind == 'text':
+        data = _text(value)
+    elif kind == 'int4':
+        data = struct.pack('!i', int(value))
+    elif kind == 'bool':
+        data = b'\x01' if value else b'\x00'
+    elif kind == 'date':
+        day = _as_date(value)
+        if day is None:
+            return _NULL
+        data = struct.pack('!i', (day - _PG_EPOCH).days)
+    elif kind == 'text[]':
+        items = [_text(item) for item in value if item is not None]
+        if not items:
+            data = struct.pack('!iii', 0, 0, _TEXT_OID)
+        else:
+            data = b''.join([struct.pack('!iiiii', 1, 0, _TEXT_OID, len(items), 1)]
+                            + [struct.pack('!i', len(item)) + item for item in items])
+    elif kind == 'vector':
+        data = struct.pack(f'!hh{len(value)}f', len(value), 0, *value)
+    else:
+        raise ValueError(f"Kiểu cột không hỗ trợ: {kind}")
+    return struct.pack('!i', len(data)) + data
+
+
+class BinaryCopyWriter:
+    """Gom các dòng thành một luồng COPY binary trong bộ nhớ."""
+
+    def __init__(self, kinds: Sequence[str]):
+        self.kinds = tuple(kinds)
+        self.rows = 0
+        self._buffer = io.BytesIO()
+        self._buffer.write(_HEADER)
+        self._field_count = struct.pack('!h', len(self.kinds))
+
+    def write_row(self, values: Sequence[Any]) -> None:
+        if len(values) != len(self.kinds):
+            raise ValueError(f"Dòng có {len(values)} giá trị, cần {len(self.kinds)}")
+        self._buffer.write(self._field_count)
+        self._buffer.write(b''.join(encode_field(value, kind) for value, kind in zip(values, self.kinds)))
+        self.rows += 1
+
+    def getvalue(self) -> io.BytesIO:
+        """Luồng hoàn chỉnh (có trailer), đặt ở đầu để đưa cho copy_expert."""
+        return io.BytesIO(self._buffer.getvalue() + _TRAILER)
+
+    def nbytes(self) -> int:
+        return self._buffer.tell() + len(_TRAILER)
@@ -1,18 +1,55 @@
 import os
 import json
+import time
 import logging
-from typing import List, Optional, Dict, Any
+from collections import deque
+from typing import Iterable, List, Optional, Dict, Any
 from datetime import datetime
 import psycopg2
 from psycopg2.extras import execute_values, RealDictCursor
 from google import genai
 from dotenv import load_dotenv
 
+from src.db_pool import create_pool
+from src.embedding_cache import (EMBEDDING_MODEL, EMBEDDING_TASK_TYPE, EmbeddingCache, QueryEmbeddingCache,
+                                 normalize_text)
+from src.extractors.preflight import estimate_text_tokens
+from src.metrics import metrics
+
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Giới hạn của một request embed_content: số text và tổng số token (ước lượng)
+EMBED_BATCH_SIZE = int(os.getenv('EMBED_BATCH_SIZE', '100'))
+EMBED_BATCH_MAX_TOKENS = int(os.getenv('EMBED_BATCH_MAX_TOKENS', '18000'))
+EMBED_MAX_RETRIES = int(os.getenv('EMBED_MAX_RETRIES', '3'))
+# Cache embedding trên đĩa (EMBEDDING_CACHE=0 để tắt)
+USE_EMBEDDING_CACHE = os.getenv('EMBEDDING_CACHE', '1') == '1'
+# Hybrid search: hằng số k của reciprocal-rank fusion và số ứng viên lấy từ mỗi phía
+HYBRID_RRF_K = int(os.getenv('HYBRID_RRF_K', '60'))
+HYBRID_CANDIDATES = int(os.getenv('HYBRID_CANDIDATES', '40'))
+# hnsw.ef_search mặc định của pgvector: index HNSW trả về tối đa chừng ấy dòng
+HNSW_EF_SEARCH_DEFAULT = 40
+
+
+def plan_batches(texts: List[str]) -> List[List[int]]:
+    """Chia chỉ số các text (bỏ text rỗng) thành các lô trong giới hạn số text / token."""
+    batches, current, tokens = [], [], 0
+    for index, text in enumerate(texts):
+        if not text or not text.strip():
+            continue
+        cost = estimate_text_tokens(text) + 1
+        if current and (len(current) >= EMBED_BATCH_SIZE or tokens + cost > EMBED_BATCH_MAX_TOKENS):
+            batches.append(current)
+            current, tokens = [], 0
+        current.append(index)
+        tokens += cost
+    if current:
+        batches.append(current)
+    return batches
+
 
 class PgVectorStorage:
     """Lớp quản lý lưu trữ và tìm kiếm với PostgreSQL + pgvector"""
@@ -26,126 +63,271 @@ class PgVectorStorage:
             'password': os.getenv('POSTGRES_PASSWORD', 'chatbot_pass')
         }
         self.client = genai.Client(api_key=os.getenv('GEMINI_API_KEY'))
+        # Pool kết nối dùng chung cho mọi thao tác (an toàn khi gọi từ nhiều luồng)
+        self.pool = create_pool(self.conn_params)
+        self.embedding_cache = EmbeddingCache() if USE_EMBEDDING_CACHE else None
+        self.query_cache = QueryEmbeddingCache()
         
     def get_connection(self):
-        """Tạo kết nối đến PostgreSQL"""
+        """Tạo kết nối riêng đến PostgreSQL (không qua pool), người gọi tự đóng"""
         return psycopg2.connect(**self.conn_params)
     
+    def connection(self):
+        """Context manager: mượn một kết nối của pool, tự trả lại khi ra khỏi khối"""
+        return self.pool.connection()
+    
+    def close(self):
+        """Đóng các kết nối rảnh trong pool"""
+        self.pool.close()
+    
     def create_embedding(self, text: str) -> List[float]:
         """Tạo embedding vector từ text sử dụng Gemini text-embedding-004"""
-        try:
-            result = self.client.models.embed_content(
-                model='models/text-embedding-004',
-                contents=[text]
-            )
-            return result.embeddings[0].values
-        except Exception as e:
-            logger.error(f"Lỗi tạo embedding: {e}")
-            return None
+        return self.create_embeddings([text])[0]
+    
+    def embed_query(self, query: str) -> Optional[List[float]]:
+        """
+        Embedding của câu hỏi tìm kiếm, qua cache LRU/TTL trong bộ nhớ (câu hỏi giống nhau
+        sau chuẩn hóa dùng chung; các lời gọi đồng thời chỉ tạo một request).
+        """
+        return self.query_cache.get_or_compute(query, lambda: self.create_embedding(query))
+    
+    def create_embeddings(self, texts: List[str],
+                          task_type: Optional[str] = EMBEDDING_TASK_TYPE) -> List[Optional[List[float]]]:
+        """
+        Tạo embedding cho nhiều text, gửi theo lô (tối đa EMBED_BATCH_SIZE text và
+        ~EMBED_BATCH_MAX_TOKENS token mỗi request). Kết quả theo đúng vị trí của texts;
+        text không tạo được embedding trả về None. Lô lỗi được thử lại, rồi chia đôi
+        (mỗi nửa thử một lần) để chỉ các text thực sự lỗi bị bỏ qua.
+        Text đã có trong cache embedding (hoặc lặp lại trong texts) không được gửi lại.
+        """
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        if self.embedding_cache is not None:
+            results = self.embedding_cache.get_many(texts, EMBEDDING_MODEL, task_type)
+        
+        # Mỗi text chưa có embedding chỉ gửi một lần dù lặp lại nhiều lần
+        positions: Dict[str, List[int]] = {}
+        for index, text in enumerate(texts):
+            if results[index] is None:
+                positions.setdefault(normalize_text(text or ''), []).append(index)
+        if not positions:
+            return results
+        
+        missing = [indices[0] for indices in positions.values()]
+        embeddings = self._embed_texts([texts[i] for i in missing], task_type)
+        for first, embedding in zip(missing, embeddings):
+            for index in positions[normalize_text(texts[first] or '')]:
+                results[index] = embedding
+        if self.embedding_cache is not None:
+            self.embedding_cache.put_many([texts[i] for i in missing], embeddings, EMBEDDING_MODEL, task_type)
+        return results
+    
+    def _embed_texts(self, texts: List[str], task_type: Optional[str] = None) -> List[Optional[List[float]]]:
+        """Gọi API embedding theo lô cho các text (không qua cache)."""
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        pending = deque((indices, EMBED_MAX_RETRIES) for indices in plan_batches(texts))
+        while pending:
+            indices, attempts = pending.popleft()
+            embeddings = self._embed_with_retry([texts[i] for i in indices], attempts, task_type)
+            if embeddings is not None:
+                for index, embedding in zip(indices, embeddings):
+                    results[index] = embedding
+            elif len(indices) > 1:
+                middle = len(indices) // 2
+                pending.appendleft((indices[middle:], 1))
+                pending.appendleft((indices[:middle], 1))
+            else:
+                logger.error(f"Lỗi tạo embedding cho text #{indices[0]}: {texts[indices[0]][:80]!r}")
+        return results
+    
+    def _embed_with_retry(self, texts: List[str], attempts: int = EMBED_MAX_RETRIES,
+                          task_type: Optional[str] = None) -> Optional[List[List[float]]]:
+        """Gọi embed_content cho một lô, thử lại (backoff) khi lỗi. None nếu vẫn lỗi."""
+        for attempt in range(attempts):
+            try:
+                with metrics.timed('gemini.embed_content', model=EMBEDDING_MODEL):
+                    result = self.client.models.embed_content(
+                        model=EMBEDDING_MODEL,
+                        contents=texts,
+                        config={'task_type': task_type} if task_type else None
+                    )
+                if len(result.embeddings) != len(texts):
+                    raise ValueError(f"nhận {len(result.embeddings)} embedding cho {len(texts)} text")
+                metrics.inc('embedded_texts_total', len(texts))
+                return [embedding.values for embedding in result.embeddings]
+            except Exception as e:
+                logger.warning(f"Lỗi tạo embedding cho lô {len(texts)} text "
+                               f"(lần {attempt + 1}/{attempts}): {e}")
+                if attempt + 1 < attempts:
+                    time.sleep(min(2 ** attempt, 10))
+        return None
+    
+    def _insert_document(self, cur, doc_meta: Dict[str, Any]) -> None:
+        """Upsert metadata tài liệu"""
+        cur.execute("""
+            INSERT INTO documents (
+                doc_id, file_name, doc_title, doc_type, issue_number,
+                issuing_authority, issuing_dept, issue_date, 
+                effective_date, expiration_date, major_topic
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (doc_id) DO UPDATE SET
+                file_name = EXCLUDED.file_name,
+                doc_title = EXCLUDED.doc_title,
+                doc_type = EXCLUDED.doc_type,
+                updated_at = CURRENT_TIMESTAMP
+        """, (
+            doc_meta.get('DOC_ID'),
+            doc_meta.get('FILE_NAME'),
+            doc_meta.get('DOC_TITLE'),
+            doc_meta.get('DOC_TYPE'),
+            doc_meta.get('ISSUE_NUMBER'),
+            doc_meta.get('ISSUING_AUTHORITY'),
+            doc_meta.get('ISSUING_DEPT'),
+            doc_meta.get('ISSUE_DATE'),
+            doc_meta.get('EFFECTIVE_DATE'),
+            doc_meta.get('EXPIRATION_DATE'),
+            doc_meta.get('MAJOR_TOPIC')
+        ))
+    
+    def _chunk_row(self, doc_id: str, chunk: Dict[str, Any], embedding: List[float]) -> tuple:
+        """Chuyển chunk dict thành tuple theo thứ tự cột của bảng chunks"""
+        return (
+            chunk.get('CHUNK_ID'),
+            doc_id,
+            chunk.get('PAGE_NUMBER'),
+            chunk.get('SECTION_TITLE'),
+            chunk.get('CHUNK_TOPIC'),
+            chunk.get('CONTENT_TYPE'),
+            chunk.get('SPECIFIC_TARGET'),
+            chunk.get('APPLICABLE_COHORT'),
+            str(chunk.get('VALUE')) if chunk.get('VALUE') else None,
+            chunk.get('UNIT'),
+            chunk.get('KEYWORDS', []),
+            chunk['chunk_text'],
+            embedding
+        )
+    
+    def _insert_chunks(self, cur, chunks_data: List[tuple]) -> None:
+        """Batch insert chunks"""
+        execute_values(cur, """
+            INSERT INTO chunks (
+                chunk_id, doc_id, page_number, section_title, chunk_topic,
+                content_type, specific_target, applicable_cohort, value, unit,
+                keywords, chunk_text, embedding
+            ) VALUES %s
+            ON CONFLICT (chunk_id) DO UPDATE SET
+                chunk_text = EXCLUDED.chunk_text,
+                embedding = EXCLUDED.embedding,
+                updated_at = CURRENT_TIMESTAMP
+        """, chunks_data)
     
     def save_document(self, doc_data: Dict[str, Any]) -> bool:
         """Lưu document và chunks vào PostgreSQL với embeddings"""
+        chunks = doc_data['chunk_metadata']
+        
+        # Tạo embedding cho chunk text (theo lô)
+        embeddings = self.create_embeddings([chunk['chunk_text'] for chunk in chunks])
+        return self.save_embedded_document(doc_data['document_metadata'], chunks, embeddings)
+    
+    def save_embedded_document(self, doc_meta: Dict[str, Any], chunks: List[Dict[str, Any]],
+                               embeddings: List[Optional[List[float]]]) -> bool:
+        """Lưu document và chunks với embeddings đã tạo sẵn (embeddings[i] ứng với chunks[i])"""
+        # Lưu chunks với embeddings
+        chunks_data = []
+        for chunk, embedding in zip(chunks, embeddings):
+            if embedding is None:
+                logger.warning(f"Bỏ qua chunk {chunk.get('CHUNK_ID')} - không tạo được embedding")
+                continue
+            
+            chunks_data.append(self._chunk_row(doc_meta.get('DOC_ID'), chunk, embedding))
+        
+        def write(conn):
+            # Một transaction; upsert nên chạy lại được nếu mất kết nối giữa chừng
+            with conn, conn.cursor() as cur:
+                # Lưu document metadata
+                self._insert_document(cur, doc_meta)
+                
+                # Batch insert chunks
+                if chunks_data:
+                    self._insert_chunks(cur, chunks_data)
+        
+        try:
+            with metrics.timed('db.save_document'):
+                self.pool.run(write)
+            logger.info(f"Đã lưu document: {doc_meta.get('DOC_ID')}")
+            if chunks_data:
+                logger.info(f"Đã lưu {len(chunks_data)} chunks với embeddings")
+            metrics.inc('db_chunks_written_total', len(chunks_data))
+            return True
+            
+        except Exception as e:
+            logger.error(f"Lỗi lưu document: {e}")
+            return False
+    
+    def save_document_stream(self, doc_meta: Dict[str, Any], chunks: Iterable[Dict[str, Any]],
+                             batch_size: int = 20) -> int:
+        """
+        Lưu document rồi lưu chunks ngay khi chúng đến (VD: từ luồng trích xuất).
+        Mỗi lô batch_size chunks được tạo embedding trong một request và commit riêng
+        để có thể tìm kiếm sớm. Trả về số chunk đã lưu, -1 nếu lỗi.
+        """
         conn = None
+        saved = 0
         try:
-            conn = self.get_connection()
+            conn = self.pool.getconn()
             cur = conn.cursor()
             
-            # Lưu document metadata
-            doc_meta = doc_data['document_metadata']
-            cur.execute("""
-                INSERT INTO documents (
-                    doc_id, file_name, doc_title, doc_type, issue_number,
-                    issuing_authority, issuing_dept, issue_date, 
-                    effective_date, expiration_date, major_topic
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (doc_id) DO UPDATE SET
-                    file_name = EXCLUDED.file_name,
-                    doc_title = EXCLUDED.doc_title,
-                    doc_type = EXCLUDED.doc_type,
-                    updated_at = CURRENT_TIMESTAMP
-            """, (
-                doc_meta.get('DOC_ID'),
-                doc_meta.get('FILE_NAME'),
-                doc_meta.get('DOC_TITLE'),
-                doc_meta.get('DOC_TYPE'),
-                doc_meta.get('ISSUE_NUMBER'),
-                doc_meta.get('ISSUING_AUTHORITY'),
-                doc_meta.get('ISSUING_DEPT'),
-                doc_meta.get('ISSUE_DATE'),
-                doc_meta.get('EFFECTIVE_DATE'),
-                doc_meta.get('EXPIRATION_DATE'),
-                doc_meta.get('MAJOR_TOPIC')
-            ))
-            
+            with metrics.timed('db.insert_document'):
+                self._insert_document(cur, doc_meta)
+                conn.commit()
             logger.info(f"Đã lưu document: {doc_meta.get('DOC_ID')}")
             
-            # Lưu chunks với embeddings
-            chunks_data = []
-            for chunk in doc_data['chunk_metadata']:
-                # Tạo embedding cho chunk text
-                embedding = self.create_embedding(chunk['chunk_text'])
-                if embedding is None:
-                    logger.warning(f"Bỏ qua chunk {chunk.get('CHUNK_ID')} - không tạo được embedding")
-                    continue
-                
-                chunks_data.append((
-                    chunk.get('CHUNK_ID'),
-                    doc_meta.get('DOC_ID'),
-                    chunk.get('PAGE_NUMBER'),
-                    chunk.get('SECTION_TITLE'),
-                    chunk.get('CHUNK_TOPIC'),
-                    chunk.get('CONTENT_TYPE'),
-                    chunk.get('SPECIFIC_TARGET'),
-                    chunk.get('APPLICABLE_COHORT'),
-                    str(chunk.get('VALUE')) if chunk.get('VALUE') else None,
-                    chunk.get('UNIT'),
-                    chunk.get('KEYWORDS', []),
-                    chunk['chunk_text'],
-                    embedding
-                ))
+            def flush(batch: List[Dict[str, Any]]) -> int:
+                embeddings = self.create_embeddings([chunk['chunk_text'] for chunk in batch])
+                chunks_data = []
+                for chunk, embedding in zip(batch, embeddings):
+                    if embedding is None:
+                        logger.warning(f"Bỏ qua chunk {chunk.get('CHUNK_ID')} - không tạo được embedding")
+                        continue
+                    chunks_data.append(self._chunk_row(doc_meta.get('DOC_ID'), chunk, embedding))
+                if chunks_data:
+                    with metrics.timed('db.insert_chunks'):
+                        self._insert_chunks(cur, chunks_data)
+                        conn.commit()
+                return len(chunks_data)
             
-            # Batch insert chunks
-            if chunks_data:
-                execute_values(cur, """
-                    INSERT INTO chunks (
-                        chunk_id, doc_id, page_number, section_title, chunk_topic,
-                        content_type, specific_target, applicable_cohort, value, unit,
-                        keywords, chunk_text, embedding
-                    ) VALUES %s
-                    ON CONFLICT (chunk_id) DO UPDATE SET
-                        chunk_text = EXCLUDED.chunk_text,
-                        embedding = EXCLUDED.embedding,
-                        updated_at = CURRENT_TIMESTAMP
-                """, chunks_data)
-                
-                logger.info(f"Đã lưu {len(chunks_data)} chunks với embeddings")
+            batch = []
+            for chunk in chunks:
+                batch.append(chunk)
+                if len(batch) >= batch_size:
+                    saved += flush(batch)
+                    batch = []
             
-            conn.commit()
-            return True
+            if batch:
+                saved += flush(batch)
+            metrics.inc('db_chunks_written_total', saved)
+            
+            logger.info(f"Đã lưu {saved} chunks với embeddings (streaming)")
+            return saved
             
         except Exception as e:
-            if conn:
+            if conn and not conn.closed:
                 conn.rollback()
-            logger.error(f"Lỗi lưu document: {e}")
-            return False
+            logger.error(f"Lỗi lưu document (streaming): {e}")
+            return -1
         finally:
             if conn:
-                conn.close()
+                self.pool.putconn(conn)
     
     def semantic_search(self, query: str, limit: int = 5, 
                        content_type: Optional[str] = None,
                        applicable_cohort: Optional[str] = None) -> List[Dict]:
         """Tìm kiếm semantic sử dụng vector similarity"""
-        conn = None
         try:
-            # Tạo embedding cho query
-            query_embedding = self.create_embedding(query)
+            # Tạo embedding cho query (qua cache câu hỏi)
+            query_embedding = self.embed_query(query)
             if query_embedding is None:
                 return []
             
-            conn = self.get_connection()
-            cur = conn.cursor(cursor_factory=RealDictCursor)
-            
             # Build query với filters
             where_clauses = []
             filter_params = []
@@ -163,97 +345,199 @@ class PgVectorStorage:
             # Params theo đúng thứ tự: filter_params + query_embedding (2 lần) + limit
             params = filter_params + [query_embedding, query_embedding, limit]
             
-            cur.execute(f"""
-                SELECT 
-                    c.chunk_id,
-                    c.chunk_text,
-                    c.chunk_topic,
-                    c.content_type,
-                    c.specific_target,
-                    c.applicable_cohort,
-                    c.value,
-                    c.unit,
-                    d.doc_title,
-                    d.doc_type,
-                    d.file_name,
-                    d.issue_date,
-                    1 - (c.embedding <=> %s::vector) as similarity
-                FROM chunks c
-                JOIN documents d ON c.doc_id = d.doc_id
-                {where_sql}
-                ORDER BY c.embedding <=> %s::vector
-                LIMIT %s
-            """, params)
+            def search(conn):
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute(f"""
+                        SELECT 
+                            c.chunk_id,
+                            c.chunk_text,
+                            c.chunk_topic,
+                            c.content_type,
+                            c.specific_target,
+                            c.applicable_cohort,
+                            c.value,
+                            c.unit,
+                            d.doc_title,
+                            d.doc_type,
+                            d.file_name,
+                            d.issue_date,
+                            1 - (c.embedding <=> %s::vector) as similarity
+                        FROM chunks c
+                        JOIN documents d ON c.doc_id = d.doc_id
+                        {where_sql}
+                        ORDER BY c.embedding <=> %s::vector
+                        LIMIT %s
+                    """, params)
+                    return cur.fetchall()
             
-            results = cur.fetchall()
+            with metrics.timed('db.semantic_search'):
+                results = self.pool.run(search)
             return [dict(row) for row in results]
             
         except Exception as e:
             logger.error(f"Lỗi tìm kiếm semantic: {e}")
             return []
-        finally:
-            if conn:
-                conn.close()
     
-    def keyword_search(self, keyword: str, limit: int = 10) -> List[Dict]:
-        """Tìm kiếm full-text search"""
-        conn = None
+    def hybrid_search(self, query: str, limit: int = 5,
+                      content_type: Optional[str] = None,
+                      applicable_cohort: Optional[str] = None,
+                      candidates: Optional[int] = None,
+                      semantic_weight: float = 1.0,
+                      keyword_weight: float = 1.0) -> List[Dict]:
+        """
+        Kết hợp tìm kiếm semantic và full-text trong một câu SQL: lấy `candidates` ứng viên
+        từ index HNSW và từ index GIN, gộp bằng reciprocal-rank fusion
+        (score = Σ weight / (HYBRID_RRF_K + hạng)). Kết quả có các trường của semantic_search
+        kèm `score`, `semantic_rank`, `keyword_rank` (None nếu không nằm trong tập ứng viên
+        của phía đó). Không tạo được embedding thì chỉ còn phía full-text.
+        """
+        candidates = candidates or max(HYBRID_CANDIDATES, limit * 2)
         try:
-            conn = self.get_connection()
-            cur = conn.cursor(cursor_factory=RealDictCursor)
+            query_embedding = self.embed_query(query)
+            
+            where_clauses = []
+            if content_type:
+                where_clauses.append("c.content_type = %(content_type)s")
+            if applicable_cohort:
+                where_clauses.append("c.applicable_cohort LIKE %(cohort)s")
+            filter_sql = "".join(f" AND {clause}" for clause in where_clauses)
             
-            cur.execute("""
-                SELECT 
-                    c.chunk_id,
-                    c.chunk_text,
-                    c.chunk_topic,
-                    c.content_type,
-                    d.doc_title,
-                    d.file_name,
-                    ts_rank(to_tsvector('vietnamese', c.chunk_text), 
-                            plainto_tsquery('vietnamese', %s)) as rank
-                FROM chunks c
-                JOIN documents d ON c.doc_id = d.doc_id
-                WHERE to_tsvector('vietnamese', c.chunk_text) @@ 
-                      plainto_tsquery('vietnamese', %s)
-                ORDER BY rank DESC
-                LIMIT %s
-            """, (keyword, keyword, limit))
+            params = {
+                'query': query,
+                'embedding': query_embedding,
+                'content_type': content_type,
+                'cohort': f"%{applicable_cohort}%" if applicable_cohort else None,
+                'candidates': candidates,
+                'k': HYBRID_RRF_K,
+                'w_semantic': semantic_weight,
+                'w_keyword': keyword_weight,
+                'limit': limit,
+            }
+            # Index HNSW chỉ trả về tối đa hnsw.ef_search dòng; gửi chung một lần với truy vấn
+            ef_search_sql = (f"SET LOCAL hnsw.ef_search = {int(candidates)};"
+                             if candidates > HNSW_EF_SEARCH_DEFAULT else "")
             
-            results = cur.fetchall()
+            def search(conn):
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute(ef_search_sql + f"""
+                        WITH semantic AS (
+                            SELECT chunk_id, ROW_NUMBER() OVER (ORDER BY distance) AS rank
+                            FROM (
+                                SELECT c.chunk_id, c.embedding <=> %(embedding)s::vector AS distance
+                                FROM chunks c
+                                WHERE %(embedding)s::vector IS NOT NULL{filter_sql}
+                                ORDER BY distance
+                                LIMIT %(candidates)s
+                            ) nearest
+                        ),
+                        keyword AS (
+                            SELECT chunk_id, ROW_NUMBER() OVER (ORDER BY text_rank DESC) AS rank
+                            FROM (
+                                SELECT c.chunk_id, ts_rank_cd(c.chunk_tsv, q.tsq) AS text_rank
+                                FROM chunks c, websearch_to_tsquery('vietnamese', %(query)s) AS q(tsq)
+                                WHERE c.chunk_tsv @@ q.tsq{filter_sql}
+                                ORDER BY text_rank DESC
+                                LIMIT %(candidates)s
+                            ) matches
+                        ),
+                        fused AS (
+                            SELECT
+                                COALESCE(s.chunk_id, k.chunk_id) AS chunk_id,
+                                COALESCE(%(w_semantic)s::float8 / (%(k)s + s.rank), 0)
+                                    + COALESCE(%(w_keyword)s::float8 / (%(k)s + k.rank), 0) AS score,
+                                s.rank AS semantic_rank,
+                                k.rank AS keyword_rank
+                            FROM semantic s
+                            FULL OUTER JOIN keyword k ON k.chunk_id = s.chunk_id
+                        )
+                        SELECT 
+                            c.chunk_id,
+                            c.chunk_text,
+                            c.chunk_topic,
+                            c.content_type,
+                            c.specific_target,
+                            c.applicable_cohort,
+                            c.value,
+                            c.unit,
+                            d.doc_title,
+                            d.doc_type,
+                            d.file_name,
+                            d.issue_date,
+                            1 - (c.embedding <=> %(embedding)s::vector) as similarity,
+                            f.score,
+                            f.semantic_rank,
+                            f.keyword_rank
+                        FROM fused f
+                        JOIN chunks c ON c.chunk_id = f.chunk_id
+                        JOIN documents d ON c.doc_id = d.doc_id
+                        ORDER BY f.score DESC, f.chunk_id
+                        LIMIT %(limit)s
+                    """, params)
+                    return cur.fetchall()
+            
+            with metrics.timed('db.hybrid_search'):
+                results = self.pool.run(search)
+            return [dict(row) for row in results]
+            
+        except Exception as e:
+            logger.error(f"Lỗi tìm kiếm hybrid: {e}")
+            return []
+    
+    def keyword_search(self, keyword: str, limit: int = 10) -> List[Dict]:
+        """
+        Tìm kiếm full-text trên cột chunk_tsv (cấu hình 'vietnamese', không phân biệt dấu).
+        Cú pháp như ô tìm kiếm web: "cụm từ chính xác", OR, -loại trừ.
+        """
+        def search(conn):
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute("""
+                    SELECT 
+                        c.chunk_id,
+                        c.chunk_text,
+                        c.chunk_topic,
+                        c.content_type,
+                        d.doc_title,
+                        d.file_name,
+                        ts_rank(c.chunk_tsv, websearch_to_tsquery('vietnamese', %s)) as rank
+                    FROM chunks c
+                    JOIN documents d ON c.doc_id = d.doc_id
+                    WHERE c.chunk_tsv @@ websearch_to_tsquery('vietnamese', %s)
+                    ORDER BY rank DESC
+                    LIMIT %s
+                """, (keyword, keyword, limit))
+                return cur.fetchall()
+        
+        try:
+            with metrics.timed('db.keyword_search'):
+                results = self.pool.run(search)
             return [dict(row) for row in results]
             
         except Exception as e:
             logger.error(f"Lỗi tìm kiếm keyword: {e}")
             return []
-        finally:
-            if conn:
-                conn.close()
     
     def get_statistics(self) -> Dict:
         """Lấy thống kê database"""
-        conn = None
+        def statistics(conn):
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute("""
+                    SELECT 
+                        (SELECT COUNT(*) FROM documents) as total_documents,
+                        (SELECT COUNT(*) FROM chunks) as total_chunks,
+                        (SELECT COUNT(DISTINCT doc_type) FROM documents) as doc_types,
+                        (SELECT COUNT(DISTINCT content_type) FROM chunks WHERE content_type IS NOT NULL) as content_types
+                """)
+                return cur.fetchone()
+        
         try:
-            conn = self.get_connection()
-            cur = conn.cursor(cursor_factory=RealDictCursor)
+            with metrics.timed('db.get_statistics'):
+                row = self.pool.run(statistics)
             
-            cur.execute("""
-                SELECT 
-                    (SELECT COUNT(*) FROM documents) as total_documents,
-                    (SELECT COUNT(*) FROM chunks) as total_chunks,
-                    (SELECT COUNT(DISTINCT doc_type) FROM documents) as doc_types,
-                    (SELECT COUNT(DISTINCT content_type) FROM chunks WHERE content_type IS NOT NULL) as content_types
-            """)
-            
-            return dict(cur.fetchone())
+            return dict(row)
             
         except Exception as e:
             logger.error(f"Lỗi lấy thống kê: {e}")
             return {}
-        finally:
-            if conn:
-                conn.close()
-
 
 # Ví dụ sử dụng
 if __name__ == '__main__':
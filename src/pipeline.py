@@ -0,0 +1,246 @@
+"""
+Staged extraction → embedding → pgvector pipeline with backpressure.
+
+Each stage has its own worker threads and reads from a bounded queue, so a
+slow stage only fills the queue in front of it: upstream stages block on a
+full queue instead of piling work up in memory, and a slow embedding step
+does not stall extraction of the documents already queued.
+
+    upload ─q─▶ generate ─q─▶ embed ─q─▶ store
+
+`generate` covers generation and validation: a response that fails
+validation is salvaged, continued or escalated to a stronger model, which
+all go back to the model, so the two cannot be split into separate queues.
+"""
+
+import time
+import queue
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+@dataclass
+class Stage:
+    """Một bước của pipeline: hàm xử lý một item, số worker và kích thước hàng đợi đầu vào."""
+    name: str
+    func: Callable[[Any], Any]
+    workers: int = 1
+    queue_size: int = 8
+
+
+@dataclass
+class StageStats:
+    processed: int = 0
+    failed: int = 0
+    busy_seconds: float = 0.0
+    max_queue_depth: int = 0
+    depth_samples: List[int] = field(default_factory=list)
+
+
+@dataclass
+class WorkItem:
+    """Item đi qua pipeline: khóa (VD: đường dẫn PDF), dữ liệu hiện tại và thời gian từng bước."""
+    key: str
+    payload: Any
+    started: float = field(default_factory=time.perf_counter)
+    timings: Dict[str, float] = field(default_factory=dict)
+
+
+class Pipeline:
+    """Chạy các Stage nối tiếp nhau qua hàng đợi có giới hạn, mỗi Stage có pool worker riêng."""
+
+    def __init__(self, stages: List[Stage], report_interval: float = 10.0):
+        if not stages:
+            raise ValueError("Pipeline cần ít nhất một stage")
+        self.stages = [Stage(stage.name, stage.func, max(1, stage.workers), stage.queue_size) for stage in stages]
+        self.report_interval = report_interval
+        self.queues = [queue.Queue(maxsize=max(1, stage.queue_size)) for stage in self.stages]
+        self.stats = {stage.name: StageStats() for stage in self.stages}
+        self.results: List[WorkItem] = []
+        self.errors: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._remaining = [stage.workers for stage in self.stages]
+        self._finished = threading.Event()
+
+    def _worker(self, index: int) -> None:
+        stage = self.stages[index]
+        stats = self.stats[stage.name]
+        inbox = self.queues[index]
+        outbox = self.queues[index + 1] if index + 1 < len(self.stages) else None
+
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                break
+
+            started = time.perf_counter()
+            try:
+                item.payload = stage.func(item.payload)
+                ok = True
+            except Exception as e:
+                ok = False
+                logger.error(f"❌ [{stage.name}] {item.key}: {e}")
+                with self._lock:
+                    self.errors.append({'key': item.key, 'stage': stage.name,
+                                        'error_type': e.__class__.__name__, 'error': str(e)})
+            elapsed = time.perf_counter() - started
+            item.timings[stage.name] = round(elapsed, 3)
+
+            with self._lock:
+                stats.busy_seconds += elapsed
+                if ok:
+                    stats.processed += 1
+                else:
+                    stats.failed += 1
+
+            if not ok:
+                continue
+            if outbox is not None:
+                # Chặn khi hàng đợi phía sau đầy (backpressure)
+                outbox.put(item)
+            else:
+                with self._lock:
+                    self.results.append(item)
+
+        # Worker cuối cùng của stage báo cho stage sau là đã hết việc
+        with self._lock:
+            self._remaining[index] -= 1
+            last = self._remaining[index] == 0
+        if last and outbox is not None:
+            for _ in range(self.stages[index + 1].workers):
+                outbox.put(_DONE)
+
+    def _sample_depths(self) -> None:
+        with self._lock:
+            for stage, inbox in zip(self.stages, self.queues):
+                stats = self.stats[stage.name]
+                depth = inbox.qsize()
+                stats.max_queue_depth = max(stats.max_queue_depth, depth)
+                stats.depth_samples.append(depth)
+
+    def _monitor(self, started: float) -> None:
+        """Lấy mẫu độ sâu hàng đợi mỗi giây và ghi log tiến độ mỗi report_interval giây."""
+        last_report = time.perf_counter()
+        while not self._finished.wait(1.0):
+            self._sample_depths()
+            if time.perf_counter() - last_report >= self.report_interval:
+                last_report = time.perf_counter()
+                self.log_progress(time.perf_counter() - started)
+
+    def log_progress(self, elapsed: float) -> None:
+        parts = []
+        for stage, inbox in zip(self.stages, self.queues):
+            stats = self.stats[stage.name]
+            rate = stats.processed / elapsed * 60 if elapsed else 0.0
+            parts.append(f"{stage.name}: {stats.processed} xong, hàng đợi {inbox.qsize()}, {rate:.1f}/phút")
+        logger.info("📈 " + " | ".join(parts))
+
+    def run(self, items: Iterable[Any], key: Callable[[Any], str] = str) -> Dict[str, Any]:
+        """
+        Đưa các item vào pipeline, chờ xử lý xong và trả về báo cáo theo stage
+        (số item xong/lỗi, throughput, thời gian xử lý trung bình, độ sâu hàng đợi).
+        """
+        started = time.perf_counter()
+        threads = []
+        for index, stage in enumerate(self.stages):
+            for n in range(stage.workers):
+                thread = threading.Thread(target=self._worker, args=(index,),
+                                          name=f"{stage.name}-{n}", daemon=True)
+                thread.start()
+                threads.append(thread)
+        monitor = threading.Thread(target=self._monitor, args=(started,), name='pipeline-monitor', daemon=True)
+        monitor.start()
+
+        submitted = 0
+        for item in items:
+            # Chặn khi stage đầu tiên chưa kịp xử lý
+            self.queues[0].put(WorkItem(key(item), item))
+            submitted += 1
+        for _ in range(self.stages[0].workers):
+            self.queues[0].put(_DONE)
+
+        for thread in threads:
+            thread.join()
+        self._finished.set()
+        monitor.join()
+        self._sample_depths()
+
+        return self.report(submitted, time.perf_counter() - started)
+
+    def report(self, submitted: int, wall_seconds: float) -> Dict[str, Any]:
+        stages = {}
+        for stage in self.stages:
+            stats = self.stats[stage.name]
+            done = stats.processed + stats.failed
+            samples = stats.depth_samples or [0]
+            stages[stage.name] = {
+                'workers': stage.workers,
+                'processed': stats.processed,
+                'failed': stats.failed,
+                'busy_seconds': round(stats.busy_seconds, 2),
+                'avg_seconds': round(stats.busy_seconds / done, 3) if done else None,
+                'items_per_min': round(stats.processed / wall_seconds * 60, 2) if wall_seconds else None,
+                'utilization': round(stats.busy_seconds / (wall_seconds * stage.workers), 3) if wall_seconds else None,
+                'max_queue_depth': stats.max_queue_depth,
+                'avg_queue_depth': round(sum(samples) / len(samples), 2),
+            }
+        return {
+            'submitted': submitted,
+            'completed': len(self.results),
+            'failed': len(self.errors),
+            'wall_seconds': round(wall_seconds, 2),
+            'stages': stages,
+            'errors': self.errors,
+        }
+
+
+def build_extraction_pipeline(storage=None, upload_workers: int = 2, generate_workers: int = 4,
+                              embed_workers: int = 2, store_workers: int = 1, queue_size: int = 8,
+                              report_interval: float = 10.0) -> Pipeline:
+    """
+    Pipeline PDF -> pgvector: upload (preflight + tải file lên), generate (trích xuất và
+    validate), embed (tạo embedding theo lô cho các chunk) và store (ghi vào PostgreSQL).
+    Không truyền `storage` (PgVectorStorage) thì pipeline dừng sau bước generate.
+    """
+    from src.extractors.gemini_extractor import has_cached_extraction, prepare_document, process_document
+
+    def upload(file_path: str) -> Dict[str, Any]:
+        # Đã có trong cache trích xuất: process_document trả kết quả ngay, không cần tải file lên
+        preflight = None if has_cached_extraction(file_path) else prepare_document(file_path)
+        return {'file_path': file_path, 'preflight': preflight, 'report': {}}
+
+    def generate(job: Dict[str, Any]) -> Dict[str, Any]:
+        data = process_document(job['file_path'], report=job['report'], preflight=job.pop('preflight'))
+        if data is None:
+            raise RuntimeError(f"trích xuất thất bại ({job['report'].get('outcome', 'failed')})")
+        job['chunk_count'] = len(data.chunk_metadata)
+        if storage is not None:
+            job['document'] = data.document_metadata.model_dump(mode='json')
+            job['chunks'] = [chunk.model_dump(mode='json') for chunk in data.chunk_metadata]
+        return job
+
+    def embed(job: Dict[str, Any]) -> Dict[str, Any]:
+        job['embeddings'] = storage.create_embeddings([chunk['chunk_text'] for chunk in job['chunks']])
+        return job
+
+    def store(job: Dict[str, Any]) -> Dict[str, Any]:
+        if not storage.save_embedded_document(job.pop('document'), job.pop('chunks'), job.pop('embeddings')):
+            raise RuntimeError("không lưu được vào PostgreSQL")
+        return job
+
+    stages = [
+        Stage('upload', upload, upload_workers, queue_size),
+        Stage('generate', generate, generate_workers, queue_size),
+    ]
+    if storage is not None:
+        stages += [
+            Stage('embed', embed, embed_workers, queue_size),
+            Stage('store', store, store_workers, queue_size),
+        ]
+    return Pipeline(stages, report_interval=report_interval)
@@ -0,0 +1,229 @@
+"""
+Resumable run manifest: per-file processing state in a local SQLite database.
+
+For every PDF the manifest records its content hash, the stage it reached,
+the attempt count, the last error class and per-stage durations, plus the
+hash of each stage's configuration when it last succeeded. A new run uses
+this to skip finished files, retry only failed or interrupted work and
+re-run a finished file from the first stage whose configuration changed
+(e.g. a prompt or model change invalidates 'extract', a new OUTPUT_FORMAT
+only 'save').
+
+Rows left in 'running' by a process that no longer exists (a crash or a
+killed run) are marked 'interrupted' on startup and retried.
+"""
+
+import os
+import json
+import uuid
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MANIFEST_PATH = os.getenv('RUN_MANIFEST_PATH', 'data/cache/run_manifest.sqlite')
+DEFAULT_MAX_ATTEMPTS = int(os.getenv('RUN_MAX_ATTEMPTS', '3'))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    file_path    TEXT PRIMARY KEY,
+    file_name    TEXT NOT NULL,
+    sha256       TEXT,
+    status       TEXT NOT NULL,          -- running | done | failed | interrupted
+    stage        TEXT,                   -- bước cuối cùng đã bắt đầu
+    stage_hashes TEXT,                   -- JSON {bước: hash cấu hình} của lần thành công gần nhất
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    error_class  TEXT,
+    error        TEXT,
+    durations    TEXT,                   -- JSON {bước: giây} của lần chạy gần nhất
+    chunks       INTEGER,
+    outcome      TEXT,
+    run_id       TEXT,
+    pid          INTEGER,
+    updated_at   TEXT
+);
+CREATE TABLE IF NOT EXISTS attempts (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_path   TEXT NOT NULL,
+    run_id      TEXT NOT NULL,
+    attempt     INTEGER NOT NULL,
+    status      TEXT NOT NULL,
+    stage       TEXT,
+    error_class TEXT,
+    error       TEXT,
+    seconds     REAL,
+    started_at  TEXT NOT NULL,
+    finished_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_files_status ON files(status);
+"""
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec='seconds')
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class RunManifest:
+    """Trạng thái xử lý từng file (SQLite), dùng để tiếp tục lần chạy bị gián đoạn."""
+
+    def __init__(self, path: str = DEFAULT_MANIFEST_PATH, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.path = Path(path)
+        self.max_attempts = max_attempts
+        self.run_id = uuid.uuid4().hex[:12]
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # Một kết nối ngắn cho mỗi thao tác: an toàn khi gọi từ nhiều luồng / tiến trình
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def recover(self) -> int:
+        """Đánh dấu 'interrupted' các file đang 'running' của tiến trình đã chết. Trả về số file."""
+        with self._lock, self._connect() as conn:
+            rows = conn.execute("SELECT file_path, pid, stage FROM files WHERE status = 'running'").fetchall()
+            stale = [row for row in rows if not _pid_alive(row['pid'])]
+            for row in stale:
+                conn.execute(
+                    "UPDATE files SET status = 'interrupted', updated_at = ? WHERE file_path = ?",
+                    (_now(), row['file_path']),
+                )
+                conn.execute(
+                    "UPDATE attempts SET status = 'interrupted', finished_at = ? "
+                    "WHERE file_path = ? AND finished_at IS NULL",
+                    (_now(), row['file_path']),
+                )
+        if stale:
+            logger.warning(f"♻️ {len(stale)} file bị gián đoạn ở lần chạy trước sẽ được xử lý lại")
+        return len(stale)
+
+    def get(self, file_path: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM files WHERE file_path = ?", (file_path,)).fetchone()
+        return dict(row) if row else None
+
+    def plan(self, file_path: str, sha256: str, stage_hashes: Dict[str, str],
+             force: bool = False) -> Tuple[List[str], str]:
+        """
+        Quyết định các bước cần chạy cho một file, theo thứ tự của stage_hashes.
+        Trả về (danh sách bước, lý do); danh sách rỗng nghĩa là bỏ qua file.
+        """
+        stages = list(stage_hashes)
+        row = self.get(file_path)
+        if force:
+            return stages, 'force'
+        if row is None:
+            return stages, 'new'
+        if row['sha256'] != sha256:
+            return stages, 'content changed'
+        if row['status'] == 'running' and _pid_alive(row['pid']):
+            return [], 'running in another process'
+        if row['status'] in ('failed', 'interrupted', 'running'):
+            if row['attempts'] >= self.max_attempts:
+                return [], f"gave up after {row['attempts']} attempts ({row['error_class']})"
+            return self._invalidated(row, stage_hashes) or stages, f"retry {row['status']} ({row['stage']})"
+
+        invalidated = self._invalidated(row, stage_hashes)
+        if invalidated:
+            return invalidated, f"config changed ({invalidated[0]})"
+        return [], 'up to date'
+
+    @staticmethod
+    def _invalidated(row: Dict[str, Any], stage_hashes: Dict[str, str]) -> List[str]:
+        """Các bước từ bước đầu tiên có hash cấu hình khác lần thành công gần nhất."""
+        previous = json.loads(row['stage_hashes'] or '{}')
+        stages = list(stage_hashes)
+        for index, stage in enumerate(stages):
+            if previous.get(stage) != stage_hashes[stage]:
+                return stages[index:]
+        return []
+
+    def start(self, file_path: str, sha256: str, stage: Optional[str] = None) -> int:
+        """Ghi nhận bắt đầu một lần xử lý. Trả về số thứ tự lần thử."""
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT attempts, sha256 FROM files WHERE file_path = ?", (file_path,)).fetchone()
+            # Nội dung file thay đổi thì đếm lại số lần thử
+            attempt = (row['attempts'] if row and row['sha256'] == sha256 else 0) + 1
+            conn.execute("""
+                INSERT INTO files (file_path, file_name, sha256, status, stage, attempts, run_id, pid, updated_at)
+                VALUES (?, ?, ?, 'running', ?, ?, ?, ?, ?)
+                ON CONFLICT(file_path) DO UPDATE SET
+                    sha256 = excluded.sha256, status = 'running', stage = excluded.stage,
+                    attempts = excluded.attempts, run_id = excluded.run_id, pid = excluded.pid,
+                    updated_at = excluded.updated_at
+            """, (file_path, os.path.basename(file_path), sha256, stage, attempt, self.run_id, os.getpid(), _now()))
+            conn.execute(
+                "INSERT INTO attempts (file_path, run_id, attempt, status, stage, started_at) VALUES (?, ?, ?, 'running', ?, ?)",
+                (file_path, self.run_id, attempt, stage, _now()),
+            )
+        return attempt
+
+    def _close_attempt(self, conn, file_path: str, status: str, stage: Optional[str],
+                       seconds: Optional[float], error_class: Optional[str] = None,
+                       error: Optional[str] = None) -> None:
+        conn.execute("""
+            UPDATE attempts SET status = ?, stage = ?, error_class = ?, error = ?, seconds = ?, finished_at = ?
+            WHERE id = (SELECT MAX(id) FROM attempts WHERE file_path = ? AND run_id = ?)
+        """, (status, stage, error_class, error, seconds, _now(), file_path, self.run_id))
+
+    def finish(self, file_path: str, stage_hashes: Dict[str, str], chunks: Optional[int] = None,
+               outcome: Optional[str] = None, durations: Optional[Dict[str, float]] = None,
+               seconds: Optional[float] = None) -> None:
+        """Ghi nhận file đã xử lý xong với cấu hình stage_hashes."""
+        with self._lock, self._connect() as conn:
+            conn.execute("""
+                UPDATE files SET status = 'done', stage = 'done', stage_hashes = ?, error_class = NULL,
+                    error = NULL, durations = ?, chunks = ?, outcome = ?, updated_at = ?
+                WHERE file_path = ?
+            """, (json.dumps(stage_hashes), json.dumps(durations or {}), chunks, outcome, _now(), file_path))
+            self._close_attempt(conn, file_path, 'done', 'done', seconds)
+
+    def fail(self, file_path: str, error_class: str, error: Optional[str] = None,
+             stage: Optional[str] = None, durations: Optional[Dict[str, float]] = None,
+             seconds: Optional[float] = None) -> None:
+        """Ghi nhận lần xử lý thất bại (lớp lỗi, bước đang chạy, thời gian các bước)."""
+        with self._lock, self._connect() as conn:
+            conn.execute("""
+                UPDATE files SET status = 'failed', stage = COALESCE(?, stage), error_class = ?, error = ?,
+                    durations = ?, outcome = 'failed', updated_at = ?
+                WHERE file_path = ?
+            """, (stage, error_class, (error or '')[:1000], json.dumps(durations or {}), _now(), file_path))
+            self._close_attempt(conn, file_path, 'failed', stage, seconds, error_class, (error or '')[:1000])
+
+    def reset_failed(self) -> int:
+        """Đặt lại số lần thử của các file lỗi để chúng được thử lại. Trả về số file."""
+        with self._lock, self._connect() as conn:
+            cursor = conn.execute("UPDATE files SET attempts = 0 WHERE status IN ('failed', 'interrupted')")
+            return cursor.rowcount
+
+    def summary(self) -> Dict[str, int]:
+        """Số file theo trạng thái."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) AS n FROM files GROUP BY status").fetchall()
+        return {row['status']: row['n'] for row in rows}
@@ -0,0 +1,168 @@
+"""
+Watch PDF folders and report each new or changed file once it is complete.
+
+File system events come from inotify (through the optional ``watchdog``
+package) or, when it is missing or disabled, from a periodic scan of
+``(size, mtime)``. Either way a file is only handed on after it has stopped
+changing for ``settle_seconds`` and ends with a PDF ``%%EOF`` marker, so a
+PDF that is still being copied or downloaded is not extracted half-written.
+
+The delay between a file landing and the callback is bounded by
+``settle_seconds`` plus one check interval (plus ``poll_seconds`` in polling
+mode).
+"""
+
+import os
+import time
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTLE_SECONDS = float(os.getenv('WATCH_SETTLE_SECONDS', '3'))
+DEFAULT_POLL_SECONDS = float(os.getenv('WATCH_POLL_SECONDS', '10'))
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # watchdog là phụ thuộc tùy chọn
+    Observer = None
+    FileSystemEventHandler = object
+
+
+def _looks_complete(path: Path) -> bool:
+    """PDF hoàn chỉnh kết thúc bằng %%EOF (có thể kèm khoảng trắng) ở 1KB cuối."""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - 1024))
+            return b'%%EOF' in f.read()
+    except OSError:
+        return False
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, watcher: 'FolderWatcher'):
+        self.watcher = watcher
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.watcher.touch(Path(event.src_path))
+
+    on_modified = on_created
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.watcher.touch(Path(event.dest_path))
+
+
+class FolderWatcher:
+    """Theo dõi các thư mục PDF, gọi callback cho file mới/thay đổi khi file đã ghi xong."""
+
+    def __init__(self, folders: List[str], settle_seconds: float = DEFAULT_SETTLE_SECONDS,
+                 poll_seconds: float = DEFAULT_POLL_SECONDS, use_inotify: bool = True,
+                 suffix: str = '.pdf'):
+        self.folders = [Path(folder) for folder in folders]
+        self.settle_seconds = settle_seconds
+        self.poll_seconds = poll_seconds
+        self.use_inotify = use_inotify and Observer is not None
+        self.suffix = suffix.lower()
+        self._lock = threading.Lock()
+        # path -> (size, mtime, thời điểm thay đổi gần nhất)
+        self._pending: Dict[Path, Tuple[int, float, float]] = {}
+        # path -> (size, mtime) đã báo cho callback
+        self._known: Dict[Path, Tuple[int, float]] = {}
+
+    def _matches(self, path: Path) -> bool:
+        return path.suffix.lower() == self.suffix and not path.name.startswith('.')
+
+    def touch(self, path: Path) -> None:
+        """Ghi nhận file vừa thay đổi; file được xét lại sau khi ổn định."""
+        if not self._matches(path):
+            return
+        with self._lock:
+            self._pending[path] = (-1, -1.0, time.monotonic())
+
+    def scan(self) -> None:
+        """Quét thư mục, đưa các file chưa thấy hoặc có (size, mtime) khác vào hàng chờ."""
+        for folder in self.folders:
+            if not folder.is_dir():
+                continue
+            for path in folder.iterdir():
+                if not self._matches(path):
+                    continue
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                with self._lock:
+                    changed = self._known.get(path) != (stat.st_size, stat.st_mtime)
+                    waiting = path in self._pending
+                if changed and not waiting:
+                    self.touch(path)
+
+    def _ready(self) -> List[Path]:
+        """Các file đã không đổi trong settle_seconds và trông như PDF hoàn chỉnh."""
+        now = time.monotonic()
+        ready = []
+        with self._lock:
+            pending = list(self._pending.items())
+        for path, (size, mtime, changed_at) in pending:
+            try:
+                stat = path.stat()
+            except OSError:
+                # File bị xóa / đổi tên trong lúc chờ
+                with self._lock:
+                    self._pending.pop(path, None)
+                continue
+            current = (stat.st_size, stat.st_mtime)
+            with self._lock:
+                if current != (size, mtime):
+                    self._pending[path] = (*current, now)
+                    continue
+                if now - changed_at < self.settle_seconds or not stat.st_size:
+                    continue
+                if not _looks_complete(path):
+                    # Có thể vẫn đang được ghi: chờ thêm một chu kỳ
+                    self._pending[path] = (*current, now)
+                    continue
+                self._pending.pop(path)
+                self._known[path] = current
+            ready.append(path)
+        return ready
+
+    def run(self, callback: Callable[[Path], None], stop: Optional[threading.Event] = None) -> None:
+        """
+        Chạy đến khi `stop` được set: quét một lượt lúc khởi động (bắt các file đến khi
+        daemon không chạy), sau đó theo dõi bằng inotify hoặc quét định kỳ.
+        """
+        stop = stop or threading.Event()
+        observer = None
+        if self.use_inotify:
+            observer = Observer()
+            handler = _EventHandler(self)
+            for folder in self.folders:
+                folder.mkdir(parents=True, exist_ok=True)
+                observer.schedule(handler, str(folder), recursive=False)
+            observer.start()
+        mode = 'inotify' if observer else f'polling mỗi {self.poll_seconds:.0f}s'
+        logger.info(f"👀 Theo dõi {', '.join(str(f) for f in self.folders)} ({mode}, "
+                    f"chờ ổn định {self.settle_seconds:.0f}s)")
+
+        self.scan()
+        last_scan = time.monotonic()
+        interval = min(1.0, self.settle_seconds / 2) if self.settle_seconds else 0.5
+        try:
+            while not stop.wait(interval):
+                if observer is None and time.monotonic() - last_scan >= self.poll_seconds:
+                    self.scan()
+                    last_scan = time.monotonic()
+                for path in self._ready():
+                    callback(path)
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from src.extractors.batch_job import (
+    LocalBatchBackend, build_request_line, iter_results, parse_result_line, submit_batch,
+    wait_for_batch, write_requests,
+)
+
+
+def _responder(request):
+    prompt = request['contents'][0]['parts'][0]['text']
+    if prompt == 'boom':
+        raise ValueError('model error')
+    return json.dumps({'echo': prompt})
+
+
+def _submit(tmp_path, backend, prompts):
+    requests_path = tmp_path / 'requests.jsonl'
+    lines = [build_request_line(f'doc{i}', prompt, f'local://files/{i}', {'type': 'object'}, 0.1)
+             for i, prompt in enumerate(prompts)]
+    assert write_requests(str(requests_path), lines) == len(prompts)
+    return submit_batch(backend, str(requests_path), 'gemini-2.5-flash', 'test')
+
+
+def test_request_line_matches_process_document_request():
+    line = build_request_line('a', 'prompt', 'uri', {'type': 'object'}, 0.2)
+    request = line['request']
+    assert line['key'] == 'a'
+    assert request['contents'][0]['parts'][1]['file_data'] == {'file_uri': 'uri', 'mime_type': 'application/pdf'}
+    assert request['generation_config']['response_mime_type'] == 'application/json'
+    assert request['generation_config']['temperature'] == 0.2
+
+
+def test_local_backend_round_trip(tmp_path):
+    backend = LocalBatchBackend(_responder, polls_until_done=3)
+    job = _submit(tmp_path, backend, ['one', 'boom', 'two'])
+    assert job.state.name == 'JOB_STATE_PENDING'
+
+    done = wait_for_batch(backend, job.name, poll_seconds=0)
+    assert done.state.name == 'JOB_STATE_SUCCEEDED'
+    assert backend.jobs[job.name]['polls'] == 3
+
+    results = {key: (text, error) for key, text, error in iter_results(backend, done)}
+    assert json.loads(results['doc0'][0]) == {'echo': 'one'}
+    assert json.loads(results['doc2'][0]) == {'echo': 'two'}
+    assert results['doc1'][0] is None and 'model error' in results['doc1'][1]
+
+
+def test_wait_for_batch_times_out(tmp_path):
+    backend = LocalBatchBackend(_responder, polls_until_done=1000)
+    job = _submit(tmp_path, backend, ['one'])
+    with pytest.raises(TimeoutError):
+        wait_for_batch(backend, job.name, poll_seconds=0, timeout=0)
+
+
+def test_parse_result_line_without_content():
+    assert parse_result_line({'key': 'x', 'response': {'candidates': []}}) == ('x', None, 'Phản hồi không có nội dung')
@@ -0,0 +1,102 @@
+from types import SimpleNamespace
+
+from src.extractors.context_cache import (
+    EXPIRY_MARGIN_SECONDS, RETRY_AFTER_SECONDS, PromptContextCache, is_cache_error,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeCaches:
+    def __init__(self):
+        self.created = 0
+        self.calls = []
+        self.fail_create = False
+        self.fail_update = False
+
+    def create(self, model, config):
+        self.calls.append(('create', model))
+        if self.fail_create:
+            raise RuntimeError('quota')
+        self.created += 1
+        return SimpleNamespace(name=f'cachedContents/{self.created}')
+
+    def update(self, name, config):
+        self.calls.append(('update', name))
+        if self.fail_update:
+            raise RuntimeError('not found')
+        return SimpleNamespace(name=name)
+
+    def delete(self, name):
+        self.calls.append(('delete', name))
+
+
+def _cache(ttl=3600):
+    clock = FakeClock()
+    client = SimpleNamespace(caches=FakeCaches())
+    return PromptContextCache('instructions', ttl_seconds=ttl, clock=clock), client, clock
+
+
+def test_name_is_reused_until_close_to_expiry_then_refreshed():
+    cache, client, clock = _cache()
+    assert cache.get_name(client, 'm') == 'cachedContents/1'
+    clock.now += 3600 - EXPIRY_MARGIN_SECONDS - 1
+    assert cache.get_name(client, 'm') == 'cachedContents/1'
+    assert client.caches.calls == [('create', 'm')]
+
+    clock.now += 2
+    assert cache.get_name(client, 'm') == 'cachedContents/1'
+    assert client.caches.calls[-1] == ('update', 'cachedContents/1')
+
+    # Sau khi gia hạn, TTL tính lại từ thời điểm gia hạn
+    clock.now += 3600 - EXPIRY_MARGIN_SECONDS - 1
+    assert cache.get_name(client, 'm') == 'cachedContents/1'
+    assert len(client.caches.calls) == 2
+
+
+def test_failed_refresh_recreates_the_cache():
+    cache, client, clock = _cache()
+    cache.get_name(client, 'm')
+    client.caches.fail_update = True
+    clock.now += 3600
+    assert cache.get_name(client, 'm') == 'cachedContents/2'
+    assert client.caches.calls == [('create', 'm'), ('update', 'cachedContents/1'), ('create', 'm')]
+
+
+def test_failed_create_is_retried_after_a_while():
+    cache, client, clock = _cache()
+    client.caches.fail_create = True
+    assert cache.get_name(client, 'm') is None
+    assert cache.get_name(client, 'm') is None
+    assert client.caches.calls == [('create', 'm')]
+
+    client.caches.fail_create = False
+    clock.now += RETRY_AFTER_SECONDS + 1
+    assert cache.get_name(client, 'm') == 'cachedContents/1'
+
+
+def test_invalidate_drops_only_the_current_name():
+    cache, client, clock = _cache()
+    cache.get_name(client, 'm')
+    cache.invalidate('m', 'cachedContents/other')
+    assert cache.get_name(client, 'm') == 'cachedContents/1'
+
+    cache.invalidate('m', 'cachedContents/1')
+    assert cache.get_name(client, 'm') == 'cachedContents/2'
+
+    cache.delete(client)
+    assert client.caches.calls[-1] == ('delete', 'cachedContents/2')
+    assert ('delete', 'cachedContents/1') not in client.caches.calls
+
+
+def test_is_cache_error():
+    assert is_cache_error(SimpleNamespace(code=404, status='NOT_FOUND'))
+    assert is_cache_error(SimpleNamespace(code=400, status='INVALID_ARGUMENT'))
+    assert not is_cache_error(SimpleNamespace(code=429, status='RESOURCE_EXHAUSTED'))
+    assert not is_cache_error(ValueError('boom'))
@@ -0,0 +1,85 @@
+import gzip
+import json
+
+from src.dataset_storage import DocumentDataset, partition_for
+
+
+def _doc(doc_id, file_name, topic='Tài chính', doc_type='Thông báo'):
+    return {'DOC_ID': doc_id, 'FILE_NAME': file_name, 'MAJOR_TOPIC': topic, 'DOC_TYPE': doc_type}
+
+
+def test_partition_slug():
+    assert partition_for(_doc('a', 'a.pdf', 'Đào tạo', None)) == 'major_topic=dao_tao/doc_type=unknown'
+
+
+def test_append_get_and_iterate(tmp_path):
+    dataset = DocumentDataset(str(tmp_path))
+    entry = dataset.append(_doc('d1', 'a.pdf'), iter([{'chunk_text': 'một'}, {'chunk_text': 'hai'}]))
+    dataset.append(_doc('d2', 'b.pdf', doc_type='Quy định'), [])
+
+    assert entry['chunks'] == 2 and entry['offset'] == 0
+    assert dataset.get('d1')['chunk_metadata'][1] == {'chunk_text': 'hai'}
+    assert dataset.has_file('b.pdf') and not dataset.has_file('c.pdf')
+    assert sorted(r['document_metadata']['DOC_ID'] for r in dataset.iter_documents()) == ['d1', 'd2']
+    assert list(dataset.iter_chunks())[0] == {'DOC_ID': 'd1', 'chunk_text': 'một'}
+    # Mỗi part là một file gzip nhiều member, đọc được như JSONL thường
+    with gzip.open(tmp_path / entry['part'], 'rt', encoding='utf-8') as f:
+        assert json.loads(f.readline())['document_metadata']['DOC_ID'] == 'd1'
+
+
+def test_reappended_file_replaces_previous_document(tmp_path):
+    dataset = DocumentDataset(str(tmp_path))
+    dataset.append(_doc('old', 'a.pdf'), [])
+    dataset.append(_doc('new', 'a.pdf'), [])
+    assert dataset.get('old') is None
+    assert [r['document_metadata']['DOC_ID'] for r in dataset.iter_documents()] == ['new']
+
+
+def test_torn_part_tail_is_ignored_and_truncated(tmp_path):
+    dataset = DocumentDataset(str(tmp_path))
+    entry = dataset.append(_doc('d1', 'a.pdf'), [{'chunk_text': 'một'}])
+    part_path = tmp_path / entry['part']
+    # Lần chạy bị lỗi giữa chừng: ghi thêm byte vào part nhưng chưa commit vào manifest
+    with open(part_path, 'ab') as f:
+        f.write(b'\x1f\x8b garbage')
+
+    reader = DocumentDataset(str(tmp_path))
+    assert [r['document_metadata']['DOC_ID'] for r in reader.iter_documents()] == ['d1']
+    second = reader.append(_doc('d2', 'b.pdf'), [])
+    assert second['offset'] == entry['length']
+    assert part_path.stat().st_size == entry['length'] + second['length']
+    with gzip.open(part_path, 'rt', encoding='utf-8') as f:
+        assert len(f.read().splitlines()) == 2
+
+
+def test_torn_manifest_log_line_is_ignored_and_truncated(tmp_path):
+    dataset = DocumentDataset(str(tmp_path))
+    dataset.append(_doc('d1', 'a.pdf'), [])
+    with open(tmp_path / 'manifest.log', 'ab') as f:
+        f.write(b'{"doc_id": "d9", "en')
+
+    reader = DocumentDataset(str(tmp_path))
+    assert list(reader.load_manifest()['documents']) == ['d1']
+    reader.append(_doc('d2', 'b.pdf'), [])
+    lines = (tmp_path / 'manifest.log').read_bytes().splitlines()
+    assert [json.loads(line)['doc_id'] for line in lines] == ['d1', 'd2']
+
+
+def test_writers_in_other_instances_are_seen_and_compacted(tmp_path):
+    first = DocumentDataset(str(tmp_path), compact_every=2)
+    second = DocumentDataset(str(tmp_path))
+    first.append(_doc('d1', 'a.pdf'), [])
+    second.append(_doc('d2', 'b.pdf'), [])
+    assert first.has_file('b.pdf')
+
+    # d2 (của second) + d3 đạt ngưỡng: log được gộp vào manifest.json
+    first.append(_doc('d3', 'c.pdf'), [])
+    assert (tmp_path / 'manifest.log').stat().st_size == 0
+    snapshot = json.loads((tmp_path / 'manifest.json').read_text(encoding='utf-8'))
+    assert sorted(snapshot['documents']) == ['d1', 'd2', 'd3']
+    assert second.has_file('c.pdf')
+
+    second.append(_doc('d4', 'd.pdf'), [])
+    second.close()
+    assert (tmp_path / 'manifest.log').stat().st_size == 0
+    assert sorted(DocumentDataset(str(tmp_path)).load_manifest()['documents']) == ['d1', 'd2', 'd3', 'd4']
@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('psycopg2')
+pytest.importorskip('google.genai')
+pytest.importorskip('dotenv')
+
+import src.pgvector_storage as pgvector_storage  # noqa: E402
+from src.pgvector_storage import PgVectorStorage, plan_batches  # noqa: E402
+
+
+class FakeModels:
+    """embed_content giả: lỗi với mọi lô có chứa một text trong `bad`."""
+
+    def __init__(self, bad=()):
+        self.bad = set(bad)
+        self.calls = []
+
+    def embed_content(self, model, contents, config=None):
+        self.calls.append(list(contents))
+        if self.bad & set(contents):
+            raise RuntimeError('400 INVALID_ARGUMENT')
+        return SimpleNamespace(embeddings=[SimpleNamespace(values=[float(len(text))]) for text in contents])
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    monkeypatch.setattr(pgvector_storage.time, 'sleep', lambda seconds: None)
+    instance = PgVectorStorage.__new__(PgVectorStorage)
+    instance.client = SimpleNamespace(models=FakeModels())
+    instance.embedding_cache = None
+    return instance
+
+
+def test_plan_batches_skips_blank_texts_and_respects_size(monkeypatch):
+    monkeypatch.setattr(pgvector_storage, 'EMBED_BATCH_SIZE', 2)
+    assert plan_batches(['a', '', 'b', '  ', 'c', 'd', 'e']) == [[0, 2], [4, 5], [6]]
+
+
+def test_plan_batches_respects_token_budget(monkeypatch):
+    monkeypatch.setattr(pgvector_storage, 'EMBED_BATCH_MAX_TOKENS', 1)
+    # Một text vượt ngân sách vẫn được gửi, một mình một lô
+    assert plan_batches(['một đoạn văn dài', 'khác']) == [[0], [1]]
+
+
+def test_failed_batch_is_split_until_only_the_bad_text_is_dropped(storage, monkeypatch):
+    monkeypatch.setattr(pgvector_storage, 'EMBED_MAX_RETRIES', 2)
+    storage.client.models = FakeModels(bad={'bad'})
+    texts = ['a', 'bb', 'bad', 'cccc', '']
+
+    assert storage.create_embeddings(texts) == [[1.0], [2.0], None, [4.0], None]
+    calls = storage.client.models.calls
+    # Lô đầu thử EMBED_MAX_RETRIES lần, sau đó mỗi nửa chỉ thử một lần
+    assert calls[:2] == [['a', 'bb', 'bad', 'cccc']] * 2
+    assert calls[2:] == [['a', 'bb'], ['bad', 'cccc'], ['bad'], ['cccc']]
+
+
+def test_duplicate_texts_are_embedded_once(storage):
+    assert storage.create_embeddings(['x', ' x ', 'y', 'x']) == [[1.0], [1.0], [1.0], [1.0]]
+    assert storage.client.models.calls == [['x', 'y']]
@@ -0,0 +1,65 @@
+import json
+
+from src.extractors.json_repair import chunk_fingerprint, salvage_json
+from src.extractors.streaming import IncrementalJsonParser, iter_events
+
+DOCUMENT = {
+    'document_metadata': {'DOC_TITLE': 'Quy định {học phí}', 'DOC_TYPE': 'Quy định'},
+    'chunk_metadata': [
+        {'PAGE_NUMBER': 1, 'chunk_text': 'Điều 1: "phạm vi" [áp dụng]'},
+        {'PAGE_NUMBER': 2, 'chunk_text': 'Điều 2: mức thu \\ năm'},
+        {'PAGE_NUMBER': 3, 'chunk_text': 'Điều 3'},
+    ],
+}
+RAW = json.dumps(DOCUMENT, ensure_ascii=False)
+
+
+def test_parser_emits_objects_as_they_close_across_pieces():
+    parser = IncrementalJsonParser()
+    events = []
+    for i in range(0, len(RAW), 7):
+        events.extend(parser.feed(RAW[i:i + 7]))
+    assert events[0] == ('document_metadata', DOCUMENT['document_metadata'])
+    assert [payload for kind, payload in events[1:]] == DOCUMENT['chunk_metadata']
+    assert parser.chunks_closed
+    assert parser.pending_text == ''
+
+
+def test_iter_events_keeps_partial_object_pending():
+    cut = RAW.index('Điều 3')
+    parser = IncrementalJsonParser()
+    events = parser.feed(RAW[:cut])
+    assert [kind for kind, _ in events] == ['document_metadata', 'chunk', 'chunk']
+    assert parser.pending_text.startswith('{"PAGE_NUMBER": 3')
+    assert not parser.chunks_closed
+    assert len(list(iter_events([RAW[:cut], RAW[cut:]]))) == 4
+
+
+def test_salvage_complete_response():
+    result = salvage_json(RAW)
+    assert result.document_metadata == DOCUMENT['document_metadata']
+    assert result.chunks == DOCUMENT['chunk_metadata']
+    assert result.complete and result.broken_objects == 0
+
+
+def test_salvage_truncated_response_keeps_complete_chunks():
+    result = salvage_json(RAW[:RAW.index('Điều 3') + 3])
+    assert result.chunks == DOCUMENT['chunk_metadata'][:2]
+    assert not result.complete
+
+
+def test_salvage_counts_malformed_objects_and_continues():
+    raw = RAW.replace('{"PAGE_NUMBER": 2,', '{"PAGE_NUMBER": 2,,', 1)
+    result = salvage_json(raw)
+    assert result.broken_objects == 1
+    assert [c['PAGE_NUMBER'] for c in result.chunks] == [1, 3]
+    assert result.complete
+
+
+def test_salvage_empty_response():
+    result = salvage_json('')
+    assert result.document_metadata is None and result.chunks == [] and not result.complete
+
+
+def test_chunk_fingerprint_ignores_whitespace_and_case():
+    assert chunk_fingerprint({'chunk_text': ' Điều  1\n'}) == chunk_fingerprint({'chunk_text': 'điều 1'})
@@ -0,0 +1,30 @@
+import pytest
+
+pytest.importorskip('dotenv')
+pytest.importorskip('pydantic')
+
+from scripts.migrate_to_db import unique_documents  # noqa: E402
+
+
+def _doc(doc_id, file_name, source):
+    return {'DOC_ID': doc_id, 'FILE_NAME': file_name}, [{'chunk_text': source}]
+
+
+def test_same_file_from_both_sources_is_loaded_once_from_the_dataset():
+    # Mỗi lần trích xuất sinh DOC_ID mới, nên hai bản của cùng một file có DOC_ID khác nhau
+    dataset = iter([_doc('uuid-1', 'a.pdf', 'dataset'), _doc('uuid-2', 'b.pdf', 'dataset')])
+    json_outputs = iter([_doc('uuid-3', 'a.pdf', 'json'), _doc('uuid-4', 'c.pdf', 'json')])
+
+    documents = list(unique_documents([dataset, json_outputs]))
+
+    assert [(meta['FILE_NAME'], chunks[0]['chunk_text']) for meta, chunks in documents] == [
+        ('a.pdf', 'dataset'), ('b.pdf', 'dataset'), ('c.pdf', 'json'),
+    ]
+
+
+def test_documents_without_file_name_fall_back_to_doc_id():
+    documents = list(unique_documents([
+        iter([_doc('uuid-1', None, 'dataset')]),
+        iter([_doc('uuid-1', None, 'json'), _doc('uuid-2', None, 'json')]),
+    ]))
+    assert [meta['DOC_ID'] for meta, _ in documents] == ['uuid-1', 'uuid-2']
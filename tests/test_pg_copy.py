@@ -0,0 +1,67 @@
+import struct
+from datetime import date
+
+import pytest
+
+from src.pg_copy import SIGNATURE, BinaryCopyWriter, encode_field
+
+
+def _payload(field: bytes) -> bytes:
+    (length,) = struct.unpack('!i', field[:4])
+    assert length == len(field) - 4
+    return field[4:]
+
+
+def test_null_and_scalars():
+    assert encode_field(None, 'text') == struct.pack('!i', -1)
+    assert _payload(encode_field('Học phí', 'text')) == 'Học phí'.encode('utf-8')
+    assert _payload(encode_field('a\x00b', 'text')) == b'ab'
+    assert _payload(encode_field(7, 'int4')) == struct.pack('!i', 7)
+    assert _payload(encode_field(True, 'bool')) == b'\x01'
+    assert _payload(encode_field(False, 'bool')) == b'\x00'
+
+
+def test_date_is_days_since_2000():
+    assert _payload(encode_field('2000-01-02', 'date')) == struct.pack('!i', 1)
+    assert _payload(encode_field(date(1999, 12, 31), 'date')) == struct.pack('!i', -1)
+    # Ngày không đọc được -> NULL thay vì làm hỏng cả lô COPY
+    assert encode_field('không rõ', 'date') == struct.pack('!i', -1)
+
+
+def test_vector_layout_matches_pgvector_recv():
+    payload = _payload(encode_field([0.5, -1.0, 2.0], 'vector'))
+    dim, unused = struct.unpack('!hh', payload[:4])
+    assert (dim, unused) == (3, 0)
+    assert struct.unpack('!3f', payload[4:]) == (0.5, -1.0, 2.0)
+
+
+def test_text_array_layout():
+    payload = _payload(encode_field(['a', None, 'bc'], 'text[]'))
+    ndim, has_null, oid, length, lower = struct.unpack('!iiiii', payload[:20])
+    assert (ndim, has_null, oid, length, lower) == (1, 0, 25, 2, 1)
+    assert payload[20:] == struct.pack('!i', 1) + b'a' + struct.pack('!i', 2) + b'bc'
+    assert _payload(encode_field([], 'text[]')) == struct.pack('!iii', 0, 0, 25)
+
+
+def test_unknown_kind():
+    with pytest.raises(ValueError):
+        encode_field(1, 'float8')
+
+
+def test_writer_stream_has_header_rows_and_trailer():
+    writer = BinaryCopyWriter(['int4', 'text'])
+    writer.write_row([1, 'x'])
+    writer.write_row([2, None])
+    data = writer.getvalue().read()
+    assert data.startswith(SIGNATURE + struct.pack('!ii', 0, 0))
+    assert data.endswith(struct.pack('!h', -1))
+    assert writer.rows == 2
+    assert writer.nbytes() == len(data)
+    body = data[len(SIGNATURE) + 8:-2]
+    assert body == (struct.pack('!h', 2) + encode_field(1, 'int4') + encode_field('x', 'text')
+                    + struct.pack('!h', 2) + encode_field(2, 'int4') + encode_field(None, 'text'))
+
+
+def test_writer_rejects_wrong_width():
+    with pytest.raises(ValueError):
+        BinaryCopyWriter(['int4']).write_row([1, 2])
@@ -0,0 +1,73 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.embedding_cache import QueryEmbeddingCache
+
+
+def test_async_followers_receive_the_leader_error():
+    cache = QueryEmbeddingCache()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError('quota')
+
+    async def run():
+        return await asyncio.gather(*(cache.aget_or_compute('Học phí?', compute) for _ in range(3)),
+                                    return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert cache.coalesced == 2
+
+
+def test_async_error_is_not_cached():
+    cache = QueryEmbeddingCache()
+
+    async def fail():
+        raise RuntimeError('quota')
+
+    async def succeed():
+        return [1.0]
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await cache.aget_or_compute('q', fail)
+        return await cache.aget_or_compute('q', succeed)
+
+    assert asyncio.run(run()) == [1.0]
+
+
+def test_thread_followers_receive_the_leader_error():
+    cache = QueryEmbeddingCache()
+    started, release = threading.Event(), threading.Event()
+    errors = []
+
+    def compute():
+        started.set()
+        release.wait(5)
+        raise RuntimeError('quota')
+
+    def ask():
+        try:
+            cache.get_or_compute('q', compute)
+        except RuntimeError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=ask)
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=ask) for _ in range(2)]
+    for thread in followers:
+        thread.start()
+    while cache.coalesced < 2:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+    assert len(errors) == 3
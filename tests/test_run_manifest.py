@@ -0,0 +1,62 @@
+import sqlite3
+
+from src.run_manifest import RunManifest
+
+HASHES = {'extract': 'e1', 'save': 'dataset'}
+
+
+def _manifest(tmp_path, **kwargs):
+    return RunManifest(str(tmp_path / 'run_manifest.sqlite'), **kwargs)
+
+
+def test_new_and_finished_files(tmp_path):
+    manifest = _manifest(tmp_path)
+    assert manifest.plan('a.pdf', 'sha', HASHES) == (['extract', 'save'], 'new')
+
+    manifest.start('a.pdf', 'sha', 'extract')
+    manifest.finish('a.pdf', HASHES, chunks=3, outcome='ok')
+    assert manifest.plan('a.pdf', 'sha', HASHES) == ([], 'up to date')
+    assert manifest.plan('a.pdf', 'sha', HASHES, force=True) == (['extract', 'save'], 'force')
+    assert manifest.plan('a.pdf', 'other', HASHES) == (['extract', 'save'], 'content changed')
+
+
+def test_config_change_reruns_from_first_changed_stage(tmp_path):
+    manifest = _manifest(tmp_path)
+    manifest.start('a.pdf', 'sha')
+    manifest.finish('a.pdf', HASHES)
+
+    assert manifest.plan('a.pdf', 'sha', {'extract': 'e1', 'save': 'files'}) == (['save'], 'config changed (save)')
+    assert manifest.plan('a.pdf', 'sha', {'extract': 'e2', 'save': 'dataset'}) == (
+        ['extract', 'save'], 'config changed (extract)')
+
+
+def test_failed_files_are_retried_until_max_attempts(tmp_path):
+    manifest = _manifest(tmp_path, max_attempts=2)
+    for attempt in (1, 2):
+        stages, reason = manifest.plan('a.pdf', 'sha', HASHES)
+        assert stages == ['extract', 'save']
+        assert manifest.start('a.pdf', 'sha', 'extract') == attempt
+        manifest.fail('a.pdf', 'ValidationError', 'bad json', stage='extract')
+    assert reason == 'retry failed (extract)'
+
+    stages, reason = manifest.plan('a.pdf', 'sha', HASHES)
+    assert stages == [] and reason == 'gave up after 2 attempts (ValidationError)'
+
+    assert manifest.reset_failed() == 1
+    assert manifest.plan('a.pdf', 'sha', HASHES)[0] == ['extract', 'save']
+    # Nội dung mới: đếm lại số lần thử
+    assert manifest.start('a.pdf', 'new-sha') == 1
+
+
+def test_running_file_of_dead_process_is_recovered(tmp_path):
+    manifest = _manifest(tmp_path)
+    manifest.start('a.pdf', 'sha', 'extract')
+    assert manifest.plan('a.pdf', 'sha', HASHES) == ([], 'running in another process')
+
+    # Tiến trình ghi dòng 'running' đã chết
+    with sqlite3.connect(tmp_path / 'run_manifest.sqlite') as conn:
+        conn.execute("UPDATE files SET pid = 0")
+    assert manifest.recover() == 1
+    assert manifest.get('a.pdf')['status'] == 'interrupted'
+    assert manifest.plan('a.pdf', 'sha', HASHES) == (['extract', 'save'], 'retry interrupted (extract)')
+    assert manifest.summary() == {'interrupted': 1}
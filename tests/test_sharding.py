@@ -0,0 +1,44 @@
+import pytest
+
+from src.extractors.sharding import merge_chunks, plan_windows
+
+
+def test_plan_windows_overlap():
+    assert plan_windows(10, 4, overlap=1) == [(1, 4), (4, 7), (7, 10)]
+    assert plan_windows(3, 10) == [(1, 3)]
+
+
+def test_plan_windows_rejects_empty_window():
+    with pytest.raises(ValueError):
+        plan_windows(10, 0)
+
+
+def test_merge_chunks_maps_relative_pages_to_absolute():
+    merged = merge_chunks([
+        ((1, 3), [{'PAGE_NUMBER': 1, 'chunk_text': 'Điều 1'}, {'PAGE_NUMBER': 3, 'chunk_text': 'Điều 2'}]),
+        ((3, 5), [{'PAGE_NUMBER': 2, 'chunk_text': 'Điều 3'}, {'PAGE_NUMBER': 3, 'chunk_text': 'Điều 4'}]),
+    ])
+    assert [(c['PAGE_NUMBER'], c['chunk_text']) for c in merged] == [
+        (1, 'Điều 1'), (3, 'Điều 2'), (4, 'Điều 3'), (5, 'Điều 4'),
+    ]
+
+
+def test_merge_chunks_drops_exact_duplicates_ignoring_whitespace_and_case():
+    merged = merge_chunks([
+        ((1, 2), [{'PAGE_NUMBER': 2, 'chunk_text': 'Học phí  năm 2025'}]),
+        ((2, 3), [{'PAGE_NUMBER': 2, 'chunk_text': 'học phí năm 2025'}]),
+    ])
+    assert len(merged) == 1
+
+
+def test_merge_chunks_drops_near_duplicates_only_in_the_overlap():
+    text = 'Mức học phí đại học chính quy năm học 2025-2026 là 15.000.000 đồng'
+    near = text + '.'
+    merged = merge_chunks([
+        ((1, 2), [{'PAGE_NUMBER': 2, 'chunk_text': text}]),
+        # Trang 1 của cửa sổ sau = trang 2 (chồng lấn): gần giống -> trùng
+        ((2, 3), [{'PAGE_NUMBER': 1, 'chunk_text': near},
+                  # Trang 3 nằm ngoài vùng chồng lấn: giữ lại dù gần giống
+                  {'PAGE_NUMBER': 2, 'chunk_text': near + ' '}]),
+    ])
+    assert [c['PAGE_NUMBER'] for c in merged] == [2, 3]